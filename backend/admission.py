@@ -0,0 +1,377 @@
+"""Per-tenant admission control in front of the upstream.
+
+Without it one tenant running a big dashboard or export can take every
+upstream connection and starve the rest. With PROXY_ADMISSION enabled each
+upstream call first needs a slot in its route's lane (see below):
+
+- at most the lane's concurrency calls are in flight in the lane
+- at most PROXY_ADMISSION_TENANT_CONCURRENCY of them for any one tenant
+
+A request that finds no free slot queues behind its own tenant. Freed
+slots go to the tenant whose head request has the lowest virtual start
+tag (start-time fair queueing): every queued request is tagged
+``max(virtual time, tenant's previous tag) + 1 / weight``, so backlogged
+tenants are served in proportion to their PROXY_ADMISSION_WEIGHTS
+(``"<tenant>=<weight>"``, default 1) and a tenant that was idle does not
+get to catch up on service it never asked for.
+
+Load is shed with 429 instead of queueing without bound: once a tenant has
+PROXY_ADMISSION_QUEUE_SIZE requests waiting, or after a request waited
+PROXY_ADMISSION_MAX_WAIT seconds. Cache hits and coalesced followers never
+reach the upstream and never need a slot.
+
+Tenants are keyed on ``x-tenant-id``, the tenant resolved from the Host,
+or the Host itself. A tenant's state is dropped as soon as it has nothing
+in flight or queued, so only active tenants take memory.
+
+Routes are split into lanes, each with its own pool of slots, so a burst
+of report queries can never take the slots checkout needs.
+PROXY_ADMISSION_LANES lists them from highest to lowest priority as
+``<lane>=<concurrency>[/<yielded concurrency>]``; PROXY_ADMISSION_LANE_ROUTES
+maps path prefixes to lanes (longest prefix wins, everything else is in
+``default``). While any higher lane has requests queued, a lane only admits
+up to its yielded concurrency, which takes load off Next.js and Postgres
+exactly when latency-critical requests are waiting for it.
+"""
+
+import asyncio
+import math
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .config import env_bool, env_float, env_int, env_list
+from .resilience import longest_prefix
+
+ADMISSION_ENABLED = env_bool("PROXY_ADMISSION", False)
+ADMISSION_CONCURRENCY = env_int("PROXY_ADMISSION_CONCURRENCY", 100)
+ADMISSION_TENANT_CONCURRENCY = env_int("PROXY_ADMISSION_TENANT_CONCURRENCY", 20)
+ADMISSION_QUEUE_SIZE = env_int("PROXY_ADMISSION_QUEUE_SIZE", 200)
+ADMISSION_MAX_WAIT = env_float("PROXY_ADMISSION_MAX_WAIT", 2.0)
+
+# "<tenant>=<weight>"; tenants not listed weigh 1
+ADMISSION_WEIGHTS = env_list("PROXY_ADMISSION_WEIGHTS", "")
+
+# Highest priority first; "default" gets PROXY_ADMISSION_CONCURRENCY when omitted
+ADMISSION_LANES = env_list(
+    "PROXY_ADMISSION_LANES", f"checkout=50,default={ADMISSION_CONCURRENCY},reports=20/2"
+)
+# Only report and analytics endpoints go to "reports": the rest of
+# accounting and partner (journals, settings, staff ...) are ordinary
+# reads and writes. /api/pos/reports outranks /api/pos as the longer prefix.
+ADMISSION_LANE_ROUTES = env_list(
+    "PROXY_ADMISSION_LANE_ROUTES",
+    "/api/pos=checkout,/api/svm/orders=checkout,/api/payments=checkout,"
+    "/api/analytics=reports,/api/accounting/reports=reports,/api/partner/analytics=reports,"
+    "/api/pos/reports=reports,/api/commerce/pos/reports=reports,/api/sites-funnels/analytics=reports",
+)
+
+DEFAULT_LANE = "default"
+
+QUEUE_FULL = "queue_full"
+QUEUE_TIMEOUT = "queue_timeout"
+
+
+class Overloaded(Exception):
+    """No upstream slot for the tenant; retry after ``retry_after`` seconds"""
+
+    def __init__(self, tenant: str, reason: str, retry_after: float):
+        super().__init__(f"admission rejected for {tenant!r}: {reason}")
+        self.tenant = tenant
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_weights(spec: List[str]) -> Dict[str, float]:
+    weights = {}
+    for item in spec:
+        tenant, _, weight = item.partition("=")
+        weights[tenant.strip()] = float(weight or 1)
+    return weights
+
+
+class Waiter:
+    __slots__ = ("tag", "future")
+
+    def __init__(self, tag: float, future: "asyncio.Future"):
+        self.tag = tag
+        self.future = future
+
+
+class TenantQueue:
+    """In-flight count and FIFO of waiting requests of one tenant"""
+
+    __slots__ = ("tenant", "weight", "in_flight", "waiters", "last_tag")
+
+    def __init__(self, tenant: str, weight: float):
+        self.tenant = tenant
+        self.weight = weight
+        self.in_flight = 0
+        self.waiters: Deque[Waiter] = deque()
+        self.last_tag = 0.0
+
+
+class Slot:
+    """One admitted upstream call; ``release`` may be called more than once"""
+
+    __slots__ = ("_scheduler", "_queue")
+
+    def __init__(self, scheduler: "FairScheduler", queue: TenantQueue):
+        self._scheduler = scheduler
+        self._queue = queue
+
+    def release(self) -> None:
+        if self._queue is not None:
+            queue, self._queue = self._queue, None
+            self._scheduler._release(queue)
+
+
+class FairScheduler:
+    """Concurrency limit shared fairly between tenants.
+
+    Runs on the event loop thread only: every state change happens between
+    two ``await`` points, so no locks are needed.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = ADMISSION_CONCURRENCY,
+        tenant_concurrency: int = ADMISSION_TENANT_CONCURRENCY,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        max_wait: float = ADMISSION_MAX_WAIT,
+        weights: Optional[Dict[str, float]] = None,
+        yielded_concurrency: Optional[int] = None,
+    ):
+        self.concurrency = concurrency
+        self.yielded_concurrency = concurrency if yielded_concurrency is None else yielded_concurrency
+        # Higher-priority schedulers this one yields to, and lower ones yielding to it
+        self.yields_to: List["FairScheduler"] = []
+        self.yielding: List["FairScheduler"] = []
+        self.tenant_concurrency = tenant_concurrency
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.weights = parse_weights(ADMISSION_WEIGHTS) if weights is None else weights
+        self.in_flight = 0
+        self.virtual_time = 0.0
+        self._tenants: Dict[str, TenantQueue] = {}
+        # Tenants with at least one waiter
+        self._backlogged: Dict[str, TenantQueue] = {}
+        self.admitted = 0
+        self.queued_total = 0
+        self.rejected: Dict[str, int] = {QUEUE_FULL: 0, QUEUE_TIMEOUT: 0}
+
+    @property
+    def capacity(self) -> int:
+        """Concurrency right now: reduced while a higher lane is backlogged"""
+        for higher in self.yields_to:
+            if higher._backlogged:
+                return self.yielded_concurrency
+        return self.concurrency
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q.waiters) for q in self._backlogged.values())
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {tenant: len(q.waiters) for tenant, q in self._backlogged.items()}
+
+    def _queue_for(self, tenant: str) -> TenantQueue:
+        queue = self._tenants.get(tenant)
+        if queue is None:
+            queue = self._tenants[tenant] = TenantQueue(tenant, self.weights.get(tenant, 1.0))
+        return queue
+
+    def _grant(self, queue: TenantQueue) -> Slot:
+        self.in_flight += 1
+        queue.in_flight += 1
+        self.admitted += 1
+        return Slot(self, queue)
+
+    def _reject(self, queue: TenantQueue, reason: str) -> Overloaded:
+        self.rejected[reason] += 1
+        self._forget_if_idle(queue)
+        return Overloaded(queue.tenant, reason, max(1.0, math.ceil(self.max_wait)))
+
+    def _forget_if_idle(self, queue: TenantQueue) -> None:
+        if queue.in_flight == 0 and not queue.waiters:
+            self._tenants.pop(queue.tenant, None)
+
+    async def acquire(self, tenant: str, timeout: Optional[float] = None) -> Slot:
+        """Wait for a slot, at most ``timeout`` (default max_wait) seconds"""
+        queue = self._queue_for(tenant)
+        if (
+            not queue.waiters
+            and self.in_flight < self.capacity
+            and queue.in_flight < self.tenant_concurrency
+        ):
+            return self._grant(queue)
+
+        if len(queue.waiters) >= self.queue_size:
+            raise self._reject(queue, QUEUE_FULL)
+
+        queue.last_tag = max(self.virtual_time, queue.last_tag) + 1.0 / queue.weight
+        waiter = Waiter(queue.last_tag, asyncio.get_running_loop().create_future())
+        queue.waiters.append(waiter)
+        self._backlogged[tenant] = queue
+        self.queued_total += 1
+
+        wait = self.max_wait if timeout is None else min(timeout, self.max_wait)
+        try:
+            return await asyncio.wait_for(waiter.future, max(0.0, wait))
+        except BaseException as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as the wait ended; hand the slot on
+                waiter.future.result().release()
+            else:
+                self._drop(queue, waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject(queue, QUEUE_TIMEOUT) from None
+            raise
+
+    def _drop(self, queue: TenantQueue, waiter: Waiter) -> None:
+        try:
+            queue.waiters.remove(waiter)
+        except ValueError:
+            pass
+        if not queue.waiters:
+            self._backlogged.pop(queue.tenant, None)
+        self._forget_if_idle(queue)
+        self._resume_lower()
+
+    def _release(self, queue: TenantQueue) -> None:
+        self.in_flight -= 1
+        queue.in_flight -= 1
+        self._dispatch()
+        self._forget_if_idle(queue)
+        self._resume_lower()
+
+    def _resume_lower(self) -> None:
+        """Lower lanes get their full concurrency back once this one drains"""
+        if not self._backlogged:
+            for lower in self.yielding:
+                lower._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hand free slots to the eligible tenant with the lowest head tag"""
+        while self.in_flight < self.capacity and self._backlogged:
+            best = None
+            for queue in self._backlogged.values():
+                if queue.in_flight >= self.tenant_concurrency:
+                    continue
+                if best is None or queue.waiters[0].tag < best.waiters[0].tag:
+                    best = queue
+            if best is None:
+                return
+            waiter = best.waiters.popleft()
+            if not best.waiters:
+                del self._backlogged[best.tenant]
+            if waiter.future.done():
+                # Timed out or cancelled, not yet removed by its owner
+                continue
+            self.virtual_time = waiter.tag
+            waiter.future.set_result(self._grant(best))
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "concurrency": self.concurrency,
+            "capacity": self.capacity,
+            "tenant_concurrency": self.tenant_concurrency,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "rejected": dict(self.rejected),
+            "tenants": {
+                tenant: {"in_flight": q.in_flight, "queued": len(q.waiters), "weight": q.weight}
+                for tenant, q in self._tenants.items()
+            },
+        }
+
+
+def parse_lanes(spec: List[str]) -> Dict[str, Tuple[int, int]]:
+    """Lane -> (concurrency, yielded concurrency), in priority order"""
+    lanes = {}
+    for item in spec:
+        name, _, values = item.partition("=")
+        concurrency, _, yielded = values.partition("/")
+        lanes[name.strip()] = (int(concurrency), int(yielded or concurrency))
+    if DEFAULT_LANE not in lanes:
+        lanes[DEFAULT_LANE] = (ADMISSION_CONCURRENCY, ADMISSION_CONCURRENCY)
+    return lanes
+
+
+def parse_lane_routes(spec: List[str]) -> Dict[str, str]:
+    routes = {}
+    for item in spec:
+        prefix, _, lane = item.partition("=")
+        routes[prefix.strip()] = lane.strip()
+    return routes
+
+
+class LaneScheduler:
+    """One FairScheduler per route class, lower lanes yielding to higher ones"""
+
+    def __init__(
+        self,
+        lanes: Optional[Dict[str, FairScheduler]] = None,
+        routes: Optional[Dict[str, str]] = None,
+    ):
+        if lanes is None:
+            lanes = {
+                name: FairScheduler(concurrency=concurrency, yielded_concurrency=yielded)
+                for name, (concurrency, yielded) in parse_lanes(ADMISSION_LANES).items()
+            }
+        self.lanes = lanes
+        self.routes = parse_lane_routes(ADMISSION_LANE_ROUTES) if routes is None else routes
+        unknown = set(self.routes.values()) - set(lanes)
+        if unknown:
+            raise ValueError(f"PROXY_ADMISSION_LANE_ROUTES names unknown lanes: {sorted(unknown)}")
+        self._prefixes = sorted(self.routes, key=len, reverse=True)
+
+        ordered = list(lanes.values())
+        for index, scheduler in enumerate(ordered):
+            scheduler.yields_to = ordered[:index]
+            scheduler.yielding = ordered[index + 1:]
+
+    def lane_for(self, path: str) -> str:
+        prefix = longest_prefix(self._prefixes, path)
+        return self.routes[prefix] if prefix else DEFAULT_LANE
+
+    def for_path(self, path: str) -> FairScheduler:
+        return self.lanes.get(self.lane_for(path)) or self.lanes[DEFAULT_LANE]
+
+    @property
+    def in_flight(self) -> int:
+        return sum(lane.in_flight for lane in self.lanes.values())
+
+    def in_flight_by_lane(self) -> Dict[Tuple[str, ...], int]:
+        return {(name,): lane.in_flight for name, lane in self.lanes.items()}
+
+    def queue_depths(self) -> Dict[Tuple[str, ...], int]:
+        return {
+            (name, tenant): depth
+            for name, lane in self.lanes.items()
+            for tenant, depth in lane.queue_depths().items()
+        }
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "routes": dict(self.routes),
+            "lanes": {name: lane.stats() for name, lane in self.lanes.items()},
+        }
+
+
+def release_on_close(response, slot: Slot) -> None:
+    """Keep the slot of a streamed response until its body is done"""
+    close = response.aclose
+
+    async def aclose() -> None:
+        slot.release()
+        await close()
+
+    response.aclose = aclose
+
+
+def create_scheduler() -> Optional[LaneScheduler]:
+    if not ADMISSION_ENABLED:
+        return None
+    return LaneScheduler()
@@ -0,0 +1,240 @@
+"""Load balancing across several Next.js upstreams.
+
+Set NEXTJS_URLS to a comma separated list to run Next.js horizontally
+behind the gateway. Each upstream keeps its own connection pool
+(``UpstreamClient``) and the balancer exposes the same interface, so the
+rest of the proxy does not care how many upstreams there are.
+
+- Balancing: ``p2c`` (power of two choices: the less busy of two random
+  nodes) or ``least`` (fewest outstanding requests), per PROXY_LB_STRATEGY.
+- Active health checks: every PROXY_HEALTH_INTERVAL seconds each node's
+  PROXY_HEALTH_PATH is probed; PROXY_HEALTH_FALL failed probes mark it
+  down and PROXY_HEALTH_RISE good ones bring it back.
+- Passive ejection: PROXY_EJECT_FAILURES consecutive 5xx responses or
+  transport errors take a node out for PROXY_EJECT_SECONDS.
+- Retries: up to PROXY_RETRIES more attempts on other nodes. Safe methods
+  are retried after errors and 502/503/504; PUT and DELETE only when the
+  connection failed before the request was sent. Streamed request bodies
+  are never retried.
+
+When every node is down the balancer still picks one rather than failing
+outright, so a flapping health check cannot take the whole site offline.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import httpx
+
+from . import upstream
+from .config import env_float, env_int, env_list, env_str
+from .upstream import UpstreamClient, UpstreamResponse
+
+logger = logging.getLogger("backend.balancer")
+
+NEXTJS_URLS = env_list("NEXTJS_URLS", "")
+LB_STRATEGY = env_str("PROXY_LB_STRATEGY", "p2c")
+HEALTH_PATH = env_str("PROXY_HEALTH_PATH", "/api/health")
+HEALTH_INTERVAL = env_float("PROXY_HEALTH_INTERVAL", 5.0)
+HEALTH_TIMEOUT = env_float("PROXY_HEALTH_TIMEOUT", 2.0)
+HEALTH_RISE = env_int("PROXY_HEALTH_RISE", 2)
+HEALTH_FALL = env_int("PROXY_HEALTH_FALL", 2)
+EJECT_FAILURES = env_int("PROXY_EJECT_FAILURES", 3)
+EJECT_SECONDS = env_float("PROXY_EJECT_SECONDS", 30.0)
+RETRIES = env_int("PROXY_RETRIES", 1)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+IDEMPOTENT_METHODS = SAFE_METHODS + ("PUT", "DELETE")
+RETRY_STATUSES = (502, 503, 504)
+FAILURE_STATUSES = (500, 502, 503, 504)
+
+
+class Node:
+    """One upstream and what the balancer knows about its health"""
+
+    def __init__(self, client: UpstreamClient):
+        self.client = client
+        self.healthy = True
+        self.ejected_until = 0.0
+        self.consecutive_failures = 0
+        self.probe_successes = 0
+        self.probe_failures = 0
+        self.ejections = 0
+
+    @property
+    def outstanding(self) -> int:
+        return self.client.in_flight
+
+    def available(self, now: float) -> bool:
+        return self.healthy and now >= self.ejected_until
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+
+    def record_failure(self, now: float) -> None:
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= EJECT_FAILURES and now >= self.ejected_until:
+            self.ejected_until = now + EJECT_SECONDS
+            self.ejections += 1
+            logger.warning(
+                "Ejecting upstream %s for %.0fs after %d failures",
+                self.client.base_url, EJECT_SECONDS, self.consecutive_failures,
+            )
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            **self.client.stats(),
+            "healthy": self.healthy,
+            "ejected": now < self.ejected_until,
+            "consecutive_failures": self.consecutive_failures,
+            "ejections": self.ejections,
+        }
+
+
+def is_retryable(method: str, error: Optional[Exception] = None, status: int = 0) -> bool:
+    if error is not None:
+        if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+            # Nothing reached the upstream, so even PUT/DELETE are safe to resend
+            return method in IDEMPOTENT_METHODS
+        return method in SAFE_METHODS
+    return method in SAFE_METHODS and status in RETRY_STATUSES
+
+
+class LoadBalancer:
+    """UpstreamClient look-alike spreading requests over several nodes"""
+
+    def __init__(self, clients: List[UpstreamClient], strategy: str = LB_STRATEGY, retries: int = RETRIES):
+        if not clients:
+            raise ValueError("LoadBalancer needs at least one upstream")
+        if strategy not in ("p2c", "least"):
+            raise ValueError(f"Unknown PROXY_LB_STRATEGY: {strategy!r}")
+        self.nodes = [Node(client) for client in clients]
+        self.strategy = strategy
+        self.retries = retries
+        self.retries_total = 0
+        self._health_task: Optional[asyncio.Task] = None
+
+    url_for = staticmethod(UpstreamClient.url_for)
+
+    @property
+    def in_flight(self) -> int:
+        return sum(node.outstanding for node in self.nodes)
+
+    def pick(self, exclude: Set[Node] = frozenset()) -> Node:
+        now = time.monotonic()
+        candidates = [n for n in self.nodes if n not in exclude and n.available(now)]
+        if not candidates:
+            # Everything is down or already tried: degrade rather than refuse
+            candidates = [n for n in self.nodes if n not in exclude] or self.nodes
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.strategy == "p2c":
+            candidates = random.sample(candidates, 2)
+        return min(candidates, key=lambda node: node.outstanding)
+
+    def _can_replay(self, kwargs: Dict[str, Any]) -> bool:
+        content = kwargs.get("content")
+        return content is None or isinstance(content, (bytes, str))
+
+    async def _attempt(self, send_name: str, method: str, url: str, **kwargs: Any):
+        tried: Set[Node] = set()
+        attempts = self.retries + 1 if self._can_replay(kwargs) else 1
+        attempts = min(attempts, len(self.nodes))
+        for attempt in range(attempts):
+            node = self.pick(tried)
+            tried.add(node)
+            last = attempt == attempts - 1
+            try:
+                response = await getattr(node.client, send_name)(method, url, **kwargs)
+            except httpx.TransportError as e:
+                node.record_failure(time.monotonic())
+                if last or not is_retryable(method, error=e):
+                    raise
+                self.retries_total += 1
+                continue
+
+            if response.status_code in FAILURE_STATUSES:
+                node.record_failure(time.monotonic())
+                if not last and is_retryable(method, status=response.status_code):
+                    if isinstance(response, httpx.Response):
+                        await response.aclose()
+                    self.retries_total += 1
+                    continue
+            else:
+                node.record_success()
+            return response
+
+    def websocket_url(self, path: str, query: str = "") -> str:
+        """WebSocket URL on one node; the connection then stays on it"""
+        return self.pick().client.websocket_url(path, query)
+
+    async def fetch(self, method: str, url: str, **kwargs: Any) -> UpstreamResponse:
+        return await self._attempt("fetch", method, url, **kwargs)
+
+    async def stream(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        return await self._attempt("stream", method, url, **kwargs)
+
+    async def probe(self, node: Node) -> None:
+        try:
+            response = await node.client.client.get(HEALTH_PATH, timeout=HEALTH_TIMEOUT)
+            ok = response.status_code < 500
+        except httpx.HTTPError:
+            ok = False
+        except Exception:
+            # Anything else is a failed probe too; raising would end the health loop
+            logger.exception("Health check of %s failed", node.client.base_url)
+            ok = False
+
+        if ok:
+            node.probe_failures = 0
+            node.probe_successes += 1
+            if not node.healthy and node.probe_successes >= HEALTH_RISE:
+                node.healthy = True
+                node.consecutive_failures = 0
+                node.ejected_until = 0.0
+                logger.info("Upstream %s is healthy again", node.client.base_url)
+        else:
+            node.probe_successes = 0
+            node.probe_failures += 1
+            if node.healthy and node.probe_failures >= HEALTH_FALL:
+                node.healthy = False
+                logger.warning("Upstream %s failed its health check", node.client.base_url)
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.gather(*(self.probe(node) for node in self.nodes))
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+    async def start(self) -> None:
+        if HEALTH_INTERVAL > 0 and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "strategy": self.strategy,
+            "retries_total": self.retries_total,
+            "requests_in_flight": self.in_flight,
+            "nodes": [node.stats(now) for node in self.nodes],
+        }
+
+    async def aclose(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+        await asyncio.gather(*(node.client.aclose() for node in self.nodes))
+
+
+def create_upstream():
+    """A LoadBalancer when NEXTJS_URLS lists several upstreams, else one client"""
+    if not NEXTJS_URLS:
+        return upstream.create_upstream()
+    if len(NEXTJS_URLS) == 1:
+        return upstream.UpstreamClient(base_url=NEXTJS_URLS[0])
+    return LoadBalancer([upstream.UpstreamClient(base_url=url) for url in NEXTJS_URLS])
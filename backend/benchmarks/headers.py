@@ -0,0 +1,134 @@
+"""Microbenchmark of request and response header forwarding.
+
+    python -m backend.benchmarks.headers --number 20000
+
+Times, per request, the dict-based copying the proxy used to do (decode
+every client header into a dict, then rebuild a dict of the few response
+headers it kept, for Starlette to encode again) against the raw-list pass of ``backend.forwarding``, on a
+browser-like request with cookies and a Next.js-like response with several
+Set-Cookie and Link lines. Run with the same Python as the proxy; the
+numbers are microseconds per request.
+"""
+
+import argparse
+import timeit
+from typing import List, Optional
+
+import httpx
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+from .. import forwarding, tenancy
+
+REQUEST = [
+    (b"host", b"shop.webwaka.com"),
+    (b"connection", b"keep-alive"),
+    (b"user-agent", b"Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36"),
+    (b"accept", b"application/json, text/plain, */*"),
+    (b"accept-encoding", b"gzip, deflate, br"),
+    (b"accept-language", b"en-NG,en;q=0.9"),
+    (b"referer", b"https://shop.webwaka.com/pos"),
+    (b"x-tenant-id", b"tenant-42"),
+    (b"x-request-id", b"7d4c9f80e1a34b59"),
+    (b"cookie", b"session=abc123; theme=dark"),
+    (b"cookie", b"cart=7; consent=1"),
+    (b"sec-fetch-site", b"same-origin"),
+    (b"sec-fetch-mode", b"cors"),
+    (b"sec-fetch-dest", b"empty"),
+    (b"if-none-match", b'"abc"'),
+]
+
+RESPONSE = httpx.Headers([
+    ("content-type", "application/json; charset=utf-8"),
+    ("cache-control", "private, no-cache, no-store, max-age=0, must-revalidate"),
+    ("set-cookie", "session=abc123; Path=/; HttpOnly; SameSite=Lax"),
+    ("set-cookie", "csrf=f00; Path=/; SameSite=Strict"),
+    ("set-cookie", "theme=dark; Path=/"),
+    ("link", "</_next/static/css/app.css>; rel=preload; as=style"),
+    ("link", "</_next/static/chunks/main.js>; rel=preload; as=script"),
+    ("vary", "RSC, Next-Router-State-Tree, Next-Router-Prefetch"),
+    ("x-nextjs-cache", "MISS"),
+    ("date", "Fri, 02 Jan 2026 10:25:26 GMT"),
+    ("connection", "keep-alive"),
+    ("keep-alive", "timeout=5"),
+    ("transfer-encoding", "chunked"),
+])
+
+DOMAIN_HEADERS = {
+    tenancy.PARTNER_HEADER: "p-1",
+    tenancy.TENANT_HEADER: "tenant-42",
+    tenancy.SUITE_HEADER: "commerce",
+}
+DROP = forwarding.dropping(b"host", b"content-length", b"if-none-match", b"x-request-timeout-ms", b"x-request-id")
+RESPONSE_DROP = forwarding.dropping(b"content-length", b"date", b"server", b"server-timing")
+CORS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "*",
+    "Access-Control-Allow-Headers": "*",
+}
+CORS_RAW = forwarding.CorsPolicy(["*"]).headers_for(None)
+
+
+def dict_request() -> dict:
+    """Request headers the way forward_request_headers used to build them"""
+    skipped = ["host", "content-length", "if-none-match"]
+    headers = {}
+    for key, value in Headers(raw=REQUEST).items():
+        lower_key = key.lower()
+        if lower_key in skipped:
+            continue
+        if lower_key.startswith("x-ww-"):
+            continue
+        headers[key] = value
+    headers.update(DOMAIN_HEADERS)
+    headers["x-request-id"] = "7d4c9f80e1a34b59"
+    headers["x-request-timeout-ms"] = "29000"
+    return headers
+
+
+def dict_response() -> list:
+    """Response headers the way build_response used to build them (one cookie)"""
+    resp_headers = dict(CORS)
+    if "set-cookie" in RESPONSE:
+        resp_headers["set-cookie"] = RESPONSE["set-cookie"]
+    content_type = RESPONSE.get("content-type", "")
+    if content_type:
+        resp_headers["content-type"] = content_type
+    return Response(b"{}", headers=resp_headers).raw_headers
+
+
+def raw_request() -> list:
+    extra = [(b"x-request-id", b"7d4c9f80e1a34b59")]
+    extra.extend((name.encode(), value.encode()) for name, value in DOMAIN_HEADERS.items())
+    headers = forwarding.request_headers(REQUEST, DROP, (b"x-ww-",), extra)
+    headers.append((b"x-request-timeout-ms", b"29000"))
+    return headers
+
+
+def raw_response() -> list:
+    response = Response(b"{}")
+    response.raw_headers.extend(forwarding.filter_headers(RESPONSE.raw, RESPONSE_DROP))
+    response.raw_headers.extend(CORS_RAW)
+    return response.raw_headers
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    cases = [
+        ("request, dict copy", dict_request),
+        ("request, raw list", raw_request),
+        ("response, dict copy", dict_response),
+        ("response, raw list", raw_response),
+    ]
+    print(f"{'case':<22} {'us/request':>11}  headers out")
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=args.number, repeat=args.repeat)) / args.number
+        print(f"{name:<22} {best * 1e6:>11.2f}  {len(func())}")
+
+
+if __name__ == "__main__":
+    main()
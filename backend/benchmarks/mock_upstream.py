@@ -0,0 +1,181 @@
+"""Stand-in for Next.js serving canned responses, for benchmarks without a build.
+
+    python -m backend.benchmarks.mock_upstream --port 3001
+    NEXTJS_URL=http://127.0.0.1:3001 python -m backend.run --profile performance
+
+Starting the real frontend through start.sh takes minutes; this ASGI app
+starts in well under a second and answers every route from
+MOCK_UPSTREAM_ROUTES (longest prefix wins, ``default`` for the rest):
+
+    <path prefix>=<body bytes>/<latency ms>/<jitter ms>/<status mix>
+
+The status mix is ``+``-separated ``<status>:<weight>`` pairs, so
+``/api/svm/orders=4096/20/10/200:98+503:2`` answers order routes after
+10 to 30 ms with a 4 KiB JSON body, and with 503 two times in a hundred.
+``/api/health`` answers with the same payload as the real route. Request
+bodies are read and discarded; MOCK_UPSTREAM_SEED makes the latency and
+status draws repeatable.
+
+``GET /__mock/stats`` returns the request count per route and status,
+which is how a benchmark checks what actually reached the upstream.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from ..config import env_int, env_list
+from ..resilience import longest_prefix
+
+MOCK_ROUTES = env_list(
+    "MOCK_UPSTREAM_ROUTES",
+    "/api/health=0/0/0/200,default=2048/5/2/200",
+)
+MOCK_SEED = env_int("MOCK_UPSTREAM_SEED", 0)
+
+HEALTH_PATH = "/api/health"
+HEALTH = b'{"status":"healthy","database":"connected","timestamp":"2026-01-02T10:25:26.057Z","version":"1.0.0"}'
+STATS_PATH = "/__mock/stats"
+
+
+@dataclass
+class MockRoute:
+    size: int = 2048
+    latency: float = 0.0
+    jitter: float = 0.0
+    statuses: List[Tuple[int, float]] = field(default_factory=lambda: [(200, 1.0)])
+
+    def __post_init__(self):
+        self.codes = [status for status, _ in self.statuses]
+        self.weights = [weight for _, weight in self.statuses]
+
+    def delay(self, rng: random.Random) -> float:
+        if not self.jitter:
+            return self.latency
+        return max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+
+    def status(self, rng: random.Random) -> int:
+        if len(self.codes) == 1:
+            return self.codes[0]
+        return rng.choices(self.codes, self.weights)[0]
+
+
+def parse_routes(spec: List[str]) -> Dict[str, MockRoute]:
+    routes = {}
+    for item in spec:
+        prefix, _, values = item.partition("=")
+        size, latency, jitter, mix = values.split("/")
+        statuses = []
+        for pair in mix.split("+"):
+            status, _, weight = pair.partition(":")
+            statuses.append((int(status), float(weight or 1)))
+        routes[prefix.strip()] = MockRoute(int(size), float(latency) / 1000, float(jitter) / 1000, statuses)
+    if "default" not in routes:
+        routes["default"] = MockRoute()
+    return routes
+
+
+def payload(size: int, status: int) -> bytes:
+    """A JSON body of exactly ``size`` bytes (or the smallest valid one)"""
+    if status >= 400:
+        return json.dumps({"success": False, "error": f"Mock upstream status {status}"}).encode()
+    head, tail = b'{"success":true,"data":"', b'"}'
+    return head + b"x" * max(0, size - len(head) - len(tail)) + tail
+
+
+class MockUpstream:
+    """ASGI app answering like Next.js would, minus the work"""
+
+    def __init__(self, routes: Optional[Dict[str, MockRoute]] = None, seed: Optional[int] = MOCK_SEED):
+        self.routes = parse_routes(MOCK_ROUTES) if routes is None else routes
+        self._prefixes = sorted((p for p in self.routes if p != "default"), key=len, reverse=True)
+        self._rng = random.Random(seed)
+        self._bodies: Dict[Tuple[str, int], bytes] = {}
+        self.requests: Counter = Counter()
+
+    def route_for(self, path: str) -> Tuple[str, MockRoute]:
+        prefix = longest_prefix(self._prefixes, path) or "default"
+        return prefix, self.routes[prefix]
+
+    def body_for(self, prefix: str, route: MockRoute, status: int) -> bytes:
+        key = (prefix, status)
+        body = self._bodies.get(key)
+        if body is None:
+            if prefix == HEALTH_PATH and status < 400 and not route.size:
+                body = HEALTH
+            else:
+                body = payload(route.size, status)
+            self._bodies[key] = body
+        return body
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        stats: Dict[str, Dict[str, int]] = {}
+        for (prefix, status), count in sorted(self.requests.items()):
+            stats.setdefault(prefix, {})[str(status)] = count
+        return stats
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        # Drain the request body so keep-alive connections stay usable
+        message = {"more_body": True}
+        while message.get("more_body"):
+            message = await receive()
+
+        if scope["path"] == STATS_PATH:
+            status, body = 200, json.dumps(self.stats()).encode()
+        else:
+            prefix, route = self.route_for(scope["path"])
+            delay = route.delay(self._rng)
+            status = route.status(self._rng)
+            if delay:
+                await asyncio.sleep(delay)
+            self.requests[(prefix, status)] += 1
+            body = self.body_for(prefix, route, status)
+
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+app = MockUpstream()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3001)
+    parser.add_argument("--routes", nargs="+", help="route specs, instead of MOCK_UPSTREAM_ROUTES")
+    parser.add_argument("--seed", type=int, default=MOCK_SEED)
+    args = parser.parse_args(argv)
+
+    routes = parse_routes(args.routes) if args.routes else None
+    uvicorn.run(
+        MockUpstream(routes, seed=args.seed),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Requests per second of ``/api/health`` passthrough, per runtime profile.
+
+    python -m backend.benchmarks.profiles --duration 10 --connections 64
+
+Starts ``backend.benchmarks.mock_upstream`` in place of Next.js (it answers
+``/api/health`` the way the real route does, a small JSON body and no
+database; ``--upstream-routes`` changes that), then, for each profile,
+starts the proxy in front of it, warms it up and drives it
+with keep-alive connections for ``--duration`` seconds. The load generator
+speaks just enough HTTP/1.1 to stay out of the way of the proxy it
+measures. Prints requests per second and latency percentiles per profile;
+``--json`` writes the same numbers to a file.
+
+Profiles:
+
+- ``plain-uvicorn``: this proxy served the way start.sh used to serve it,
+  ``uvicorn backend.server:app`` with asyncio, h11 and the per-request
+  access log. It is the current app, so it isolates the runtime settings
+  and says nothing about the proxy's other changes; check out an older
+  revision to benchmark those
+- ``default`` and ``performance``: ``python -m backend.run --profile ...``.
+  Note that uvicorn picks uvloop and httptools by itself when they are
+  installed (``uvicorn[standard]``), so ``default`` gets them too
+
+Everything runs on one host, so absolute numbers mostly say how fast that
+host is; compare profiles within one run.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from ..run import PERFORMANCE_PROFILE, PROFILES
+
+PLAIN_UVICORN = "plain-uvicorn"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+def start(args: List[str], env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args],
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def stop(process: subprocess.Popen) -> None:
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def connection(port: int, path: str, until: float, latencies: List[float], errors: List[int]) -> None:
+    request = f"GET {path} HTTP/1.1\r\nHost: localhost\r\nAccept: application/json\r\n\r\n".encode()
+    reader = writer = None
+    while time.perf_counter() < until:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            started = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line[:15].lower() == b"content-length:":
+                    length = int(line[15:])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            if not head.startswith(b"HTTP/1.1 200"):
+                errors[0] += 1
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            errors[0] += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def drive(port: int, path: str, connections: int, duration: float) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors = [0]
+    until = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(connection(port, path, until, latencies, errors) for _ in range(connections)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def percentile(q: float) -> float:
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(0.50),
+        "p99_ms": percentile(0.99),
+    }
+
+
+def proxy_command(profile: str, port: int, workers: int) -> List[str]:
+    if profile == PLAIN_UVICORN:
+        return [
+            "-m", "uvicorn", "backend.server:app", "--host", "127.0.0.1", "--port", str(port),
+            "--loop", "asyncio", "--http", "h11", "--workers", str(workers),
+        ]
+    return [
+        "-m", "backend.run", "--host", "127.0.0.1", "--port", str(port),
+        "--profile", profile, "--workers", str(workers),
+    ]
+
+
+def bench_profile(profile: str, upstream_port: int, args: argparse.Namespace) -> Dict[str, float]:
+    port = free_port()
+    proxy = start(
+        proxy_command(profile, port, args.workers),
+        env={"NEXTJS_URL": f"http://127.0.0.1:{upstream_port}"},
+    )
+    try:
+        wait_for_port(port)
+        asyncio.run(drive(port, args.path, args.connections, args.warmup))
+        return asyncio.run(drive(port, args.path, args.connections, args.duration))
+    finally:
+        stop(proxy)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", choices=(PLAIN_UVICORN,) + PROFILES, default=[PLAIN_UVICORN, PERFORMANCE_PROFILE])
+    parser.add_argument("--path", default="/api/health")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--upstream-routes", nargs="+", help="mock upstream route specs, see mock_upstream")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    upstream_port = free_port()
+    upstream_args = ["-m", "backend.benchmarks.mock_upstream", "--port", str(upstream_port)]
+    if args.upstream_routes:
+        upstream_args += ["--routes", *args.upstream_routes]
+    upstream = start(upstream_args)
+    results = {}
+    try:
+        wait_for_port(upstream_port)
+        for profile in args.profiles:
+            results[profile] = bench_profile(profile, upstream_port, args)
+    finally:
+        stop(upstream)
+
+    print(f"{'profile':<14} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for profile, result in results.items():
+        print(
+            f"{profile:<14} {result['rps']:>10.0f} {result['p50_ms']:>8.2f} "
+            f"{result['p99_ms']:>8.2f} {result['errors']:>7d}"
+        )
+    baseline = next(iter(results.values()))
+    for profile, result in list(results.items())[1:]:
+        if baseline["rps"]:
+            print(f"{profile} vs {args.profiles[0]}: {result['rps'] / baseline['rps']:.2f}x")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"path": args.path, "connections": args.connections, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""Opt-in in-process response cache for read-heavy proxied routes.
+
+Catalog style endpoints (``/api/svm/catalog``, ``/api/business-presets``,
+``/api/capabilities`` ...) return the same bytes for the same tenant and
+query over and over. With PROXY_CACHE enabled those GETs are answered from
+memory for a per-route TTL, so repeated reads never reach Next.js or Prisma.
+
+Entries are keyed on method, path, normalised query, the ``x-tenant-id``
+header, the Host (which picks the tenant when none is given, whether the
+proxy or Next.js resolves it) and a configurable set of request headers
+(the "Vary set"). The store
+is an LRU bounded by the total number of bytes it holds. Once an entry
+expires it may still be served for PROXY_CACHE_STALE_SECONDS while a single
+background request refreshes it (stale-while-revalidate).
+
+Each worker process has its own LRU. With PROXY_CACHE_SHARED the LRU is
+backed by a second tier of one file per entry in a tmpfs directory
+(/dev/shm by default), so an entry filled by one worker is served by all
+of them. Files are written whole and renamed into place, their mtime is
+set to the moment they can no longer be served, and every so often a
+sweep drops expired files and the soonest-expiring ones beyond
+PROXY_CACHE_SHARED_MAX_BYTES.
+"""
+
+import asyncio
+import hashlib
+import logging
+import marshal
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Mapping, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+
+from . import compression
+from .config import env_bool, env_float, env_int, env_list, env_str
+from .upstream import UpstreamResponse
+
+logger = logging.getLogger("backend.cache")
+
+CACHE_ENABLED = env_bool("PROXY_CACHE", False)
+CACHE_MAX_BYTES = env_int("PROXY_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+CACHE_STALE_SECONDS = env_float("PROXY_CACHE_STALE_SECONDS", 30.0)
+CACHE_SHARED = env_bool("PROXY_CACHE_SHARED", False)
+CACHE_SHARED_DIR = env_str(
+    "PROXY_CACHE_SHARED_DIR",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "webwaka-cache"),
+)
+CACHE_SHARED_MAX_BYTES = env_int("PROXY_CACHE_SHARED_MAX_BYTES", 256 * 1024 * 1024)
+
+# "<path>=<ttl seconds>" pairs. A path matches exactly unless it ends in
+# "/*", which also covers everything below it (the longest such prefix
+# wins). Sibling routes are often per session, e.g. /api/capabilities/tenant
+# behind /api/capabilities, so only opt into a prefix for public subtrees.
+CACHE_ROUTES = env_list(
+    "PROXY_CACHE_ROUTES",
+    "/api/svm/catalog=30,/api/svm/products/*=30,/api/business-presets=300,/api/capabilities=300",
+)
+
+# Request headers that select a different representation. Unless the proxy
+# compresses responses itself, bodies are stored exactly as the upstream
+# encoded them and accept-encoding is always added to the key.
+CACHE_VARY = env_list("PROXY_CACHE_VARY", "accept,accept-language")
+
+TENANT_HEADER = "x-tenant-id"
+
+FRESH = "fresh"
+STALE = "stale"
+MISS = "miss"
+
+# Rough per-entry bookkeeping cost on top of body, headers and key
+ENTRY_OVERHEAD = 256
+
+
+def parse_routes(spec: List[str]) -> Dict[str, float]:
+    routes = {}
+    for item in spec:
+        path, _, ttl = item.partition("=")
+        path = path.strip()
+        if path.endswith("/*"):
+            path = path[:-2].rstrip("/") + "/*"
+        else:
+            path = path.rstrip("/") or "/"
+        routes[path] = float(ttl)
+    return routes
+
+
+def normalize_query(query: str) -> str:
+    """Order-independent query string so ?a=1&b=2 and ?b=2&a=1 share an entry"""
+    if not query:
+        return ""
+    return urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+
+
+@dataclass
+class CacheEntry:
+    response: UpstreamResponse
+    size: int
+    stored_at: float
+    ttl: float
+
+    def age(self, now: float) -> float:
+        return now - self.stored_at
+
+
+class SharedCacheStore:
+    """Cache entries as files in a directory every worker can read"""
+
+    FORMAT = 2
+
+    def __init__(self, directory: str = CACHE_SHARED_DIR, max_bytes: int = CACHE_SHARED_MAX_BYTES, sweep_every: int = 256):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.sweep_every = sweep_every
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._writes = 0
+        self.reads = 0
+        self.writes = 0
+        self.errors = 0
+        self.swept = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.blake2b(key.encode(), digest_size=16).hexdigest())
+
+    def get(self, key: str) -> Optional[Tuple[UpstreamResponse, float, float, str]]:
+        """The stored response, its wall-clock store time, TTL and tag, if any"""
+        try:
+            with open(self._path(key), "rb") as f:
+                data = marshal.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError, TypeError):
+            self.errors += 1
+            return None
+        if not isinstance(data, tuple) or len(data) != 9 or data[0] != self.FORMAT or data[1] != key:
+            return None
+        _, _, status_code, raw_headers, content, variants, stored_at, ttl, tag = data
+        self.reads += 1
+        return UpstreamResponse(status_code, httpx.Headers(raw_headers), content, variants), stored_at, ttl, tag
+
+    def put(
+        self, key: str, response: UpstreamResponse, ttl: float, stale_seconds: float,
+        now: Optional[float] = None, tag: str = "",
+    ) -> None:
+        """Store ``response``; ``tag`` is an opaque string handed back by get()"""
+        now = time.time() if now is None else now
+        data = marshal.dumps((
+            self.FORMAT, key, response.status_code, list(response.headers.raw),
+            response.content, dict(response.variants), now, ttl, tag,
+        ))
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            expires = now + ttl + stale_seconds
+            os.utime(tmp, (expires, expires))
+            os.replace(tmp, path)
+        except OSError:
+            self.errors += 1
+            logger.warning("Could not write shared cache entry %s", path, exc_info=True)
+            return
+        self.writes += 1
+        self._writes += 1
+        if self._writes >= self.sweep_every:
+            self._writes = 0
+            self.sweep(now)
+
+    def sweep(self, now: Optional[float] = None) -> None:
+        """Drop expired files, then the soonest-expiring ones over max_bytes"""
+        now = time.time() if now is None else now
+        live = []
+        total = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if st.st_mtime < now:
+                    self._unlink(entry.path)
+                    continue
+                live.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        live.sort()
+        for _, size, path in live:
+            if total <= self.max_bytes:
+                break
+            self._unlink(path)
+            total -= size
+
+    def _unlink(self, path: str) -> None:
+        try:
+            os.unlink(path)
+            self.swept += 1
+        except FileNotFoundError:
+            pass
+
+    def clear(self) -> None:
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                self._unlink(entry.path)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "directory": self.directory,
+            "max_bytes": self.max_bytes,
+            "reads": self.reads,
+            "writes": self.writes,
+            "swept": self.swept,
+            "errors": self.errors,
+        }
+
+
+class ResponseCache:
+    """Byte-bounded LRU of upstream responses with TTL and stale-while-revalidate"""
+
+    def __init__(
+        self,
+        routes: Optional[Dict[str, float]] = None,
+        max_bytes: int = CACHE_MAX_BYTES,
+        stale_seconds: float = CACHE_STALE_SECONDS,
+        vary: Optional[List[str]] = None,
+        encoded_bodies: bool = True,
+        shared: Optional[SharedCacheStore] = None,
+    ):
+        self.routes = parse_routes(CACHE_ROUTES) if routes is None else routes
+        # Longest prefix first so the most specific route decides the TTL
+        self._prefixes = sorted((r for r in self.routes if r.endswith("/*")), key=len, reverse=True)
+        self.max_bytes = max_bytes
+        self.stale_seconds = stale_seconds
+        vary_headers = [h.lower() for h in (CACHE_VARY if vary is None else vary)]
+        # With identity bodies every client can be served from one entry
+        self.encoded_bodies = encoded_bodies
+        if encoded_bodies and "accept-encoding" not in vary_headers:
+            vary_headers.append("accept-encoding")
+        self.vary = sorted(set(vary_headers))
+        self.shared = shared
+
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._refreshing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.revalidations = 0
+
+    def ttl_for(self, method: str, path: str) -> Optional[float]:
+        """TTL of the route serving ``path``, or None when it is not cacheable"""
+        if method != "GET":
+            return None
+        path = "/" + path.lstrip("/")
+        ttl = self.routes.get(path)
+        if ttl is not None:
+            return ttl
+        for prefix in self._prefixes:
+            if path == prefix[:-2] or path.startswith(prefix[:-1]):
+                return self.routes[prefix]
+        return None
+
+    def key_for(self, method: str, path: str, query: str, headers: Mapping[str, str]) -> str:
+        parts = [
+            method,
+            "/" + path.lstrip("/"),
+            normalize_query(query),
+            "tenant=" + headers.get(TENANT_HEADER, ""),
+            "host=" + headers.get("host", "").split(":")[0].strip().lower(),
+        ]
+        parts.extend(f"{name}={headers.get(name, '')}" for name in self.vary)
+        return "\n".join(parts)
+
+    def is_storable(self, response: UpstreamResponse) -> bool:
+        """Only plain, shareable 200s are kept"""
+        if response.status_code != 200:
+            return False
+        if "set-cookie" in response.headers:
+            return False
+        encoding = response.headers.get("content-encoding", "identity")
+        if not self.encoded_bodies and encoding != "identity":
+            return False
+        cache_control = response.headers.get("cache-control", "").lower()
+        if any(token in cache_control for token in ("no-store", "private", "no-cache")):
+            return False
+        # The key only knows about our Vary set; anything else may differ per user
+        for name in response.headers.get("vary", "").split(","):
+            name = name.strip().lower()
+            if name == "accept-encoding" and not self.encoded_bodies:
+                continue
+            if name and (name == "*" or name not in self.vary):
+                return False
+        return True
+
+    def lookup(self, key: str, now: Optional[float] = None) -> Tuple[Optional[CacheEntry], str]:
+        now = time.monotonic() if now is None else now
+        entry = self._entries.get(key)
+        if entry is None and self.shared is not None:
+            entry = self._load_shared(key, now)
+        if entry is None:
+            self.misses += 1
+            return None, MISS
+        age = entry.age(now)
+        if age <= entry.ttl:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry, FRESH
+        if age <= entry.ttl + self.stale_seconds:
+            self._entries.move_to_end(key)
+            self.stale_hits += 1
+            return entry, STALE
+        self._remove(key)
+        self.misses += 1
+        return None, MISS
+
+    def _load_shared(self, key: str, now: float) -> Optional[CacheEntry]:
+        """Copy an entry another worker stored into this worker's LRU"""
+        found = self.shared.get(key)
+        if found is None:
+            return None
+        response, stored_at, ttl, _ = found
+        # Keep the original age, so the entry expires at the same time everywhere
+        if not self._insert(key, response, ttl, now - max(0.0, time.time() - stored_at)):
+            return None
+        self.shared_hits += 1
+        return self._entries[key]
+
+    def store(self, key: str, response: UpstreamResponse, ttl: float, now: Optional[float] = None) -> bool:
+        if not self.is_storable(response):
+            return False
+        now = time.monotonic() if now is None else now
+        if not self._insert(key, response, ttl, now):
+            return False
+        self.stores += 1
+        if self.shared is not None:
+            self.shared.put(key, response, ttl, self.stale_seconds)
+        return True
+
+    def _insert(self, key: str, response: UpstreamResponse, ttl: float, stored_at: float) -> bool:
+        size = (
+            len(response.content)
+            + sum(len(body) for body in response.variants.values())
+            + len(key)
+            + sum(len(k) + len(v) for k, v in response.headers.raw)
+            + ENTRY_OVERHEAD
+        )
+        if size > self.max_bytes:
+            return False
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CacheEntry(response, size, stored_at, ttl)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return True
+
+    def revalidate(
+        self, key: str, fetch: Callable[[], Awaitable[UpstreamResponse]], ttl: float
+    ) -> None:
+        """Refresh a stale entry in the background, at most once per key"""
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        task = asyncio.create_task(self._refresh(key, fetch, ttl))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(
+        self, key: str, fetch: Callable[[], Awaitable[UpstreamResponse]], ttl: float
+    ) -> None:
+        try:
+            response = await fetch()
+            self.revalidations += 1
+            self.store(key, response, ttl)
+        except Exception:
+            logger.warning("Background revalidation failed for %r", key, exc_info=True)
+        finally:
+            self._refreshing.discard(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+        if self.shared is not None:
+            self.shared.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, object]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "revalidations": self.revalidations,
+            "routes": self.routes,
+            "shared_hits": self.shared_hits,
+            "shared": self.shared.stats() if self.shared is not None else None,
+        }
+
+
+def create_cache() -> Optional[ResponseCache]:
+    if not CACHE_ENABLED:
+        return None
+    return ResponseCache(
+        encoded_bodies=not compression.COMPRESSION_ENABLED,
+        shared=SharedCacheStore() if CACHE_SHARED else None,
+    )
@@ -0,0 +1,88 @@
+"""Single-flight deduplication of identical in-flight GETs.
+
+When a storefront page is popular many identical reads arrive together.
+With PROXY_COALESCE enabled the first one (the leader) goes to Next.js and
+every identical request that arrives before it finishes waits for, and
+shares, the same upstream response.
+
+Requests are only identical when they could not legitimately get different
+answers: the key covers method, path, normalised query and every request
+header except the ones listed in PROXY_COALESCE_IGNORE_HEADERS, so cookies,
+authorization and Host keep different users and tenants apart. Cache
+misses use this key as well rather than the cache key: whether a response
+is shareable is only known once it arrives.
+"""
+
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple, TypeVar
+
+from .cache import normalize_query
+from .config import env_bool, env_list
+
+COALESCE_ENABLED = env_bool("PROXY_COALESCE", False)
+
+# Headers that never change what Next.js returns for a GET
+COALESCE_IGNORE_HEADERS = env_list(
+    "PROXY_COALESCE_IGNORE_HEADERS",
+    "user-agent,referer,x-request-id,x-forwarded-for,x-forwarded-proto,"
+    "x-forwarded-host,x-real-ip,traceparent,tracestate,connection,"
+    "cache-control,pragma,x-request-timeout-ms",
+)
+
+COALESCE_METHODS = ("GET", "HEAD")
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Share one execution of an awaitable between concurrent callers"""
+
+    def __init__(self, ignore_headers: Optional[Iterable[str]] = None):
+        ignored = COALESCE_IGNORE_HEADERS if ignore_headers is None else ignore_headers
+        self.ignore_headers = frozenset(h.lower() for h in ignored)
+        self._calls: Dict[str, "asyncio.Task"] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def key_for(self, method: str, path: str, query: str, headers: Iterable[Tuple[str, str]]) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        for name, value in sorted((k.lower(), v) for k, v in headers):
+            if name not in self.ignore_headers:
+                digest.update(f"{name}:{value}\n".encode("latin-1", "replace"))
+        return "\n".join([method, "/" + path.lstrip("/"), normalize_query(query), digest.hexdigest()])
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Run ``fn`` once per key; returns the result and whether it was shared.
+
+        The upstream call runs in its own task and every caller (the leader
+        included) waits on it through ``shield``, so a leader whose client
+        disconnects does not cancel the fetch for everyone else.
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.followers += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task), shared
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
+
+
+def create_single_flight() -> Optional[SingleFlight]:
+    if not COALESCE_ENABLED:
+        return None
+    return SingleFlight()
@@ -0,0 +1,143 @@
+"""Accept-Encoding negotiation and response compression at the proxy.
+
+With PROXY_COMPRESSION enabled (the default) the buffered path asks Next.js
+for identity bodies and compresses text and JSON responses itself, picking
+the best encoding the client accepts from PROXY_COMPRESSION_ENCODINGS.
+brotli and zstd come from the ``brotli`` (or ``brotlicffi``) and
+``zstandard`` packages in requirements.txt and are skipped when those are
+missing; gzip is always available. Bodies of PROXY_COMPRESSION_THREAD_SIZE
+bytes or more are compressed in the threadpool so they do not stall the
+event loop.
+
+Bodies already compressed by the upstream are relayed untouched. Responses
+stored in the response cache are compressed once into every available
+encoding when they are stored, so cache hits never spend CPU on compression.
+"""
+
+import gzip
+from typing import Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from .config import env_bool, env_int, env_list
+from .upstream import UpstreamResponse
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_ENABLED = env_bool("PROXY_COMPRESSION", True)
+COMPRESSION_MIN_SIZE = env_int("PROXY_COMPRESSION_MIN_SIZE", 1024)
+COMPRESSION_THREAD_SIZE = env_int("PROXY_COMPRESSION_THREAD_SIZE", 64 * 1024)
+# Server preference order, best first
+COMPRESSION_ENCODINGS = env_list("PROXY_COMPRESSION_ENCODINGS", "br,zstd,gzip")
+COMPRESSION_TYPES = env_list(
+    "PROXY_COMPRESSION_TYPES",
+    "text/,application/json,application/javascript,application/xml,"
+    "application/manifest+json,image/svg+xml",
+)
+GZIP_LEVEL = env_int("PROXY_GZIP_LEVEL", 6)
+BROTLI_LEVEL = env_int("PROXY_BROTLI_LEVEL", 5)
+ZSTD_LEVEL = env_int("PROXY_ZSTD_LEVEL", 3)
+
+
+def _gzip(body: bytes) -> bytes:
+    # mtime=0 keeps the output (and so the ETag) stable across calls
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+COMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {"gzip": _gzip}
+
+if brotli is not None:
+    COMPRESSORS["br"] = lambda body: brotli.compress(body, quality=BROTLI_LEVEL)
+
+if zstandard is not None:
+    _zstd = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    COMPRESSORS["zstd"] = lambda body: _zstd.compress(body)
+
+
+async def compress(encoding: str, body: bytes) -> bytes:
+    """``body`` in ``encoding``; large bodies are compressed off the event loop"""
+    if len(body) >= COMPRESSION_THREAD_SIZE:
+        return await run_in_threadpool(COMPRESSORS[encoding], body)
+    return COMPRESSORS[encoding](body)
+
+
+def available_encodings() -> List[str]:
+    return [name for name in COMPRESSION_ENCODINGS if name in COMPRESSORS]
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """{coding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate(accept_encoding: Optional[str], available: Optional[List[str]] = None) -> Optional[str]:
+    """Best encoding the client accepts, or None for identity.
+
+    ``available`` (in server preference order) defaults to the encodings
+    the proxy can compress into.
+    """
+    if not accept_encoding:
+        return None
+    accepted = parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for name in available_encodings() if available is None else available:
+        q = accepted.get(name, wildcard)
+        # Ties keep the server preference order
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def is_compressible(response: UpstreamResponse) -> bool:
+    if len(response.content) < COMPRESSION_MIN_SIZE:
+        return False
+    if response.headers.get("content-encoding", "identity").lower() != "identity":
+        return False
+    if "no-transform" in response.headers.get("cache-control", "").lower():
+        return False
+    content_type = response.headers.get("content-type", "").lower()
+    return any(content_type.startswith(prefix) for prefix in COMPRESSION_TYPES)
+
+
+async def compressed(response: UpstreamResponse, encoding: str) -> bytes:
+    """The body in ``encoding``, computed once per response"""
+    body = response.variants.get(encoding)
+    if body is None:
+        body = await compress(encoding, response.content)
+        response.variants[encoding] = body
+    return body
+
+
+async def precompress(response: UpstreamResponse) -> UpstreamResponse:
+    """Fill every available variant up front (used before caching)"""
+    if is_compressible(response):
+        for encoding in available_encodings():
+            await compressed(response, encoding)
+    return response
@@ -0,0 +1,46 @@
+"""Environment helpers for the FastAPI proxy.
+
+Every tunable of the gateway is read from the environment once at import
+time, the same way ``NEXTJS_URL`` always has been.
+"""
+
+import os
+from typing import List, Optional
+
+
+def env_str(name: str, default: str) -> str:
+    return os.environ.get(name, default)
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return int(value)
+
+
+def env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return float(value)
+
+
+def env_optional_float(name: str) -> Optional[float]:
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return None
+    return float(value)
+
+
+def env_list(name: str, default: str = "") -> List[str]:
+    """Comma separated list, blanks dropped."""
+    value = os.environ.get(name, default)
+    return [item.strip() for item in value.split(",") if item.strip()]
@@ -0,0 +1,66 @@
+"""Strong ETags and If-None-Match handling at the proxy.
+
+Next.js API routes do not send validators, so clients re-download catalogs
+and dashboards that have not changed. The proxy hashes the body it is about
+to send and answers a matching If-None-Match with an empty 304, which is
+most of the bandwidth on slow mobile links.
+
+The hash covers the body bytes as received from the upstream; when the
+proxy compresses the body itself the coding is appended to the tag, so each
+representation keeps its own strong validator. The tag is stored in the
+response headers, so a cached response is only hashed once.
+"""
+
+import hashlib
+from typing import Optional
+
+from .config import env_bool
+from .upstream import UpstreamResponse
+
+ETAG_ENABLED = env_bool("PROXY_ETAG", True)
+
+ETAG_METHODS = ("GET", "HEAD")
+
+
+def compute_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def is_etaggable(response: UpstreamResponse) -> bool:
+    """Shareable 200s only; a personalised response must not be revalidated"""
+    if response.status_code != 200:
+        return False
+    if "set-cookie" in response.headers:
+        return False
+    return "no-store" not in response.headers.get("cache-control", "").lower()
+
+
+def ensure_etag(response: UpstreamResponse) -> str:
+    """The response's ETag, computing and remembering it when upstream sent none"""
+    tag = response.headers.get("etag")
+    if not tag:
+        tag = compute_etag(response.content)
+        response.headers["etag"] = tag
+    return tag
+
+
+def for_encoding(tag: str, encoding: Optional[str]) -> str:
+    """Distinct strong tag per content-coding, as RFC 7232 requires"""
+    if not encoding or tag.startswith("W/"):
+        return tag
+    return tag[:-1] + "-" + encoding + '"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def if_none_match(header: Optional[str], tag: str) -> bool:
+    """True when If-None-Match matches ``tag`` (weak comparison, RFC 7232 3.2)"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    wanted = _opaque(tag)
+    return any(_opaque(candidate) == wanted for candidate in header.split(","))
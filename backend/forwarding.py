@@ -0,0 +1,133 @@
+"""Header forwarding between clients, the proxy and Next.js.
+
+Headers are handled as the raw ``(name, value)`` byte pairs that the ASGI
+server and httpx already hold, never copied into dicts, so repeated
+headers (``set-cookie``, ``vary``, ``link``, ``cache-control``, split
+``cookie`` lines ...) pass through one line each and in order. Each
+direction is a single pass over the list that drops:
+
+- hop-by-hop headers (RFC 7230 section 6.1): ``connection`` and every
+  header it names, ``keep-alive``, ``proxy-connection``, ``te``,
+  ``trailer``, ``transfer-encoding``, ``upgrade`` and the
+  ``proxy-authenticate``/``proxy-authorization`` pair
+- headers this hop sets itself (``host``, ``content-length``, the request
+  id, the proxy's own ETag and Server-Timing ...), which the caller passes
+  in ``drop`` and, for requests, replaces through ``extra``
+
+CORS is a policy of the proxy rather than a constant: PROXY_CORS_ORIGINS
+("*" by default, as before) lists the allowed origins, a listed request
+Origin is echoed back with ``Vary: Origin``, and PROXY_CORS_CREDENTIALS
+adds ``Access-Control-Allow-Credentials``. Responses whose upstream already
+answered with ``Access-Control-Allow-Origin`` are left as they are.
+"""
+
+from typing import FrozenSet, Iterable, List, Optional, Tuple
+
+from .config import env_bool, env_list, env_str
+
+RawHeaders = List[Tuple[bytes, bytes]]
+
+CORS_ORIGINS = env_list("PROXY_CORS_ORIGINS", "*")
+CORS_METHODS = env_str("PROXY_CORS_METHODS", "*")
+CORS_ALLOW_HEADERS = env_str("PROXY_CORS_HEADERS", "*")
+CORS_CREDENTIALS = env_bool("PROXY_CORS_CREDENTIALS", False)
+
+HOP_BY_HOP = frozenset([
+    b"connection", b"keep-alive", b"proxy-connection", b"te", b"trailer",
+    b"transfer-encoding", b"upgrade", b"proxy-authenticate", b"proxy-authorization",
+])
+
+ALLOW_ORIGIN = b"access-control-allow-origin"
+
+
+def dropping(*names: bytes) -> FrozenSet[bytes]:
+    """A drop set for filter_headers: ``names`` plus the hop-by-hop headers"""
+    return HOP_BY_HOP | frozenset(names)
+
+
+def filter_headers(
+    raw: Iterable[Tuple[bytes, bytes]],
+    drop: FrozenSet[bytes] = HOP_BY_HOP,
+    drop_prefixes: Tuple[bytes, ...] = (),
+    lower: bool = True,
+) -> RawHeaders:
+    """End-to-end headers of ``raw`` in their original order, names lower-cased.
+
+    ``drop`` comes from ``dropping()``. ASGI header names are lower-case
+    already, so request headers can skip that step with ``lower=False``.
+    """
+    kept = []
+    nominated = None
+    for name, value in raw:
+        if lower:
+            name = name.lower()
+        if name in drop:
+            if name == b"connection":
+                tokens = {token.strip().lower() for token in value.split(b",")}
+                nominated = tokens if nominated is None else nominated | tokens
+            continue
+        if drop_prefixes and name.startswith(drop_prefixes):
+            continue
+        kept.append((name, value))
+    # Headers named by Connection are rare; only then is the list revisited
+    if nominated:
+        kept = [(name, value) for name, value in kept if name not in nominated]
+    return kept
+
+
+def request_headers(
+    raw: Iterable[Tuple[bytes, bytes]],
+    drop: FrozenSet[bytes] = HOP_BY_HOP,
+    drop_prefixes: Tuple[bytes, ...] = (),
+    extra: Iterable[Tuple[bytes, bytes]] = (),
+) -> RawHeaders:
+    """Headers to send upstream: the client's ASGI headers minus ``drop``, plus ``extra``.
+
+    ``extra`` replaces client headers of the same names, so ``drop`` or
+    ``drop_prefixes`` must cover those names.
+    """
+    headers = filter_headers(raw, drop, drop_prefixes, lower=False)
+    headers.extend(extra)
+    return headers
+
+
+class CorsPolicy:
+    """Access-Control-* headers the proxy adds to its responses"""
+
+    def __init__(
+        self,
+        origins: Optional[List[str]] = None,
+        methods: str = CORS_METHODS,
+        allow_headers: str = CORS_ALLOW_HEADERS,
+        credentials: bool = CORS_CREDENTIALS,
+    ):
+        origins = CORS_ORIGINS if origins is None else origins
+        self.any_origin = "*" in origins
+        self.origins = frozenset(origin.encode("latin-1") for origin in origins if origin != "*")
+        self.credentials = credentials
+        self._common = [
+            (b"access-control-allow-methods", methods.encode("latin-1")),
+            (b"access-control-allow-headers", allow_headers.encode("latin-1")),
+        ]
+        if credentials:
+            self._common.append((b"access-control-allow-credentials", b"true"))
+        self._wildcard = [(ALLOW_ORIGIN, b"*")] + self._common
+
+    def headers_for(self, origin: Optional[bytes]) -> RawHeaders:
+        # Browsers refuse "*" on credentialed requests, so the origin is echoed
+        if self.any_origin and not (self.credentials and origin):
+            return self._wildcard
+        if origin and (self.any_origin or origin in self.origins):
+            return [(ALLOW_ORIGIN, origin), (b"vary", b"Origin")] + self._common
+        return []
+
+    def apply(self, headers: RawHeaders, origin: Optional[bytes]) -> None:
+        """Add the policy's headers unless the response already has CORS headers"""
+        for name, _ in headers:
+            if name == ALLOW_ORIGIN:
+                return
+        headers.extend(self.headers_for(origin))
+
+
+def create_cors() -> CorsPolicy:
+    return CorsPolicy()
@@ -0,0 +1,278 @@
+"""Idempotency-Key enforcement and replay for write endpoints.
+
+Retries from flaky mobile networks reach order, wallet and payment routes
+after the first attempt already went through, and Next.js and Postgres
+redo the whole transaction. With PROXY_IDEMPOTENCY enabled a POST, PUT or
+PATCH to one of PROXY_IDEMPOTENCY_ROUTES that carries an
+``Idempotency-Key`` header is executed at most once per key:
+
+- the first request goes to Next.js and its response is kept for
+  PROXY_IDEMPOTENCY_TTL seconds
+- a duplicate arriving later is answered from that response, with
+  ``Idempotent-Replayed: true``, without touching the upstream
+- a duplicate arriving while the first is still in flight waits for it
+  (within its own deadline) and gets the same response
+- reusing a key for a different request (other method, path, query or
+  body) is refused with 422, and a malformed key with 400
+
+Keys are scoped to the tenant and to the caller's credentials: the
+PROXY_IDEMPOTENCY_SCOPE_HEADERS headers and the PROXY_IDEMPOTENCY_SCOPE_COOKIES
+session cookies, so one user can never be replayed another user's response.
+Other cookies (analytics, preferences) do not split the scope, so a retry
+whose tracking cookie changed in between is still recognised. The original upstream call runs in its own task:
+a client that disconnects does not cancel it, and its retry gets the
+result. Server errors (5xx) and the transient 408/409/425/429 are not
+kept, so those are retried for real.
+
+Completed responses sit in an LRU bounded by PROXY_IDEMPOTENCY_MAX_ENTRIES
+and PROXY_IDEMPOTENCY_MAX_BYTES. With PROXY_IDEMPOTENCY_SHARED (set by
+``backend.run`` for several workers) they are also written to a tmpfs
+directory, so a retry that lands on another worker is replayed too;
+waiting on an in-flight original only works within one worker.
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+from .cache import SharedCacheStore, normalize_query
+from .config import env_bool, env_float, env_int, env_list, env_str
+from .resilience import longest_prefix
+from .upstream import UpstreamResponse
+
+IDEMPOTENCY_ENABLED = env_bool("PROXY_IDEMPOTENCY", False)
+IDEMPOTENCY_HEADER = env_str("PROXY_IDEMPOTENCY_HEADER", "idempotency-key")
+IDEMPOTENCY_ROUTES = env_list("PROXY_IDEMPOTENCY_ROUTES", "/api/svm/orders,/api/wallets,/api/payments")
+IDEMPOTENCY_TTL = env_float("PROXY_IDEMPOTENCY_TTL", 24 * 3600.0)
+IDEMPOTENCY_MAX_ENTRIES = env_int("PROXY_IDEMPOTENCY_MAX_ENTRIES", 10000)
+IDEMPOTENCY_MAX_BYTES = env_int("PROXY_IDEMPOTENCY_MAX_BYTES", 32 * 1024 * 1024)
+IDEMPOTENCY_SCOPE_HEADERS = env_list("PROXY_IDEMPOTENCY_SCOPE_HEADERS", "authorization")
+# The session cookie set by frontend/src/lib/auth.ts
+IDEMPOTENCY_SCOPE_COOKIES = env_list("PROXY_IDEMPOTENCY_SCOPE_COOKIES", "session_token")
+IDEMPOTENCY_SHARED = env_bool("PROXY_IDEMPOTENCY_SHARED", False)
+IDEMPOTENCY_SHARED_DIR = env_str(
+    "PROXY_IDEMPOTENCY_SHARED_DIR",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "webwaka-idempotency"),
+)
+
+IDEMPOTENCY_METHODS = ("POST", "PUT", "PATCH")
+REPLAYED_HEADER = "idempotent-replayed"
+MAX_KEY_LENGTH = 255
+
+# Responses worth retrying for real instead of replaying
+TRANSIENT_STATUSES = (408, 409, 425, 429)
+
+# Rough per-entry bookkeeping cost on top of body, headers and key
+ENTRY_OVERHEAD = 256
+
+
+def parse_cookies(header: str) -> Dict[str, str]:
+    """{name: value} from a Cookie header; the first of repeated names wins"""
+    cookies: Dict[str, str] = {}
+    for item in header.split(";"):
+        name, sep, value = item.strip().partition("=")
+        if sep and name not in cookies:
+            cookies[name] = value
+    return cookies
+
+
+class InvalidKey(Exception):
+    """Empty, over-long or non-printable Idempotency-Key"""
+
+
+class KeyReused(Exception):
+    """The key was first used for a different request"""
+
+    def __init__(self, key: str):
+        super().__init__(f"Idempotency-Key reused for a different request: {key}")
+        self.key = key
+
+
+def fingerprint(method: str, path: str, query: str, body: bytes) -> str:
+    """What makes two requests with one key the same request"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{method}\n/{path.lstrip('/')}\n{normalize_query(query)}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def is_storable(response: UpstreamResponse) -> bool:
+    return response.status_code < 500 and response.status_code not in TRANSIENT_STATUSES
+
+
+@dataclass
+class Entry:
+    fingerprint: str
+    task: Optional["asyncio.Future"] = None
+    response: Optional[UpstreamResponse] = None
+    size: int = 0
+    expires_at: float = 0.0
+
+
+class IdempotencyStore:
+    """Executes each idempotent request once and replays its response"""
+
+    def __init__(
+        self,
+        routes: Optional[List[str]] = None,
+        ttl: float = IDEMPOTENCY_TTL,
+        max_entries: int = IDEMPOTENCY_MAX_ENTRIES,
+        max_bytes: int = IDEMPOTENCY_MAX_BYTES,
+        scope_headers: Optional[List[str]] = None,
+        scope_cookies: Optional[List[str]] = None,
+        shared: Optional[SharedCacheStore] = None,
+    ):
+        routes = IDEMPOTENCY_ROUTES if routes is None else routes
+        self._prefixes = sorted(routes, key=len, reverse=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.scope_headers = [h.lower() for h in (IDEMPOTENCY_SCOPE_HEADERS if scope_headers is None else scope_headers)]
+        self.scope_cookies = IDEMPOTENCY_SCOPE_COOKIES if scope_cookies is None else scope_cookies
+        self.shared = shared
+        self._entries: "OrderedDict[str, Entry]" = OrderedDict()
+        self.bytes = 0
+        self.originals = 0
+        self.replays = 0
+        self.joined = 0
+        self.conflicts = 0
+        self.not_stored = 0
+        self.evictions = 0
+
+    def applies(self, method: str, path: str) -> bool:
+        return method in IDEMPOTENCY_METHODS and longest_prefix(self._prefixes, path) is not None
+
+    def scope_key(self, key: str, tenant: str, headers: Mapping[str, str]) -> str:
+        """The key as seen by this store: per tenant and per caller"""
+        if not key or len(key) > MAX_KEY_LENGTH or not key.isprintable():
+            raise InvalidKey(key)
+        digest = hashlib.blake2b(digest_size=16)
+        for name in self.scope_headers:
+            digest.update(f"{name}:{headers.get(name, '')}\n".encode("latin-1", "replace"))
+        cookies = parse_cookies(headers.get("cookie", ""))
+        for name in self.scope_cookies:
+            digest.update(f"cookie {name}:{cookies.get(name, '')}\n".encode("latin-1", "replace"))
+        return f"{tenant}\n{digest.hexdigest()}\n{key}"
+
+    def _lookup(self, key: str, now: float) -> Optional[Entry]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.response is not None and entry.expires_at <= now:
+            self._remove(key)
+            entry = None
+        if entry is None and self.shared is not None:
+            found = self.shared.get(key)
+            if found is not None:
+                response, stored_at, ttl, tag = found
+                expires_at = now + ttl - max(0.0, time.time() - stored_at)
+                if expires_at > now:
+                    entry = Entry(tag)
+                    self._store(key, entry, response, expires_at)
+        return entry
+
+    async def do(
+        self,
+        key: str,
+        request_fingerprint: str,
+        fn: Callable[[], Awaitable[UpstreamResponse]],
+        timeout: Optional[float] = None,
+        now: Optional[float] = None,
+    ) -> Tuple[UpstreamResponse, bool]:
+        """Run ``fn`` once per key; returns the response and whether it was replayed.
+
+        Raises KeyReused when the key belongs to another request, and
+        asyncio.TimeoutError when a duplicate outlives ``timeout`` waiting
+        for the original.
+        """
+        now = time.monotonic() if now is None else now
+        entry = self._lookup(key, now)
+        if entry is not None:
+            if entry.fingerprint != request_fingerprint:
+                self.conflicts += 1
+                raise KeyReused(key.rpartition("\n")[2])
+            if entry.response is not None:
+                self._entries.move_to_end(key)
+                self.replays += 1
+                return entry.response, True
+            self.joined += 1
+            return await asyncio.wait_for(asyncio.shield(entry.task), timeout), True
+
+        self.originals += 1
+        entry = Entry(request_fingerprint, task=asyncio.ensure_future(fn()))
+        self._entries[key] = entry
+        entry.task.add_done_callback(lambda task: self._finish(key, entry, task))
+        return await asyncio.shield(entry.task), False
+
+    def _finish(self, key: str, entry: Entry, task: "asyncio.Future") -> None:
+        if self._entries.get(key) is not entry:
+            return
+        if task.cancelled() or task.exception() is not None or not is_storable(task.result()):
+            # Nothing to replay: the next attempt goes to Next.js again
+            self.not_stored += 1
+            del self._entries[key]
+            return
+        response = task.result()
+        self._store(key, entry, response, time.monotonic() + self.ttl)
+        if self.shared is not None:
+            self.shared.put(key, response, self.ttl, 0.0, tag=entry.fingerprint)
+
+    def _store(self, key: str, entry: Entry, response: UpstreamResponse, expires_at: float) -> None:
+        if key in self._entries:
+            self._entries.pop(key)
+        entry.task = None
+        entry.response = response
+        entry.expires_at = expires_at
+        entry.size = (
+            len(response.content)
+            + len(key)
+            + sum(len(k) + len(v) for k, v in response.headers.raw)
+            + ENTRY_OVERHEAD
+        )
+        self._entries[key] = entry
+        self.bytes += entry.size
+        # In-flight entries are tiny and must stay; evict completed ones, oldest first
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(
+                (k for k, e in self._entries.items() if e.response is not None and k != key), None
+            )
+            if oldest is None:
+                break
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+
+    @property
+    def in_flight(self) -> int:
+        return sum(1 for entry in self._entries.values() if entry.response is None)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "entries": len(self._entries),
+            "in_flight": self.in_flight,
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "originals": self.originals,
+            "replays": self.replays,
+            "joined": self.joined,
+            "conflicts": self.conflicts,
+            "not_stored": self.not_stored,
+            "evictions": self.evictions,
+            "routes": self._prefixes,
+            "shared": self.shared.stats() if self.shared is not None else None,
+        }
+
+
+def create_store() -> Optional[IdempotencyStore]:
+    if not IDEMPOTENCY_ENABLED:
+        return None
+    shared = SharedCacheStore(IDEMPOTENCY_SHARED_DIR, max_bytes=IDEMPOTENCY_MAX_BYTES) if IDEMPOTENCY_SHARED else None
+    return IdempotencyStore(shared=shared)
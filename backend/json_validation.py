@@ -0,0 +1,52 @@
+"""Cheap well-formedness check for proxied JSON bodies.
+
+The proxy forwards JSON as raw bytes; this is only used when
+PROXY_VALIDATE_JSON is enabled to stop a truncated or corrupt upstream
+body from reaching clients. The fastest available parser is picked once:
+``simdjson`` validates into its own tape without creating Python objects,
+``orjson`` is a fast C fallback, and the stdlib ``json`` always works.
+"""
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+import json
+
+if simdjson is not None:
+    BACKEND = "simdjson"
+    _parser = simdjson.Parser()
+
+    def _check(body: bytes) -> None:
+        # The parsed document is a lazy view; dropping it right away keeps
+        # the parser free for the next call.
+        _parser.parse(body)
+
+elif orjson is not None:
+    BACKEND = "orjson"
+
+    def _check(body: bytes) -> None:
+        orjson.loads(body)
+
+else:
+    BACKEND = "json"
+
+    def _check(body: bytes) -> None:
+        json.loads(body)
+
+
+def is_well_formed(body: bytes) -> bool:
+    """True when ``body`` is a complete JSON document"""
+    if not body:
+        return False
+    try:
+        _check(body)
+    except ValueError:
+        return False
+    return True
@@ -0,0 +1,92 @@
+"""Load tests against Next.js or the proxy, replacing run-load-tests.js.
+
+    python -m backend.loadtest                          # the five autocannon scenarios
+    python -m backend.loadtest health cartRead          # specific workloads
+    python -m backend.loadtest shopping --duration 60   # browse/add-to-cart/checkout mix
+    python -m backend.loadtest shopping --model open --rate 200
+
+API_URL (or ``--url``) is the target, http://localhost:3000 by default;
+point it at the proxy on port 8000 to measure it, or at
+``backend.benchmarks.mock_upstream`` to measure the tool. The report is
+written to frontend/load-tests/report-<ms>.json, as before.
+"""
+
+import argparse
+import asyncio
+import os
+from typing import List, Optional
+
+from ..config import env_str
+from . import report
+from .runner import Runner
+from .scenarios import LEGACY_WORKLOADS, MODELS, WORKLOADS
+
+API_URL = env_str("API_URL", "http://localhost:3000")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m backend.loadtest", description=__doc__.splitlines()[0])
+    parser.add_argument("workloads", nargs="*", help=f"any of: {', '.join(WORKLOADS)}")
+    parser.add_argument("--url", default=API_URL)
+    parser.add_argument("--duration", type=float, help="seconds, instead of each workload's own")
+    parser.add_argument("--connections", type=int, help="closed model: virtual users; open model: concurrency cap")
+    parser.add_argument("--model", choices=MODELS)
+    parser.add_argument("--rate", type=float, help="scenarios started per second (closed model: paced users)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds per request")
+    parser.add_argument("--seed", type=int, help="repeatable scenario picks")
+    parser.add_argument("--output-dir", default=report.REPORT_DIR)
+    parser.add_argument("--output", help="report file, instead of <output-dir>/report-<ms>.json")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    names = args.workloads or LEGACY_WORKLOADS
+    unknown = [name for name in names if name not in WORKLOADS]
+    if unknown:
+        print(f"Unknown workloads: {', '.join(unknown)}")
+        print(f"Available workloads: {', '.join(WORKLOADS)}")
+        return 1
+
+    runner = Runner(args.url, timeout=args.timeout, seed=args.seed)
+    entries = []
+    for name in names:
+        workload = WORKLOADS[name].with_options(
+            duration=args.duration, connections=args.connections, model=args.model, rate=args.rate
+        )
+        print(f"\n{'=' * 60}\nRunning: {workload.title}\nURL: {args.url}")
+        load = f"{workload.connections} connections"
+        if workload.rate > 0:
+            load += f" at {workload.rate:g} scenarios/s"
+        print(f"Duration: {workload.duration:g}s, {workload.model} model, {load}\n{'=' * 60}")
+
+        entry = report.entry(name, asyncio.run(runner.run(workload)))
+        analysis = entry["analysis"]
+        print(f"   Requests/sec: {analysis['requests']['average']:.2f}")
+        print(f"   {'Latency ms':<12} {'uncorrected':>12} {'corrected':>12}")
+        for stat in ("average", "p50", "p90", "p99", "p999", "max"):
+            print(f"   {stat:<12} {analysis['latency'][stat]:>12.2f} {analysis['correctedLatency'][stat]:>12.2f}")
+        print(f"   Correction: {analysis['correction']['method']}")
+        print(
+            f"   Errors: {analysis['errors']}  Timeouts: {analysis['timeouts']}  "
+            f"Dropped: {analysis['dropped']}  Non-2xx: {analysis['non2xx']}"
+        )
+        for line in entry["assessment"]:
+            print(f"   {line}")
+        entries.append(entry)
+
+    print(f"\n{'=' * 60}\nLOAD TEST SUMMARY\n{'=' * 60}")
+    for entry in entries:
+        analysis = entry["analysis"]
+        print(
+            f"{entry['testName']}: {analysis['requests']['average']:.0f} req/s | "
+            f"p99: {analysis['latency']['p99']:.0f}ms (corrected {analysis['correctedLatency']['p99']:.0f}ms) | "
+            f"errors: {analysis['errors']}"
+        )
+    os.makedirs(args.output_dir, exist_ok=True)
+    print(f"\nFull report saved to: {report.write(entries, args.output_dir, args.output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,89 @@
+"""Keep-alive HTTP/1.1 connection for the load generator.
+
+httpx spends more time per request than the proxy it would be measuring,
+so, like the profile benchmark, the load generator speaks just enough
+HTTP/1.1 itself: one request at a time per connection, responses framed
+by Content-Length or chunked encoding, reconnecting when the server
+closes.
+"""
+
+import asyncio
+import ssl
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class Target:
+    """Where requests go: host, port, TLS and the Host header"""
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.tls = parts.scheme == "https"
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if self.tls else 80)
+        self.prefix = parts.path.rstrip("/")
+        default_port = (self.tls and self.port == 443) or (not self.tls and self.port == 80)
+        self.host_header = self.host if default_port else f"{self.host}:{self.port}"
+
+
+class Connection:
+    def __init__(self, target: Target):
+        self.target = target
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, headers: bytes = b"", body: bytes = b"") -> Tuple[int, int]:
+        """Send one request; returns the status and the bytes received"""
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(
+                self.target.host,
+                self.target.port,
+                ssl=ssl.create_default_context() if self.target.tls else None,
+            )
+        head = (
+            f"{method} {self.target.prefix}{path} HTTP/1.1\r\n"
+            f"Host: {self.target.host_header}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+        ).encode()
+        self._writer.write(head + headers + b"\r\n" + body)
+
+        reader = self._reader
+        response_head = await reader.readuntil(b"\r\n\r\n")
+        status = int(response_head[9:12])
+        length = None
+        chunked = close = False
+        for line in response_head.split(b"\r\n")[1:]:
+            name, _, value = line.partition(b":")
+            name = name.strip().lower()
+            if name == b"content-length":
+                length = int(value)
+            elif name == b"transfer-encoding":
+                chunked = b"chunked" in value.lower()
+            elif name == b"connection":
+                close = b"close" in value.lower()
+
+        received = len(response_head)
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            pass
+        elif chunked:
+            while True:
+                size_line = await reader.readuntil(b"\r\n")
+                size = int(size_line.split(b";")[0], 16)
+                await reader.readexactly(size + 2)
+                received += len(size_line) + size + 2
+                if size == 0:
+                    break
+        elif length is not None:
+            await reader.readexactly(length)
+            received += length
+        else:
+            received += len(await reader.read())
+            close = True
+        if close:
+            self.close()
+        return status, received
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
@@ -0,0 +1,298 @@
+"""Regression gate: compare load test reports and fail on slowdowns.
+
+    python -m backend.loadtest.compare                      # the two newest reports
+    python -m backend.loadtest.compare base.json new.json --threshold 5
+    python -m backend.loadtest.compare base.json a.json b.json --corrected
+
+The first report is the baseline; every other one is compared with it,
+test by test (``testName``), on p50 and p99 latency, on throughput
+(requests per second) and on the share of requests that failed
+(``errors``: errors, timeouts and dropped requests) or got a non-2xx
+answer (``non2xx``). One run's numbers are a sample, so each change
+comes with a bootstrap confidence interval:
+
+- latency percentiles are resampled from the report's histogram (the
+  corrected one with ``--corrected``); the bootstrap percentile of a
+  resample is drawn directly as a Beta order statistic, so this stays
+  fast for millions of requests
+- throughput is resampled from the per-second request counts
+- failure rates are drawn from the normal approximation of the binomial
+
+A latency or throughput change is a regression when it is worse than
+``--threshold`` percent, a failure rate when it rose by more than
+``--rate-threshold`` percentage points, and in both cases only when the
+interval does not include zero, i.e. it is both large and not noise. A
+test of the baseline missing from the candidate is a regression too.
+Reports from before the histograms (autocannon's) only have point
+values; those are compared as they are and say so. Exits 1 when any
+test regressed, so it can gate a release.
+"""
+
+import argparse
+import bisect
+import glob
+import json
+import math
+import os
+import random
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional
+
+from . import report
+
+METRICS = ("p50", "p99", "throughput", "errors", "non2xx")
+PERCENTILES = {"p50": 50.0, "p99": 99.0}
+# Compared as a difference in the share of requests, not a relative change
+RATES = ("errors", "non2xx")
+# The metric of a test that the candidate did not run at all
+MISSING = "missing"
+
+
+@dataclass
+class Comparison:
+    test: str
+    metric: str
+    baseline: float
+    candidate: float
+    change: float
+    low: float
+    high: float
+    bootstrapped: bool
+    regression: bool
+    improvement: bool
+
+
+class Distribution:
+    """Bootstrap draws of one metric of one test in one report"""
+
+    def __init__(self, analysis: Dict[str, object], metric: str, corrected: bool, rng: random.Random):
+        self.rng = rng
+        self.draw: Optional[Callable[[], float]] = None
+        if metric == "throughput":
+            self._throughput(analysis)
+        elif metric in RATES:
+            self._rate(analysis, metric)
+        else:
+            self._latency(analysis, PERCENTILES[metric], corrected)
+
+    def _latency(self, analysis: Dict[str, object], percent: float, corrected: bool) -> None:
+        key = "correctedLatency" if corrected and "correctedLatency" in analysis else "latency"
+        self.value = analysis[key][f"p{percent:g}"]
+        pairs = analysis.get("correctedHistogram" if key == "correctedLatency" else "histogram")
+        if not pairs:
+            return
+        values = [value / 1000 for value, _ in pairs]
+        cumulative = []
+        total = 0
+        for _, count in pairs:
+            total += count
+            cumulative.append(total)
+        rank = max(1, int(percent / 100 * total + 0.5))
+
+        def draw() -> float:
+            # The rank-th smallest of ``total`` uniforms, mapped through the histogram
+            u = self.rng.betavariate(rank, total - rank + 1)
+            return values[min(len(values) - 1, bisect.bisect_left(cumulative, max(1, math.ceil(u * total))))]
+
+        self.draw = draw
+
+    def _throughput(self, analysis: Dict[str, object]) -> None:
+        self.value = analysis["requests"]["average"]
+        samples = analysis.get("requestsPerSecond")
+        if not samples:
+            return
+
+        def draw() -> float:
+            return sum(self.rng.choices(samples, k=len(samples))) / len(samples)
+
+        self.draw = draw
+
+    def _rate(self, analysis: Dict[str, object], metric: str) -> None:
+        answered = analysis["requests"]["total"]
+        if metric == "errors":
+            # ``dropped`` already includes the errors; older reports only count errors
+            failed = analysis.get("dropped", analysis["errors"])
+            total = answered + failed
+        else:
+            failed = analysis.get("non2xx")
+            total = answered
+        if failed is None:
+            self.value = None
+            return
+        self.value = failed / total if total else 0.0
+        if not total:
+            return
+        spread = math.sqrt(self.value * (1 - self.value) / total)
+
+        def draw() -> float:
+            return min(1.0, max(0.0, self.rng.gauss(self.value, spread)))
+
+        self.draw = draw
+
+
+def compare_metric(
+    test: str,
+    metric: str,
+    baseline: Distribution,
+    candidate: Distribution,
+    threshold: float,
+    confidence: float,
+    rounds: int,
+    rate_threshold: float = 1.0,
+) -> Comparison:
+    """Relative change of ``metric`` (absolute for rates), positive meaning worse"""
+    sign = -1 if metric == "throughput" else 1
+
+    def change(base: float, new: float) -> float:
+        if metric in RATES:
+            return new - base + 0.0
+        if not base:
+            return 0.0 if not new else math.inf
+        return sign * (new / base - 1) + 0.0  # no -0.0
+
+    point = change(baseline.value, candidate.value)
+    bootstrapped = baseline.draw is not None and candidate.draw is not None
+    if bootstrapped:
+        changes = sorted(change(baseline.draw(), candidate.draw()) for _ in range(rounds))
+        tail = (1 - confidence) / 2
+        low = changes[int(tail * (rounds - 1))]
+        high = changes[int((1 - tail) * (rounds - 1))]
+    else:
+        low = high = point
+    limit = (rate_threshold if metric in RATES else threshold) / 100
+    return Comparison(
+        test=test,
+        metric=metric,
+        baseline=baseline.value,
+        candidate=candidate.value,
+        change=point,
+        low=low,
+        high=high,
+        bootstrapped=bootstrapped,
+        regression=point > limit and low > 0,
+        improvement=point < -limit and high < 0,
+    )
+
+
+def compare_reports(
+    baseline: List[Dict[str, object]],
+    candidate: List[Dict[str, object]],
+    metrics=METRICS,
+    threshold: float = 10.0,
+    confidence: float = 0.95,
+    rounds: int = 2000,
+    corrected: bool = False,
+    seed: Optional[int] = 0,
+    rate_threshold: float = 1.0,
+) -> List[Comparison]:
+    """Every metric of every baseline test; tests new in the candidate are skipped"""
+    rng = random.Random(seed)
+    after = {entry["testName"]: entry["analysis"] for entry in candidate}
+    comparisons = []
+    for entry in baseline:
+        name = entry["testName"]
+        if name not in after:
+            comparisons.append(Comparison(
+                test=name, metric=MISSING, baseline=1.0, candidate=0.0, change=math.inf,
+                low=math.inf, high=math.inf, bootstrapped=False, regression=True, improvement=False,
+            ))
+            continue
+        for metric in metrics:
+            before_metric = Distribution(entry["analysis"], metric, corrected, rng)
+            after_metric = Distribution(after[name], metric, corrected, rng)
+            # Autocannon reports did not count non-2xx answers
+            if before_metric.value is None or after_metric.value is None:
+                continue
+            comparisons.append(compare_metric(
+                name, metric, before_metric, after_metric, threshold, confidence, rounds, rate_threshold,
+            ))
+    return comparisons
+
+
+def newest_reports(directory: str, count: int = 2) -> List[str]:
+    """The ``count`` most recent report-<ms>.json files, oldest first"""
+    def stamp(path: str) -> int:
+        digits = os.path.basename(path)[len("report-"):-len(".json")]
+        return int(digits) if digits.isdigit() else 0
+
+    return sorted(glob.glob(os.path.join(directory, "report-*.json")), key=stamp)[-count:]
+
+
+def verdict(comparison: Comparison) -> str:
+    if comparison.metric == MISSING:
+        return "MISSING"
+    if comparison.regression:
+        return "REGRESSION"
+    if comparison.improvement:
+        return "improved"
+    return "ok"
+
+
+def print_comparisons(baseline: str, candidate: str, comparisons: List[Comparison], confidence: float) -> None:
+    print(f"\n{os.path.basename(candidate)} vs {os.path.basename(baseline)}")
+    print(f"{'test':<18} {'metric':<11} {'baseline':>10} {'candidate':>10} {'change':>8}  {f'{confidence:.0%} CI':<17} verdict")
+    for c in comparisons:
+        if c.metric == MISSING:
+            print(f"{c.test:<18} {'-':<11} {'ran':>10} {'not run':>10} {'':>8}  {'':<17} {verdict(c)}")
+            continue
+        if c.metric in RATES:
+            # Rates in percent, their change in percentage points
+            values = f"{c.baseline:>10.2%} {c.candidate:>10.2%} {c.change * 100:>+6.2f}pt"
+            low, high = f"{c.low * 100:+.2f}pt", f"{c.high * 100:+.2f}pt"
+        else:
+            values = f"{c.baseline:>10.2f} {c.candidate:>10.2f} {c.change:>+8.1%}"
+            low, high = f"{c.low:+.1%}", f"{c.high:+.1%}"
+        interval = f"[{low}, {high}]" if c.bootstrapped else "(point only)"
+        print(f"{c.test:<18} {c.metric:<11} {values}  {interval:<17} {verdict(c)}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.loadtest.compare", description=__doc__.splitlines()[0])
+    parser.add_argument("reports", nargs="*", help="baseline first; the two newest reports if none")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent worse that counts as a regression")
+    parser.add_argument(
+        "--rate-threshold", type=float, default=1.0,
+        help="percentage points more failed or non-2xx requests that count as a regression",
+    )
+    parser.add_argument("--metrics", nargs="+", choices=METRICS, default=list(METRICS))
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--rounds", type=int, default=2000, help="bootstrap resamples")
+    parser.add_argument("--corrected", action="store_true", help="compare coordinated-omission-corrected latencies")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report-dir", default=report.REPORT_DIR)
+    parser.add_argument("--json", help="also write the comparisons to this file")
+    args = parser.parse_args(argv)
+
+    paths = args.reports or newest_reports(args.report_dir)
+    if len(paths) < 2:
+        parser.error("need a baseline and at least one report to compare with it")
+
+    baseline = report.load(paths[0])
+    results = {}
+    regressions = 0
+    for path in paths[1:]:
+        comparisons = compare_reports(
+            baseline, report.load(path), args.metrics, args.threshold,
+            args.confidence, args.rounds, args.corrected, args.seed, args.rate_threshold,
+        )
+        print_comparisons(paths[0], path, comparisons, args.confidence)
+        regressions += sum(1 for c in comparisons if c.regression)
+        results[path] = [asdict(c) for c in comparisons]
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "baseline": paths[0],
+                "threshold": args.threshold,
+                "rateThreshold": args.rate_threshold,
+                "comparisons": results,
+            }, f, indent=2)
+    if regressions:
+        print(f"\n{regressions} regression(s) (thresholds {args.threshold:g}%, {args.rate_threshold:g}pt)")
+        return 1
+    print(f"\nNo regressions (thresholds {args.threshold:g}%, {args.rate_threshold:g}pt)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
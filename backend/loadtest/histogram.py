@@ -0,0 +1,144 @@
+"""High dynamic range latency histogram.
+
+Sorting every sample, the way the profile benchmark does, is fine for a
+few seconds of one path; a load test of many minutes and several
+scenarios records millions. This keeps HdrHistogram's bucket layout
+instead: values are counted in buckets whose width grows with the value,
+so any recorded value is reported within ``10 ** -significant_figures``
+of what was measured, from one microsecond to an hour, in a fixed ~35k
+counters. Histograms of the same layout can be added together, and a
+sparse ``[value, count]`` list of one is what the JSON report carries.
+
+``record_corrected`` is HdrHistogram's coordinated omission correction
+for loads that had no schedule of their own: a value ``n`` expected
+intervals long also stands for the requests that would have been sent,
+and kept waiting, while it was outstanding.
+"""
+
+import math
+from typing import Iterator, List, Optional, Tuple
+
+
+class Histogram:
+    """Counts of integer values (microseconds, here) in log-linear buckets"""
+
+    def __init__(self, lowest: int = 1, highest: int = 3_600_000_000, significant_figures: int = 3):
+        self.lowest = lowest
+        self.highest = highest
+        self.significant_figures = significant_figures
+        sub_bucket_count_magnitude = math.ceil(math.log2(2 * 10 ** significant_figures))
+        self.sub_bucket_half_count_magnitude = max(sub_bucket_count_magnitude, 1) - 1
+        self.sub_bucket_count = 1 << sub_bucket_count_magnitude
+        self.sub_bucket_half_count = self.sub_bucket_count // 2
+        self.unit_magnitude = int(math.floor(math.log2(lowest)))
+        self.sub_bucket_mask = (self.sub_bucket_count - 1) << self.unit_magnitude
+
+        smallest_untrackable = self.sub_bucket_count << self.unit_magnitude
+        buckets = 1
+        while smallest_untrackable <= highest:
+            smallest_untrackable <<= 1
+            buckets += 1
+        self.counts = [0] * ((buckets + 1) * self.sub_bucket_half_count)
+        self.total = 0
+        self.min = 0
+        self.max = 0
+        self._sum = 0
+        self._sum_squares = 0
+
+    def _index(self, value: int) -> int:
+        bucket = (value | self.sub_bucket_mask).bit_length() - (
+            self.unit_magnitude + self.sub_bucket_half_count_magnitude + 1
+        )
+        sub_bucket = value >> (bucket + self.unit_magnitude)
+        return ((bucket + 1) << self.sub_bucket_half_count_magnitude) + sub_bucket - self.sub_bucket_half_count
+
+    def _value_at(self, index: int) -> int:
+        """Highest value counted by ``counts[index]``"""
+        bucket = (index >> self.sub_bucket_half_count_magnitude) - 1
+        sub_bucket = (index & (self.sub_bucket_half_count - 1)) + self.sub_bucket_half_count
+        if bucket < 0:
+            sub_bucket -= self.sub_bucket_half_count
+            bucket = 0
+        lowest = sub_bucket << (bucket + self.unit_magnitude)
+        return lowest + (1 << (bucket + self.unit_magnitude)) - 1
+
+    def record(self, value: int, count: int = 1) -> None:
+        value = min(max(int(value), 0), self.highest)
+        self.counts[self._index(value)] += count
+        if not self.total or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.total += count
+        self._sum += value * count
+        self._sum_squares += value * value * count
+
+    def record_corrected(self, value: int, expected_interval: int, count: int = 1) -> None:
+        """Record ``value`` plus the values hidden behind it, one per missed interval"""
+        self.record(value, count)
+        if expected_interval <= 0:
+            return
+        missing = value - expected_interval
+        while missing >= expected_interval:
+            self.record(missing, count)
+            missing -= expected_interval
+
+    def corrected(self, expected_interval: int) -> "Histogram":
+        """Copy with every recorded value corrected for ``expected_interval``"""
+        copy = Histogram(self.lowest, self.highest, self.significant_figures)
+        for value, count in self.items():
+            copy.record_corrected(value, expected_interval, count)
+        return copy
+
+    def add(self, other: "Histogram") -> None:
+        """Add the counts of a histogram with the same layout"""
+        if len(other.counts) != len(self.counts):
+            raise ValueError("histograms have different layouts")
+        if not other.total:
+            return
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.min = other.min if not self.total else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.total += other.total
+        self._sum += other._sum
+        self._sum_squares += other._sum_squares
+
+    @property
+    def mean(self) -> float:
+        return self._sum / self.total if self.total else 0.0
+
+    @property
+    def stddev(self) -> float:
+        if not self.total:
+            return 0.0
+        return math.sqrt(max(0.0, self._sum_squares / self.total - self.mean ** 2))
+
+    def percentile(self, percent: float) -> int:
+        """Value at or below which ``percent`` of the recorded values lie"""
+        if not self.total:
+            return 0
+        wanted = max(1, int(percent / 100 * self.total + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted:
+                return min(self._value_at(index), self.max)
+        return self.max
+
+    def items(self) -> Iterator[Tuple[int, int]]:
+        """(value, count) of every non-empty bucket, lowest first"""
+        for index, count in enumerate(self.counts):
+            if count:
+                yield min(self._value_at(index), self.max), count
+
+    def to_list(self) -> List[List[int]]:
+        return [[value, count] for value, count in self.items()]
+
+    @classmethod
+    def from_list(cls, pairs: List[List[int]], significant_figures: Optional[int] = None) -> "Histogram":
+        histogram = cls() if significant_figures is None else cls(significant_figures=significant_figures)
+        for value, count in pairs:
+            histogram.record(value, count)
+        return histogram
@@ -0,0 +1,135 @@
+"""The JSON report, in the shape run-load-tests.js wrote.
+
+Each entry is ``{"testName", "analysis", "assessment"}`` with the same
+keys autocannon's results gave (latencies in milliseconds, requests and
+throughput as per-second statistics), so reports written before and
+after the switch can be read side by side. The Python runner adds a few
+keys of its own: the model and rate, status and scenario counts, the
+per-second request counts and the latency histogram as
+``[microseconds, count]`` pairs, which ``compare`` resamples.
+
+``latency`` is measured from when each request was sent, as autocannon
+measured it. ``correctedLatency`` (and ``correctedHistogram``) is
+corrected for coordinated omission, see ``runner``; ``correction`` says
+how. It includes the requests that never got an answer, ``dropped``,
+at the time they waited. The assessment judges the corrected p99.
+"""
+
+import json
+import math
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .histogram import Histogram
+from .runner import Result
+
+REPORT_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "frontend", "load-tests"
+)
+
+
+def per_second(samples: List[int]) -> Dict[str, float]:
+    if not samples:
+        return {"average": 0, "mean": 0, "stddev": 0, "min": 0, "max": 0}
+    mean = sum(samples) / len(samples)
+    stddev = math.sqrt(sum((s - mean) ** 2 for s in samples) / len(samples))
+    return {
+        "average": round(mean, 2),
+        "mean": round(mean, 2),
+        "stddev": round(stddev, 2),
+        "min": min(samples),
+        "max": max(samples),
+    }
+
+
+def latency_ms(histogram: Histogram) -> Dict[str, float]:
+    return {
+        "average": round(histogram.mean / 1000, 2),
+        "mean": round(histogram.mean / 1000, 2),
+        "stddev": round(histogram.stddev / 1000, 2),
+        "min": round(histogram.min / 1000, 3),
+        "max": round(histogram.max / 1000, 3),
+        "p50": round(histogram.percentile(50) / 1000, 3),
+        "p90": round(histogram.percentile(90) / 1000, 3),
+        "p99": round(histogram.percentile(99) / 1000, 3),
+        "p999": round(histogram.percentile(99.9) / 1000, 3),
+    }
+
+
+def analyze(name: str, result: Result) -> Tuple[Dict[str, object], List[str]]:
+    workload = result.workload
+    requests = per_second(result.requests_per_second)
+    requests["total"] = result.latency.total
+    throughput = per_second(result.bytes_per_second)
+    analysis = {
+        "test": name,
+        "requests": {k: requests[k] for k in ("total", "average", "mean", "stddev", "min", "max")},
+        "latency": latency_ms(result.latency),
+        "correctedLatency": latency_ms(result.corrected),
+        "correction": {"method": result.correction, "expectedIntervalMs": round(result.expected_interval / 1000, 3)},
+        "throughput": {
+            "average": throughput["average"],
+            "mean": throughput["mean"],
+            "total": sum(result.bytes_per_second),
+        },
+        "errors": result.errors,
+        "timeouts": result.timeouts,
+        "duration": round(result.duration, 2),
+        "connections": workload.connections,
+        "model": workload.model,
+        "rate": workload.rate,
+        "non2xx": result.non2xx,
+        "dropped": result.dropped.total,
+        "statusCodes": {str(status): count for status, count in sorted(result.statuses.items())},
+        "scenarios": dict(result.scenarios),
+        "requestsPerSecond": result.requests_per_second,
+        "histogram": result.latency.to_list(),
+        "correctedHistogram": result.corrected.to_list(),
+    }
+    return analysis, assess(analysis)
+
+
+def assess(analysis: Dict[str, object]) -> List[str]:
+    """The verdicts run-load-tests.js printed, with its thresholds"""
+    assessment = []
+    p99 = analysis.get("correctedLatency", analysis["latency"])["p99"]
+    if p99 < 100:
+        assessment.append("✅ Excellent p99 latency (<100ms)")
+    elif p99 < 500:
+        assessment.append("⚠️ Acceptable p99 latency (<500ms)")
+    else:
+        assessment.append("❌ High p99 latency (>500ms) - needs optimization")
+
+    errors = analysis["errors"]
+    assessment.append("✅ No errors" if errors == 0 else f"❌ {errors} errors detected")
+    timeouts = analysis["timeouts"]
+    assessment.append("✅ No timeouts" if timeouts == 0 else f"❌ {timeouts} timeouts detected")
+
+    per_sec = analysis["requests"]["average"]
+    if per_sec > 1000:
+        assessment.append(f"✅ High throughput ({per_sec:.0f} req/s)")
+    elif per_sec > 100:
+        assessment.append(f"⚠️ Moderate throughput ({per_sec:.0f} req/s)")
+    else:
+        assessment.append(f"❌ Low throughput ({per_sec:.0f} req/s)")
+    return assessment
+
+
+def entry(name: str, result: Result) -> Dict[str, object]:
+    analysis, assessment = analyze(name, result)
+    return {"testName": name, "analysis": analysis, "assessment": assessment}
+
+
+def write(entries: List[Dict[str, object]], directory: str, path: Optional[str] = None) -> str:
+    """Write the report to ``path`` or ``<directory>/report-<ms>.json``"""
+    if path is None:
+        path = os.path.join(directory, f"report-{int(time.time() * 1000)}.json")
+    with open(path, "w") as f:
+        json.dump(entries, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def load(path: str) -> List[Dict[str, object]]:
+    with open(path) as f:
+        return json.load(f)
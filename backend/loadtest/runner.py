@@ -0,0 +1,208 @@
+"""Drives a workload against a target and collects what it measured.
+
+Every request's latency goes into a ``Histogram`` in microseconds, and
+requests and bytes are also counted per second of the run, which is what
+the report's ``requests`` and ``throughput`` statistics are computed
+from (autocannon's per-second samples). Connection errors and timeouts
+count as errors and cost the connection; non-2xx answers are counted on
+their own, as autocannon did.
+
+A closed loop only sends once the previous answer is in, so a stall
+delays, rather than slows, the requests it would have sent: their wait
+never shows up in ``latency`` (coordinated omission). So the runner also
+keeps ``corrected``, measured from when each scenario was meant to
+start rather than when it got a connection:
+
+- open model: the arrival schedule, ``rate`` per second
+- closed model with a ``rate``: each user paces its scenarios to its
+  share of that rate (wrk2 style) and starts late ones at once
+- closed model without one there is no schedule, so the latencies are
+  corrected after the run with HdrHistogram's ``record_corrected`` and
+  the median latency as the expected interval, as wrk did with its
+  calibrated mean
+
+Steps after a scenario's first follow it on the same connection, so
+only the first carries the wait for a start.
+
+A request that never gets an answer waited too: errors, timeouts and
+open-model arrivals still queued or in flight when the run ends are kept
+in ``dropped``, at the time from their intended start to when they were
+given up on, and counted in ``corrected`` as well, so a target that
+stops answering cannot look fast.
+"""
+
+import asyncio
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from .client import Connection, Target
+from .histogram import Histogram
+from .scenarios import OPEN, Scenario, Workload, run_values
+
+# How ``Result.corrected`` was obtained
+INTENDED_START = "intended-start"
+EXPECTED_INTERVAL = "expected-interval"
+
+
+@dataclass
+class Result:
+    workload: Workload
+    latency: Histogram = field(default_factory=Histogram)
+    corrected: Histogram = field(default_factory=Histogram)
+    dropped: Histogram = field(default_factory=Histogram)
+    correction: str = INTENDED_START
+    expected_interval: int = 0
+    requests_per_second: List[int] = field(default_factory=list)
+    bytes_per_second: List[int] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    scenarios: Counter = field(default_factory=Counter)
+    errors: int = 0
+    timeouts: int = 0
+    non2xx: int = 0
+    duration: float = 0.0
+
+    def count(self, elapsed: float, received: int) -> None:
+        second = int(elapsed)
+        if second >= len(self.requests_per_second):
+            return
+        self.requests_per_second[second] += 1
+        self.bytes_per_second[second] += received
+
+    def drop(self, intended: float) -> None:
+        """A request due at ``intended`` that is given up on now"""
+        waited = int((time.perf_counter() - intended) * 1e6)
+        self.dropped.record(waited)
+        self.corrected.record(waited)
+
+
+class Runner:
+    def __init__(self, url: str, timeout: float = 10.0, seed: Optional[int] = None):
+        self.target = Target(url)
+        self.timeout = timeout
+        self._rng = random.Random(seed)
+
+    def pick(self, workload: Workload) -> Scenario:
+        return self._rng.choices(workload.scenarios, [s.weight for s in workload.scenarios])[0]
+
+    async def scenario(
+        self, connection: Connection, scenario: Scenario, result: Result, started: float, intended: float
+    ) -> None:
+        """Run each step of ``scenario`` in turn; an error ends the scenario"""
+        values = run_values()
+        result.scenarios[scenario.name] += 1
+        for step in scenario.steps:
+            path, headers, body = step.render(values)
+            sent = time.perf_counter()
+            intended = min(intended, sent)
+            try:
+                status, received = await asyncio.wait_for(
+                    connection.request(step.method, path, headers, body), self.timeout
+                )
+            except asyncio.TimeoutError:
+                connection.close()
+                result.errors += 1
+                result.timeouts += 1
+                result.drop(intended)
+                return
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+                connection.close()
+                result.errors += 1
+                result.drop(intended)
+                return
+            except asyncio.CancelledError:
+                connection.close()
+                result.drop(intended)
+                raise
+            finished = time.perf_counter()
+            result.latency.record(int((finished - sent) * 1e6))
+            result.corrected.record(int((finished - intended) * 1e6))
+            intended = finished
+            result.statuses[status] += 1
+            if not 200 <= status < 300:
+                result.non2xx += 1
+            result.count(finished - started, received)
+
+    async def closed(self, workload: Workload, result: Result, started: float, until: float) -> None:
+        interval = workload.connections / workload.rate if workload.rate > 0 else 0.0
+
+        async def user(number: int) -> None:
+            connection = Connection(self.target)
+            # Users are spread over one interval so paced starts do not arrive in bursts
+            intended = started + interval * number / workload.connections
+            while True:
+                now = time.perf_counter()
+                if not interval:
+                    intended = now
+                elif intended > now:
+                    await asyncio.sleep(intended - now)
+                if intended >= until or time.perf_counter() >= until:
+                    break
+                await self.scenario(connection, self.pick(workload), result, started, intended)
+                intended += interval
+            connection.close()
+
+        await asyncio.gather(*(user(number) for number in range(workload.connections)))
+
+    async def open(self, workload: Workload, result: Result, started: float, until: float) -> None:
+        """Start scenarios at ``workload.rate`` per second, however long earlier ones take"""
+        idle: List[Connection] = []
+        slots = asyncio.Semaphore(workload.connections)
+        interval = 1.0 / workload.rate
+        running = set()
+
+        async def arrival(scenario: Scenario, intended: float) -> None:
+            try:
+                await slots.acquire()
+            except asyncio.CancelledError:
+                result.drop(intended)
+                raise
+            connection = idle.pop() if idle else Connection(self.target)
+            try:
+                await self.scenario(connection, scenario, result, started, intended)
+            finally:
+                idle.append(connection)
+                slots.release()
+
+        arrivals = 0
+        while True:
+            intended = started + arrivals * interval
+            if intended >= until:
+                break
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.ensure_future(arrival(self.pick(workload), intended))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            arrivals += 1
+
+        # Requests still queued or unanswered a timeout after time is up are dropped
+        if running:
+            await asyncio.wait(running, timeout=self.timeout)
+        for task in list(running):
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        for connection in idle:
+            connection.close()
+
+    async def run(self, workload: Workload) -> Result:
+        seconds = max(1, int(round(workload.duration)))
+        result = Result(workload, requests_per_second=[0] * seconds, bytes_per_second=[0] * seconds)
+        started = time.perf_counter()
+        until = started + workload.duration
+        if workload.model == OPEN:
+            if workload.rate <= 0:
+                raise ValueError(f"{workload.name}: the open model needs a rate")
+            await self.open(workload, result, started, until)
+        else:
+            await self.closed(workload, result, started, until)
+        result.duration = time.perf_counter() - started
+        if workload.model != OPEN and workload.rate <= 0:
+            result.correction = EXPECTED_INTERVAL
+            result.expected_interval = result.latency.percentile(50)
+            result.corrected = result.latency.corrected(result.expected_interval)
+            result.corrected.add(result.dropped)
+        return result
@@ -0,0 +1,146 @@
+"""What the load generator sends: steps, weighted scenarios and workloads.
+
+A ``Step`` is one request; ``{tenant}``, ``{session}``, ``{customer}``
+and ``{key}`` in its path and body are filled in per scenario run, so
+every simulated shopper has its own cart and every checkout its own
+Idempotency-Key. A ``Scenario`` is a weighted sequence of steps run on
+one connection, and a ``Workload`` is a mix of scenarios under either
+model:
+
+- ``closed``: ``connections`` virtual users, each starting its next
+  scenario as soon as the last one finished, the way autocannon works;
+  with a ``rate`` they are paced to start that many per second between
+  them
+- ``open``: scenarios start at a constant ``rate`` per second whether or
+  not earlier ones finished, up to ``connections`` concurrent ones
+
+The endpoints and request bodies are the ones tests/test_svm_module.py
+and tests/test_commerce_wallet_phase_b2.py exercise against Next.js. The
+first five workloads are the scenarios run-load-tests.js used to run.
+"""
+
+import json
+import uuid
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+MODELS = (CLOSED, OPEN)
+
+TEST_TENANT = "load-test-tenant"
+
+
+@dataclass
+class Step:
+    method: str
+    path: str
+    body: Optional[dict] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    def render(self, values: Dict[str, str]) -> Tuple[str, bytes, bytes]:
+        """Path, extra header block and body of this step for one run"""
+        path = self.path.format(**values)
+        headers = {"Accept": "application/json", "x-tenant-id": values["tenant"]}
+        headers.update({name: value.format(**values) for name, value in self.headers.items()})
+        body = b""
+        if self.body is not None:
+            body = fill(self.body, values)
+            headers["Content-Type"] = "application/json"
+        block = "".join(f"{name}: {value}\r\n" for name, value in headers.items()).encode()
+        return path, block, body
+
+
+def fill(body: dict, values: Dict[str, str]) -> bytes:
+    """JSON body with the run's values substituted into its strings"""
+
+    def substitute(value):
+        if isinstance(value, str):
+            return value.format(**values)
+        if isinstance(value, dict):
+            return {k: substitute(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [substitute(v) for v in value]
+        return value
+
+    return json.dumps(substitute(body)).encode()
+
+
+def run_values(tenant: str = TEST_TENANT) -> Dict[str, str]:
+    run = uuid.uuid4().hex[:12]
+    return {"tenant": tenant, "session": f"load-session-{run}", "customer": f"load-customer-{run}", "key": run}
+
+
+@dataclass
+class Scenario:
+    name: str
+    steps: List[Step]
+    weight: float = 1.0
+
+
+@dataclass
+class Workload:
+    name: str
+    title: str
+    scenarios: List[Scenario]
+    duration: float = 10.0
+    connections: int = 10
+    model: str = CLOSED
+    rate: float = 0.0
+
+    def with_options(self, **options) -> "Workload":
+        """Copy with the options that are not None replaced"""
+        return replace(self, **{k: v for k, v in options.items() if v is not None})
+
+
+HEALTH = Step("GET", "/api/health")
+CART_READ = Step("GET", "/api/svm/cart?tenantId={tenant}&sessionId={session}")
+WALLET_LIST = Step("GET", "/api/wallets?tenantId={tenant}&limit=10")
+ORDER_LIST = Step("GET", "/api/svm/orders?tenantId={tenant}&limit=10")
+PRODUCT_LIST = Step("GET", "/api/svm/products?tenantId={tenant}&limit=24")
+PRODUCT_SEARCH = Step("GET", "/api/svm/products?tenantId={tenant}&q=rice&sortBy=price&sortOrder=asc")
+ADD_TO_CART = Step("POST", "/api/svm/cart", {
+    "tenantId": "{tenant}",
+    "sessionId": "{session}",
+    "action": "ADD_ITEM",
+    "productId": "prod-001",
+    "productName": "Load Test Product",
+    "unitPrice": 29.99,
+    "quantity": 2,
+})
+CREATE_ORDER = Step(
+    "POST",
+    "/api/svm/orders",
+    {
+        "tenantId": "{tenant}",
+        "customerId": "{customer}",
+        "items": [{"productId": "prod-001", "productName": "Load Test Product", "unitPrice": 29.99, "quantity": 2}],
+        "shippingAddress": {
+            "name": "Load Test", "address1": "1 Marina Rd", "city": "Lagos", "postalCode": "101001", "country": "NG",
+        },
+        "shippingMethod": "standard",
+        "currency": "NGN",
+    },
+    headers={"Idempotency-Key": "{key}"},
+)
+
+BROWSE = Scenario("browse", [PRODUCT_LIST, PRODUCT_SEARCH], weight=70)
+ADD_TO_CART_SCENARIO = Scenario("addToCart", [PRODUCT_LIST, ADD_TO_CART, CART_READ], weight=20)
+CHECKOUT = Scenario("checkout", [CART_READ, ADD_TO_CART, CREATE_ORDER, ORDER_LIST], weight=10)
+
+WORKLOADS: Dict[str, Workload] = {
+    workload.name: workload
+    for workload in [
+        Workload("health", "Health Check Endpoint", [Scenario("health", [HEALTH])], 10, 10),
+        Workload("cartRead", "Cart Read Operations", [Scenario("cartRead", [CART_READ])], 15, 50),
+        Workload("walletList", "Wallet List Operations", [Scenario("walletList", [WALLET_LIST])], 15, 50),
+        Workload("orderList", "Order List Operations", [Scenario("orderList", [ORDER_LIST])], 15, 50),
+        Workload("highConcurrency", "High Concurrency Stress Test", [Scenario("health", [HEALTH])], 20, 200),
+        Workload("shopping", "Browse, Add to Cart and Checkout Mix", [BROWSE, ADD_TO_CART_SCENARIO, CHECKOUT], 30, 50),
+        Workload(
+            "shoppingOpen", "Shopping Mix at a Constant Arrival Rate",
+            [BROWSE, ADD_TO_CART_SCENARIO, CHECKOUT], 30, 200, model=OPEN, rate=50,
+        ),
+    ]
+}
+LEGACY_WORKLOADS = ["health", "cartRead", "walletList", "orderList", "highConcurrency"]
@@ -0,0 +1,200 @@
+"""Prometheus-style latency histograms for the proxy.
+
+Every proxied request is observed once it has been answered:
+
+- ``proxy_request_duration_seconds{route,tenant,status}``: end to end
+- ``proxy_request_phase_seconds{route,tenant,status,phase}`` with phases
+  ``queue`` (arrival until the upstream call starts: rate limiting, tenant
+  resolution, cache lookup), ``connect`` (new TCP/TLS connection, 0 when
+  one is reused), ``ttfb`` (request sent to response headers) and
+  ``transfer`` (response body). Cache hits and coalesced followers never
+  reach the upstream and only have a total.
+
+GET /__metrics renders them, plus a few gauges, in the Prometheus text
+exposition format.
+
+Collection takes no locks: a worker runs one event loop, and an
+observation is a bisect over the bucket bounds plus a few integer updates
+with no ``await`` in between, so nothing can interleave with it. Each
+worker process keeps its own series. Routes are reduced to their first
+PROXY_METRICS_ROUTE_DEPTH segments with ids replaced by ``:id``, and
+label values beyond PROXY_METRICS_MAX_ROUTES / PROXY_METRICS_MAX_TENANTS
+are folded into ``other`` to keep cardinality bounded.
+"""
+
+import re
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .config import env_bool, env_int, env_list
+from .upstream import UpstreamTiming
+
+METRICS_ENABLED = env_bool("PROXY_METRICS", True)
+METRICS_BUCKETS = [
+    float(b) for b in env_list(
+        "PROXY_METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30"
+    )
+]
+METRICS_ROUTE_DEPTH = env_int("PROXY_METRICS_ROUTE_DEPTH", 3)
+METRICS_MAX_ROUTES = env_int("PROXY_METRICS_MAX_ROUTES", 500)
+METRICS_MAX_TENANTS = env_int("PROXY_METRICS_MAX_TENANTS", 200)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OTHER = "other"
+
+# Numeric ids, UUIDs and cuid-like keys
+ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F-]{32,36}|[a-zA-Z0-9_-]{20,})$")
+
+Labels = Tuple[str, ...]
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Fixed-bucket histogram keyed by label values"""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = sorted(buckets)
+        # labels -> [count per bucket..., +Inf count, sum]
+        self._series: Dict[Labels, List[float]] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, labels: Labels) -> int:
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        bounds = [f"{b:g}" for b in self.buckets] + ["+Inf"]
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                le = format_labels(self.label_names, labels, 'le="%s"' % bound)
+                yield f"{self.name}_bucket{le} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.label_names, labels)} {series[-1]}"
+            yield f"{self.name}_count{format_labels(self.label_names, labels)} {cumulative}"
+
+
+class Gauge:
+    """Value read from ``collect`` at scrape time.
+
+    With ``label_names``, ``collect`` returns one value per tuple of label
+    values.
+    """
+
+    def __init__(
+        self, name: str, help_text: str, collect: Callable[[], object], label_names: Sequence[str] = ()
+    ):
+        self.name = name
+        self.help = help_text
+        self.collect = collect
+        self.label_names = tuple(label_names)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        if not self.label_names:
+            yield f"{self.name} {self.collect():g}"
+            return
+        for labels, value in self.collect().items():
+            yield f"{self.name}{format_labels(self.label_names, labels)} {value:g}"
+
+
+class BoundedLabel:
+    """Passes values through until ``limit`` distinct ones were seen"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._seen: Set[str] = set()
+
+    def __call__(self, value: str) -> str:
+        if value in self._seen:
+            return value
+        if len(self._seen) >= self.limit:
+            return OTHER
+        self._seen.add(value)
+        return value
+
+
+def route_label(path: str, depth: int = METRICS_ROUTE_DEPTH) -> str:
+    segments = [s for s in path.split("/") if s][:depth]
+    return "/" + "/".join(":id" if ID_SEGMENT.match(s) else s for s in segments)
+
+
+class ProxyMetrics:
+    """The proxy's histograms and gauges"""
+
+    PHASES = ("queue", "connect", "ttfb", "transfer")
+
+    def __init__(self, buckets: Optional[Sequence[float]] = None):
+        buckets = METRICS_BUCKETS if buckets is None else buckets
+        self.duration = Histogram(
+            "proxy_request_duration_seconds",
+            "End to end latency of proxied requests",
+            ("route", "tenant", "status"),
+            buckets,
+        )
+        self.phases = Histogram(
+            "proxy_request_phase_seconds",
+            "Latency of proxied requests by phase",
+            ("route", "tenant", "status", "phase"),
+            buckets,
+        )
+        self.gauges: List[Gauge] = []
+        self._routes = BoundedLabel(METRICS_MAX_ROUTES)
+        self._tenants = BoundedLabel(METRICS_MAX_TENANTS)
+
+    def gauge(
+        self, name: str, help_text: str, collect: Callable[[], object], label_names: Sequence[str] = ()
+    ) -> None:
+        self.gauges.append(Gauge(name, help_text, collect, label_names))
+
+    def observe(
+        self,
+        path: str,
+        tenant: str,
+        status: int,
+        started_at: float,
+        finished_at: float,
+        timing: Optional[UpstreamTiming] = None,
+    ) -> None:
+        labels = (self._routes(route_label(path)), self._tenants(tenant), str(status))
+        self.duration.observe(labels, finished_at - started_at)
+        if timing is None or timing.headers_at is None:
+            return
+        for phase, value in zip(self.PHASES, (
+            max(0.0, timing.sent_at - started_at), timing.connect, timing.ttfb, timing.transfer
+        )):
+            self.phases.observe(labels + (phase,), value)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in (self.duration, self.phases, *self.gauges):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def create_metrics() -> Optional[ProxyMetrics]:
+    if not METRICS_ENABLED:
+        return None
+    return ProxyMetrics()
@@ -0,0 +1,413 @@
+"""Gateway rate limiting with pluggable shared storage.
+
+``frontend/src/lib/rate-limiter.ts`` keeps its counters in a per-process
+``Map``, so once several Next.js workers run the limits are neither shared
+nor enforced. With PROXY_RATELIMIT enabled the proxy applies the same
+per-path policies before a request reaches Node.
+
+Each policy allows ``limit`` requests per ``window`` seconds. Limits are
+enforced with GCRA (the generic cell rate algorithm): a key's whole state is
+one "theoretical arrival time", so every check is O(1) in time and space and
+bursts of up to ``limit`` requests are still allowed.
+
+Where that state lives is pluggable (PROXY_RATELIMIT_STORE):
+
+- ``memory``: a dict in this process (single worker)
+- ``shm``: a fixed-size table in a memory-mapped file under /dev/shm, shared
+  by every uvicorn worker on the host and locked per stripe with ``lockf``
+- ``redis``: any Redis-compatible server, updated atomically by a Lua script
+  (needs the ``redis`` package)
+
+Clients are told apart by IP. X-Forwarded-For (or X-Real-IP) is only
+believed when the connection comes from PROXY_TRUSTED_PROXIES, and then
+read from the right: the client is the nearest hop not added by a trusted
+proxy, so a client cannot pick its own key by sending the header itself.
+"""
+
+import asyncio
+import errno
+import fcntl
+import hashlib
+import ipaddress
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+from .config import env_bool, env_int, env_list, env_str
+
+logger = logging.getLogger("backend.ratelimit")
+
+RATELIMIT_ENABLED = env_bool("PROXY_RATELIMIT", False)
+RATELIMIT_STORE = env_str("PROXY_RATELIMIT_STORE", "memory")
+RATELIMIT_REDIS_URL = env_str("PROXY_RATELIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATELIMIT_SHM_PATH = env_str(
+    "PROXY_RATELIMIT_SHM_PATH",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "webwaka-ratelimit"),
+)
+RATELIMIT_SHM_SLOTS = env_int("PROXY_RATELIMIT_SHM_SLOTS", 65536)
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+# CIDRs of the proxies in front of this one (the platform ingress usually
+# sits on a private network). Only list proxies: a client inside one of
+# these networks is indistinguishable from a hop and is keyed on its peer
+TRUSTED_PROXIES = env_list(
+    "PROXY_TRUSTED_PROXIES", "127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16"
+)
+
+# "<path prefix>=<limit>/<window seconds>", mirroring rate-limiter.ts
+RATELIMIT_POLICIES = env_list(
+    "PROXY_RATELIMIT_POLICIES",
+    "/api/auth=10/60,/api/wallets=60/60,/api/svm/cart=100/60,/api/svm/orders=30/60,default=200/60",
+)
+
+MESSAGES = {
+    "/api/auth": "Too many authentication attempts. Please try again later.",
+    "/api/wallets": "Too many wallet operations. Please slow down.",
+    "/api/svm/cart": "Too many cart operations. Please slow down.",
+    "/api/svm/orders": "Too many order operations. Please slow down.",
+    "default": "Too many requests. Please slow down.",
+}
+
+# Same dynamic-segment normalisation as getRateLimitKey in rate-limiter.ts
+DYNAMIC_SEGMENT = re.compile(r"/[a-zA-Z0-9_-]{20,}(?=/|$)")
+
+
+@dataclass
+class RateLimitPolicy:
+    prefix: str
+    limit: int
+    window: float
+    message: str
+
+    @property
+    def interval(self) -> float:
+        """Seconds between requests at the sustained rate"""
+        return self.window / self.limit
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float
+    reset_after: float
+    message: str = ""
+
+
+def parse_policies(spec: List[str]) -> Dict[str, RateLimitPolicy]:
+    policies = {}
+    for item in spec:
+        prefix, _, rate = item.partition("=")
+        prefix = prefix.strip()
+        limit, _, window = rate.partition("/")
+        policies[prefix] = RateLimitPolicy(
+            prefix=prefix,
+            limit=int(limit),
+            window=float(window or 60),
+            message=MESSAGES.get(prefix, MESSAGES["default"]),
+        )
+    if "default" not in policies:
+        policies["default"] = RateLimitPolicy("default", 200, 60.0, MESSAGES["default"])
+    return policies
+
+
+def gcra(tat: Optional[float], now: float, interval: float, window: float) -> Tuple[bool, float]:
+    """One GCRA step; returns (allowed, new theoretical arrival time)"""
+    tat = now if tat is None or tat < now else tat
+    new_tat = tat + interval
+    if new_tat - window > now:
+        return False, tat
+    return True, new_tat
+
+
+def result_for(policy: RateLimitPolicy, allowed: bool, tat: float, now: float) -> RateLimitResult:
+    if allowed:
+        remaining = math.floor((now + policy.window - tat) / policy.interval + 1e-6)
+        retry_after = 0.0
+    else:
+        remaining = 0
+        retry_after = tat + policy.interval - policy.window - now
+    return RateLimitResult(
+        allowed=allowed,
+        limit=policy.limit,
+        remaining=max(0, remaining),
+        retry_after=max(0.0, retry_after),
+        reset_after=max(0.0, tat - now),
+        message="" if allowed else policy.message,
+    )
+
+
+class MemoryStore:
+    """Per-process GCRA state in an LRU of at most ``max_keys`` keys.
+
+    Each hit is O(1): beyond the bound the least recently seen key is
+    forgotten, which at worst lets that idle client burst again.
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+
+    async def hit(self, key: str, interval: float, window: float) -> Tuple[bool, float, float]:
+        now = time.time()
+        allowed, tat = gcra(self._tats.get(key), now, interval, window)
+        if allowed:
+            self._tats[key] = tat
+        if key in self._tats:
+            self._tats.move_to_end(key)
+            while len(self._tats) > self.max_keys:
+                self._tats.popitem(last=False)
+        return allowed, tat, now
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+    async def aclose(self) -> None:
+        pass
+
+
+class SharedMemoryStore:
+    """GCRA state in a memory-mapped file shared by all workers on the host.
+
+    The file is a fixed table of 16-byte slots (key hash, arrival time)
+    split into stripes. A key only ever lives in its own stripe, and each
+    check holds an exclusive ``lockf`` on just that stripe, so workers
+    touching different keys rarely contend. When a stripe is full the slot
+    whose state expired first is reused; at worst that forgets a nearly
+    idle client.
+    """
+
+    SLOT = struct.Struct("<Qd")
+
+    def __init__(self, path: str = RATELIMIT_SHM_PATH, slots: int = RATELIMIT_SHM_SLOTS, stripe: int = 64):
+        self.path = path
+        self.stripe = stripe
+        self.stripes = max(1, slots // stripe)
+        size = self.stripes * stripe * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # 0 marks an empty slot
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+    async def _lock(self, width: int, start: int) -> None:
+        """Lock a stripe without blocking the event loop.
+
+        Another worker holds a stripe only for one slot scan, so a busy one
+        is retried after yielding rather than waited on in ``lockf``.
+        Coroutines of this process never contend: there is no await
+        between taking the lock and releasing it.
+        """
+        attempt = 0
+        while True:
+            try:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, width, start)
+                return
+            except OSError as e:
+                if e.errno not in (errno.EACCES, errno.EAGAIN):
+                    raise
+            await asyncio.sleep(0 if attempt < 3 else 0.001)
+            attempt += 1
+
+    async def hit(self, key: str, interval: float, window: float) -> Tuple[bool, float, float]:
+        digest = self._hash(key)
+        width = self.stripe * self.SLOT.size
+        start = (digest % self.stripes) * width
+        await self._lock(width, start)
+        try:
+            now = time.time()
+            found, free, oldest, oldest_tat = None, None, start, math.inf
+            for offset in range(start, start + width, self.SLOT.size):
+                slot_key, slot_tat = self.SLOT.unpack_from(self._map, offset)
+                if slot_key == digest:
+                    found = offset
+                    break
+                if free is None and (slot_key == 0 or slot_tat <= now):
+                    free = offset
+                if slot_tat < oldest_tat:
+                    oldest, oldest_tat = offset, slot_tat
+            if found is not None:
+                tat = self.SLOT.unpack_from(self._map, found)[1]
+                offset = found
+            else:
+                tat = None
+                offset = free if free is not None else oldest
+            allowed, tat = gcra(tat, now, interval, window)
+            if allowed:
+                self.SLOT.pack_into(self._map, offset, digest, tat)
+            return allowed, tat, now
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, width, start)
+
+    async def aclose(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+# GCRA as one atomic step on the server, using the server clock so that
+# gateways with skewed clocks still agree
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + interval
+if new_tat - window > now then
+  return {0, tostring(tat), tostring(now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, tostring(new_tat), tostring(now)}
+"""
+
+
+class RedisStore:
+    """GCRA state in a Redis-compatible server shared by every gateway"""
+
+    def __init__(self, url: str = RATELIMIT_REDIS_URL, client=None):
+        if client is None:
+            try:
+                import redis.asyncio as redis_asyncio
+            except ImportError as e:
+                raise RuntimeError("PROXY_RATELIMIT_STORE=redis requires the 'redis' package") from e
+            client = redis_asyncio.from_url(url)
+        self._client = client
+        self._script = client.register_script(GCRA_SCRIPT)
+
+    async def hit(self, key: str, interval: float, window: float) -> Tuple[bool, float, float]:
+        allowed, tat, now = await self._script(keys=[key], args=[interval, window])
+        return bool(int(allowed)), float(tat), float(now)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+class RateLimiter:
+    """Maps requests to policies and keys, and asks the store for a decision"""
+
+    def __init__(self, store, policies: Optional[Dict[str, RateLimitPolicy]] = None):
+        self.store = store
+        self.policies = parse_policies(RATELIMIT_POLICIES) if policies is None else policies
+        self._prefixes = sorted((p for p in self.policies if p != "default"), key=len, reverse=True)
+        self.allowed = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def policy_for(self, path: str) -> RateLimitPolicy:
+        for prefix in self._prefixes:
+            if path.startswith(prefix):
+                return self.policies[prefix]
+        return self.policies["default"]
+
+    @staticmethod
+    def key_for(identifier: str, path: str) -> str:
+        return f"ratelimit:{identifier}:{DYNAMIC_SEGMENT.sub('/:id', path)}"
+
+    async def check(self, identifier: str, path: str) -> RateLimitResult:
+        """Decision for one request; fails open if the store is unavailable"""
+        policy = self.policy_for(path)
+        try:
+            allowed, tat, now = await self.store.hit(
+                self.key_for(identifier, path), policy.interval, policy.window
+            )
+        except Exception:
+            self.errors += 1
+            logger.warning("Rate limit store failed, allowing request", exc_info=True)
+            return RateLimitResult(True, policy.limit, policy.limit, 0.0, 0.0)
+        if allowed:
+            self.allowed += 1
+        else:
+            self.rejected += 1
+        return result_for(policy, allowed, tat, now)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "store": type(self.store).__name__,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "policies": {
+                prefix: f"{policy.limit}/{policy.window:g}s" for prefix, policy in self.policies.items()
+            },
+        }
+
+    async def aclose(self) -> None:
+        await self.store.aclose()
+
+
+def parse_networks(spec: List[str]) -> List[Network]:
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in spec]
+
+
+TRUSTED_NETWORKS = parse_networks(TRUSTED_PROXIES)
+
+
+def is_trusted(address: str, networks: List[Network]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_ip(headers, client_host: Optional[str], networks: Optional[List[Network]] = None) -> str:
+    """The client's address, taken from forwarding headers only when a trusted proxy set them"""
+    networks = TRUSTED_NETWORKS if networks is None else networks
+    # No peer address means a Unix socket, i.e. a proxy on this host
+    if client_host is not None and not is_trusted(client_host, networks):
+        return client_host
+    forwarded = [hop.strip() for hop in headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    for hop in reversed(forwarded):
+        if not is_trusted(hop, networks):
+            return hop
+    # Every hop is one of ours: anything further left was the client's to
+    # write, so the nearest known address stands in for it
+    if forwarded:
+        return client_host or forwarded[-1]
+    return headers.get("x-real-ip") or headers.get("x-client-ip") or client_host or "unknown"
+
+
+def client_identifier(
+    headers, client_host: Optional[str], networks: Optional[List[Network]] = None
+) -> str:
+    """The client IP alone, as getClientIdentifier in security-middleware.ts returns.
+
+    Never a request header such as x-tenant-id: a client sending a new
+    value with every request would get a fresh budget every time.
+    """
+    return client_ip(headers, client_host, networks)
+
+
+def create_store(kind: str = RATELIMIT_STORE):
+    if kind == "memory":
+        return MemoryStore()
+    if kind == "shm":
+        return SharedMemoryStore()
+    if kind == "redis":
+        return RedisStore()
+    raise ValueError(f"Unknown PROXY_RATELIMIT_STORE: {kind!r}")
+
+
+def create_rate_limiter() -> Optional[RateLimiter]:
+    if not RATELIMIT_ENABLED:
+        return None
+    return RateLimiter(create_store())
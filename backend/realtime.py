@@ -0,0 +1,255 @@
+"""WebSocket and Server-Sent Events pass-through.
+
+Live order and logistics tracking and dashboard streams need connections
+that stay open, which the buffered proxy could not carry. Two paths handle
+them:
+
+- SSE (PROXY_SSE, on by default): requests that accept
+  ``text/event-stream`` always take the streaming path, whatever
+  PROXY_STREAMING says. Events are relayed as soon as Next.js writes them,
+  never batched into chunks, and ``X-Accel-Buffering: no`` stops outer
+  proxies from buffering them. The per-chunk read timeout becomes
+  PROXY_SSE_IDLE_TIMEOUT, so a stream that is silent for that long is
+  closed; Next.js should send comment heartbeats more often than that.
+- WebSocket (PROXY_WEBSOCKETS, on by default): the upgrade is accepted,
+  a matching connection is opened to the upstream (same path, query,
+  cookies and sub-protocols) and frames are relayed both ways until either
+  side closes or neither sends anything for PROXY_WEBSOCKET_IDLE_TIMEOUT
+  seconds. Uses the ``websockets`` package (in requirements.txt), which
+  uvicorn also needs to accept WebSocket upgrades at all.
+
+Both kinds count against PROXY_REALTIME_MAX_CONNECTIONS; beyond it new SSE
+requests get 503 and WebSockets are closed with 1013 (try again later).
+Long-lived streams bypass admission control, which is meant for short
+requests. Open connections are exported per kind on /__metrics.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from .config import env_bool, env_float, env_int
+
+logger = logging.getLogger("backend.realtime")
+
+SSE_ENABLED = env_bool("PROXY_SSE", True)
+SSE_IDLE_TIMEOUT = env_float("PROXY_SSE_IDLE_TIMEOUT", 120.0)
+WEBSOCKETS_ENABLED = env_bool("PROXY_WEBSOCKETS", True)
+WEBSOCKET_IDLE_TIMEOUT = env_float("PROXY_WEBSOCKET_IDLE_TIMEOUT", 300.0)
+WEBSOCKET_OPEN_TIMEOUT = env_float("PROXY_WEBSOCKET_OPEN_TIMEOUT", 10.0)
+REALTIME_MAX_CONNECTIONS = env_int("PROXY_REALTIME_MAX_CONNECTIONS", 10000)
+
+EVENT_STREAM = "text/event-stream"
+SSE = "sse"
+WEBSOCKET = "websocket"
+
+# Close codes (RFC 6455 section 7.4)
+NORMAL_CLOSURE = 1000
+GOING_AWAY = 1001
+INTERNAL_ERROR = 1011
+TRY_AGAIN_LATER = 1013
+
+# Handshake headers that belong to one hop of the upgrade only
+WEBSOCKET_SKIP_HEADERS = frozenset([
+    "host", "connection", "upgrade", "content-length", "sec-websocket-key",
+    "sec-websocket-version", "sec-websocket-extensions", "sec-websocket-protocol",
+])
+
+
+def wants_event_stream(headers) -> bool:
+    return EVENT_STREAM in headers.get("accept", "")
+
+
+def sse_timeout(timeout: httpx.Timeout, idle: float = SSE_IDLE_TIMEOUT) -> httpx.Timeout:
+    """The route's timeouts, with the read timeout stretched to the idle timeout"""
+    return httpx.Timeout(connect=timeout.connect, read=idle, write=timeout.write, pool=timeout.pool)
+
+
+def websocket_headers(headers: Iterable[Tuple[str, str]], extra: Optional[Dict[str, str]] = None) -> List[Tuple[str, str]]:
+    """Client handshake headers to repeat on the upstream handshake"""
+    forwarded = [(name, value) for name, value in headers if name.lower() not in WEBSOCKET_SKIP_HEADERS]
+    if extra:
+        names = {name.lower() for name in extra}
+        forwarded = [(name, value) for name, value in forwarded if name.lower() not in names]
+        forwarded.extend(extra.items())
+    return forwarded
+
+
+async def connect_websocket(url: str, headers: List[Tuple[str, str]], subprotocols: List[str]):
+    """Open the upstream WebSocket with the ``websockets`` package"""
+    try:
+        from websockets.asyncio.client import connect
+        header_arg = "additional_headers"
+    except ImportError:
+        try:
+            from websockets.client import connect
+            header_arg = "extra_headers"
+        except ImportError as e:
+            raise RuntimeError("PROXY_WEBSOCKETS requires the 'websockets' package") from e
+    return await connect(
+        url,
+        subprotocols=subprotocols or None,
+        open_timeout=WEBSOCKET_OPEN_TIMEOUT,
+        max_size=None,
+        **{header_arg: headers},
+    )
+
+
+def close_code(connection: Any) -> int:
+    """A close code that may be sent on, from a closed upstream connection"""
+    code = getattr(connection, "close_code", None)
+    if code is None or code == 1005:
+        return NORMAL_CLOSURE
+    if code == 1006:
+        return INTERNAL_ERROR
+    return code
+
+
+class RealtimeProxy:
+    """Connection accounting for SSE streams and the WebSocket relay"""
+
+    def __init__(
+        self,
+        connect: Optional[Callable[..., Awaitable[Any]]] = None,
+        max_connections: int = REALTIME_MAX_CONNECTIONS,
+        websocket_idle_timeout: float = WEBSOCKET_IDLE_TIMEOUT,
+    ):
+        self.connect = connect_websocket if connect is None else connect
+        self.max_connections = max_connections
+        self.websocket_idle_timeout = websocket_idle_timeout
+        self.open: Dict[str, int] = {SSE: 0, WEBSOCKET: 0}
+        self.total: Dict[str, int] = {SSE: 0, WEBSOCKET: 0}
+        self.idle_closed: Dict[str, int] = {SSE: 0, WEBSOCKET: 0}
+        self.rejected = 0
+        self.upstream_errors = 0
+
+    def open_by_kind(self) -> Dict[Tuple[str, ...], int]:
+        return {(kind,): count for kind, count in self.open.items()}
+
+    def admit(self, kind: str) -> bool:
+        """Count a new connection, or refuse it when at the limit"""
+        if sum(self.open.values()) >= self.max_connections:
+            self.rejected += 1
+            return False
+        self.open[kind] += 1
+        self.total[kind] += 1
+        return True
+
+    def done(self, kind: str) -> None:
+        self.open[kind] -= 1
+
+    async def relay_events(self, response: httpx.Response):
+        """Relay an event stream chunk by chunk; ends quietly on idle timeout.
+
+        The caller releases the connection with ``done(SSE)`` once the
+        response is finished, client disconnects included.
+        """
+        try:
+            async for chunk in response.aiter_raw():
+                yield chunk
+        except httpx.ReadTimeout:
+            self.idle_closed[SSE] += 1
+
+    async def relay_websocket(self, websocket, url: str, headers: List[Tuple[str, str]]) -> None:
+        """Accept ``websocket`` and pump frames to and from the upstream"""
+        if not self.admit(WEBSOCKET):
+            await websocket.close(code=TRY_AGAIN_LATER)
+            return
+        try:
+            try:
+                upstream = await self.connect(url, headers, list(websocket.scope.get("subprotocols", [])))
+            except Exception:
+                self.upstream_errors += 1
+                logger.warning("Could not open upstream WebSocket %s", url, exc_info=True)
+                await websocket.close(code=INTERNAL_ERROR)
+                return
+            await websocket.accept(subprotocol=getattr(upstream, "subprotocol", None))
+            await self._pump(websocket, upstream)
+        finally:
+            self.done(WEBSOCKET)
+
+    async def _pump(self, websocket, upstream) -> None:
+        loop = asyncio.get_running_loop()
+        last_activity = loop.time()
+
+        async def client_to_upstream() -> Tuple[str, int]:
+            nonlocal last_activity
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return "client", message.get("code", NORMAL_CLOSURE)
+                last_activity = loop.time()
+                data = message.get("text")
+                if data is None:
+                    data = message.get("bytes")
+                if data is None:
+                    continue
+                try:
+                    await upstream.send(data)
+                except Exception:
+                    return "upstream", close_code(upstream)
+
+        async def upstream_to_client() -> Tuple[str, int]:
+            nonlocal last_activity
+            while True:
+                try:
+                    data = await upstream.recv()
+                except Exception:
+                    return "upstream", close_code(upstream)
+                last_activity = loop.time()
+                try:
+                    if isinstance(data, bytes):
+                        await websocket.send_bytes(data)
+                    else:
+                        await websocket.send_text(data)
+                except Exception:
+                    return "client", NORMAL_CLOSURE
+
+        async def idle() -> Tuple[str, int]:
+            while True:
+                wait = last_activity + self.websocket_idle_timeout - loop.time()
+                if wait <= 0:
+                    self.idle_closed[WEBSOCKET] += 1
+                    return "idle", GOING_AWAY
+                await asyncio.sleep(wait)
+
+        tasks = [asyncio.ensure_future(pump()) for pump in (client_to_upstream, upstream_to_client, idle)]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        finished = done.pop()
+        side, code = ("error", INTERNAL_ERROR) if finished.exception() else finished.result()
+        if side != "client":
+            try:
+                await websocket.close(code=code)
+            except Exception:
+                pass
+        if side != "upstream":
+            try:
+                await upstream.close()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "sse_enabled": SSE_ENABLED,
+            "websockets_enabled": WEBSOCKETS_ENABLED,
+            "max_connections": self.max_connections,
+            "open": dict(self.open),
+            "total": dict(self.total),
+            "idle_closed": dict(self.idle_closed),
+            "rejected": self.rejected,
+            "upstream_errors": self.upstream_errors,
+        }
+
+
+def create_realtime() -> Optional[RealtimeProxy]:
+    if not (SSE_ENABLED or WEBSOCKETS_ENABLED):
+        return None
+    return RealtimeProxy()
@@ -0,0 +1,386 @@
+"""Per-route time budgets, deadline propagation and circuit breakers.
+
+A flat 30 second timeout lets one hanging report endpoint hold proxy
+concurrency that cart and POS traffic needs. Instead every route gets its
+own budget from PROXY_ROUTE_TIMEOUTS (longest prefix wins):
+
+- ``connect``: seconds to open (or wait for) an upstream connection
+- ``read``: seconds to wait for each chunk of the response
+- ``total``: seconds for the whole round trip, retries included
+
+The total budget starts when the request reaches the proxy. A client (or an
+upstream gateway) may shorten it with the PROXY_DEADLINE_HEADER header, in
+milliseconds; the proxy forwards whatever is left of the budget in the same
+header so Next.js can give up on work nobody will wait for. Requests that
+run out of budget are answered with 504.
+
+With PROXY_BREAKER enabled, routes under PROXY_BREAKER_ROUTES each get a
+circuit breaker. PROXY_BREAKER_FAILURES consecutive 5xx responses, timeouts
+or connection errors open it: for PROXY_BREAKER_COOLDOWN seconds requests
+fail fast with 503 and Retry-After instead of queueing on a sick upstream.
+After the cooldown a single probe request is let through; its outcome
+closes the breaker again or restarts the cooldown.
+
+Breaker state lives in the worker process by default. With
+PROXY_BREAKER_STORE=shm it lives in a memory-mapped file under /dev/shm
+instead, so every worker on the host sees the same open/closed state and
+only one of them sends the probe. A probe whose worker died is given up
+after one cooldown.
+"""
+
+import asyncio
+import errno
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from .config import env_bool, env_float, env_int, env_list, env_str
+
+logger = logging.getLogger("backend.resilience")
+
+# "<path prefix>=<connect>/<read>/<total>" in seconds; "default" is the fallback
+ROUTE_TIMEOUTS = env_list(
+    "PROXY_ROUTE_TIMEOUTS",
+    "/api/pos=2/10/10,/api/svm/cart=2/10/10,/api/svm/orders=2/15/15,default=5/30/30",
+)
+DEADLINE_HEADER = env_str("PROXY_DEADLINE_HEADER", "x-request-timeout-ms")
+
+BREAKER_ENABLED = env_bool("PROXY_BREAKER", False)
+BREAKER_ROUTES = env_list("PROXY_BREAKER_ROUTES", "/api/accounting/reports,/api/analytics")
+BREAKER_FAILURES = env_int("PROXY_BREAKER_FAILURES", 5)
+BREAKER_COOLDOWN = env_float("PROXY_BREAKER_COOLDOWN", 30.0)
+BREAKER_STORE = env_str("PROXY_BREAKER_STORE", "memory")
+BREAKER_SHM_PATH = env_str(
+    "PROXY_BREAKER_SHM_PATH",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "webwaka-breakers"),
+)
+
+FAILURE_STATUSES = (500, 502, 503, 504)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before the upstream answered"""
+
+
+class CircuitOpen(Exception):
+    """The route's breaker is open; retry after ``retry_after`` seconds"""
+
+    def __init__(self, prefix: str, retry_after: float):
+        super().__init__(f"circuit open for {prefix}")
+        self.prefix = prefix
+        self.retry_after = retry_after
+
+
+@dataclass
+class RouteTimeout:
+    connect: float
+    read: float
+    total: float
+
+    def budget(self, remaining: float) -> httpx.Timeout:
+        """httpx timeouts clamped to what is left of the total budget"""
+        return httpx.Timeout(
+            connect=min(self.connect, remaining),
+            read=min(self.read, remaining),
+            write=min(self.read, remaining),
+            pool=min(self.connect, remaining),
+        )
+
+
+def parse_timeouts(spec: List[str]) -> Dict[str, RouteTimeout]:
+    timeouts = {}
+    for item in spec:
+        prefix, _, values = item.partition("=")
+        connect, read, total = (float(v) for v in values.split("/"))
+        timeouts[prefix.strip()] = RouteTimeout(connect, read, total)
+    if "default" not in timeouts:
+        timeouts["default"] = RouteTimeout(5.0, 30.0, 30.0)
+    return timeouts
+
+
+def longest_prefix(prefixes: List[str], path: str) -> Optional[str]:
+    path = "/" + path.lstrip("/")
+    for prefix in prefixes:
+        if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+            return prefix
+    return None
+
+
+class RouteTimeouts:
+    """Maps paths to their RouteTimeout"""
+
+    def __init__(self, timeouts: Optional[Dict[str, RouteTimeout]] = None):
+        self.timeouts = parse_timeouts(ROUTE_TIMEOUTS) if timeouts is None else timeouts
+        self._prefixes = sorted((p for p in self.timeouts if p != "default"), key=len, reverse=True)
+
+    def for_path(self, path: str) -> RouteTimeout:
+        prefix = longest_prefix(self._prefixes, path)
+        return self.timeouts[prefix or "default"]
+
+    def deadline(self, path: str, header: Optional[str], now: Optional[float] = None) -> float:
+        """Monotonic deadline for a request, shortened by the client's header"""
+        budget = self.for_path(path).total
+        if header:
+            try:
+                budget = min(budget, max(0.0, float(header) / 1000))
+            except ValueError:
+                pass
+        return (time.monotonic() if now is None else now) + budget
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe"""
+
+    def __init__(self, prefix: str, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.prefix = prefix
+        self.failure_threshold = failures
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.opened_total = 0
+        self.rejected_total = 0
+
+    def acquire(self, now: Optional[float] = None) -> None:
+        """Admit a request or raise CircuitOpen"""
+        now = time.monotonic() if now is None else now
+        if self.state == CLOSED:
+            return
+        retry_after = self.opened_at + self.cooldown - now
+        if self.state == OPEN and retry_after <= 0:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return
+        self.rejected_total += 1
+        raise CircuitOpen(self.prefix, max(retry_after, 1.0))
+
+    async def admit(self, now: Optional[float] = None) -> None:
+        """acquire() for callers on the event loop"""
+        self.acquire(now)
+
+    def record(self, ok: Optional[bool], now: Optional[float] = None) -> None:
+        """Outcome of an admitted request; None when it says nothing (e.g. cancelled)"""
+        now = time.monotonic() if now is None else now
+        was_probe = self.state == HALF_OPEN and self.probing
+        if was_probe:
+            self.probing = False
+        if ok is None:
+            return
+        if ok:
+            self.failures = 0
+            if was_probe:
+                self.state = CLOSED
+                logger.info("Circuit for %s closed", self.prefix)
+            return
+        self.failures += 1
+        if was_probe or (self.state == CLOSED and self.failures >= self.failure_threshold):
+            self.state = OPEN
+            self.opened_at = now
+            self.opened_total += 1
+            logger.warning("Circuit for %s opened after %d failures", self.prefix, self.failures)
+
+    async def report(self, ok: Optional[bool], now: Optional[float] = None) -> None:
+        """record() for callers on the event loop"""
+        self.record(ok, now)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opened_total": self.opened_total,
+            "rejected_total": self.rejected_total,
+        }
+
+
+STATES = (CLOSED, OPEN, HALF_OPEN)
+
+
+class SharedBreakerTable:
+    """Fixed slots of breaker state in a file mapped by every worker.
+
+    Each slot is tagged with a hash of its prefix, so a slot left behind by
+    a different PROXY_BREAKER_ROUTES is reset rather than misread. Slots
+    are locked one at a time with ``lockf``. Creating the table takes a
+    blocking whole-file lock, so do it off the event loop.
+    """
+
+    # prefix hash, state, consecutive failures, opened at, probe started at,
+    # opened total, rejected total
+    SLOT = struct.Struct("<QiiddQQ")
+
+    def __init__(self, slots: int, path: str = BREAKER_SHM_PATH):
+        self.path = path
+        size = max(1, slots) * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+
+    @asynccontextmanager
+    async def locked(self, index: int) -> AsyncIterator[int]:
+        """Lock a slot without blocking the event loop.
+
+        Another worker holds a slot only to copy it in and out, so a busy
+        one is retried after yielding rather than waited on in ``lockf``.
+        """
+        offset = index * self.SLOT.size
+        attempt = 0
+        while True:
+            try:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, self.SLOT.size, offset)
+                break
+            except OSError as e:
+                if e.errno not in (errno.EACCES, errno.EAGAIN):
+                    raise
+            await asyncio.sleep(0 if attempt < 3 else 0.001)
+            attempt += 1
+        try:
+            yield offset
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self.SLOT.size, offset)
+
+    def read(self, offset: int) -> tuple:
+        return self.SLOT.unpack_from(self._map, offset)
+
+    def write(self, offset: int, *values) -> None:
+        self.SLOT.pack_into(self._map, offset, *values)
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+class SharedCircuitBreaker(CircuitBreaker):
+    """CircuitBreaker whose state is loaded from and saved to a shared slot.
+
+    Go through ``admit`` and ``report``: they run the state machine on the
+    slot while holding its lock. Coroutines of this process never contend
+    for it, as there is no await between loading the slot and saving it.
+    """
+
+    def __init__(self, prefix: str, table: SharedBreakerTable, index: int, **kwargs):
+        super().__init__(prefix, **kwargs)
+        self.table = table
+        self.index = index
+        self.key = int.from_bytes(hashlib.blake2b(prefix.encode(), digest_size=8).digest(), "little") or 1
+        self.probe_started = 0.0
+
+    def _load(self, slot: tuple, now: float) -> None:
+        key, state, failures, opened_at, probe_started, opened_total, rejected_total = slot
+        if key == self.key:
+            self.state = STATES[state]
+            self.failures = failures
+            self.opened_at = opened_at
+            # A probe nobody reported back on within a cooldown is abandoned
+            self.probing = probe_started > 0 and now - probe_started < self.cooldown
+            self.probe_started = probe_started
+            self.opened_total = opened_total
+            self.rejected_total = rejected_total
+        else:
+            self.state, self.failures, self.opened_at, self.probing = CLOSED, 0, 0.0, False
+            self.probe_started = 0.0
+            self.opened_total = self.rejected_total = 0
+
+    @asynccontextmanager
+    async def _shared(self, now: Optional[float]) -> AsyncIterator[None]:
+        async with self.table.locked(self.index) as offset:
+            now = time.monotonic() if now is None else now
+            self._load(self.table.read(offset), now)
+            was_probing = self.probing
+            try:
+                yield
+            finally:
+                if self.probing and not was_probing:
+                    self.probe_started = now
+                elif not self.probing:
+                    self.probe_started = 0.0
+                self.table.write(
+                    offset, self.key, STATES.index(self.state), self.failures, self.opened_at,
+                    self.probe_started, self.opened_total, self.rejected_total,
+                )
+
+    async def admit(self, now: Optional[float] = None) -> None:
+        async with self._shared(now):
+            self.acquire(now)
+
+    async def report(self, ok: Optional[bool], now: Optional[float] = None) -> None:
+        async with self._shared(now):
+            self.record(ok, now)
+
+    def stats(self) -> Dict[str, object]:
+        # A lock-free snapshot: nothing is written back
+        self._load(self.table.read(self.index * self.table.SLOT.size), time.monotonic())
+        return super().stats()
+
+
+class CircuitBreakers:
+    """One breaker per configured route prefix"""
+
+    def __init__(self, prefixes: Optional[List[str]] = None, table: Optional[SharedBreakerTable] = None, **kwargs):
+        prefixes = BREAKER_ROUTES if prefixes is None else prefixes
+        if table is None:
+            self.breakers = {p: CircuitBreaker(p, **kwargs) for p in prefixes}
+        else:
+            self.breakers = {
+                p: SharedCircuitBreaker(p, table, index, **kwargs) for index, p in enumerate(sorted(prefixes))
+            }
+        self._prefixes = sorted(self.breakers, key=len, reverse=True)
+
+    def for_path(self, path: str) -> Optional[CircuitBreaker]:
+        prefix = longest_prefix(self._prefixes, path)
+        return self.breakers[prefix] if prefix else None
+
+    def stats(self) -> Dict[str, object]:
+        return {prefix: breaker.stats() for prefix, breaker in self.breakers.items()}
+
+
+def outcome(response: Optional[object] = None, error: Optional[BaseException] = None) -> Optional[bool]:
+    """Whether an upstream attempt counts as a success for the breaker"""
+    if error is not None:
+        if isinstance(error, (httpx.TransportError, DeadlineExceeded)):
+            return False
+        return None
+    return response.status_code not in FAILURE_STATUSES
+
+
+def remaining(deadline: float, now: Optional[float] = None) -> float:
+    """Seconds left before ``deadline``; raises DeadlineExceeded when none are"""
+    left = deadline - (time.monotonic() if now is None else now)
+    if left <= 0:
+        raise DeadlineExceeded("request deadline exceeded")
+    return left
+
+
+def create_breakers() -> Optional[CircuitBreakers]:
+    if not BREAKER_ENABLED:
+        return None
+    if BREAKER_STORE == "memory":
+        return CircuitBreakers()
+    if BREAKER_STORE == "shm":
+        return CircuitBreakers(table=SharedBreakerTable(len(BREAKER_ROUTES)))
+    raise ValueError(f"Unknown PROXY_BREAKER_STORE: {BREAKER_STORE!r}")
+
+
+def create_timeouts() -> RouteTimeouts:
+    return RouteTimeouts()
+
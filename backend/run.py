@@ -0,0 +1,267 @@
+"""Run the gateway with one or more worker processes.
+
+    python -m backend.run --host 0.0.0.0 --port 8000 --workers 4
+
+With one worker (the default) this is plain ``uvicorn backend.server:app``.
+With more, a small pre-fork supervisor binds the listening socket once and
+hands it to PROXY_WORKERS uvicorn processes, replacing any that die.
+
+State that would otherwise be per process is switched to shared stores
+before the workers start, unless the environment already picks one:
+rate-limit counters and circuit breakers go to /dev/shm
+(PROXY_RATELIMIT_STORE=shm, PROXY_BREAKER_STORE=shm) and the response cache
+gets its shared tmpfs tier (PROXY_CACHE_SHARED=1), as do the responses
+kept for Idempotency-Key replays (PROXY_IDEMPOTENCY_SHARED=1). Admission control,
+metrics and the tenant cache stay per worker, so PROXY_ADMISSION_* limits
+apply to each worker separately.
+
+``kill -HUP <supervisor pid>`` restarts the workers one at a time: a
+replacement is started and must finish its startup before the worker it
+replaces is sent SIGTERM. That worker stops accepting connections, lets
+in-flight requests finish for up to PROXY_GRACEFUL_TIMEOUT seconds and
+exits, while the others keep serving the shared socket, so a deploy never
+drops a request. SIGTERM or SIGINT stops every worker the same graceful
+way.
+
+``--profile performance`` (PROXY_PROFILE) is the tuned runtime for
+production traffic:
+
+- uvloop for the event loop and httptools for HTTP parsing, which
+  ``uvicorn[standard]`` in requirements.txt installs; without them a
+  warning is logged and asyncio/h11 are used
+- a listen backlog of PROXY_BACKLOG (4096) so bursts queue in the kernel
+  rather than being refused
+- idle keep-alive connections held for PROXY_KEEPALIVE_TIMEOUT (75)
+  seconds, longer than the usual 60 second idle timeout of the load
+  balancer in front, so it never reuses a connection the proxy just closed
+- uvicorn's per-request access log off, replaced by the batched JSON one
+  of ``backend.accesslog`` (PROXY_ACCESS_LOG=batched)
+
+``python -m backend.benchmarks.profiles`` compares the two profiles.
+"""
+
+import argparse
+import importlib.util
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+
+from .config import env_float, env_int, env_str
+
+logger = logging.getLogger("backend.run")
+
+APP = "backend.server:app"
+
+HOST = env_str("PROXY_HOST", "0.0.0.0")
+PORT = env_int("PROXY_PORT", 8000)
+WORKERS = env_int("PROXY_WORKERS", 1)
+GRACEFUL_TIMEOUT = env_float("PROXY_GRACEFUL_TIMEOUT", 30.0)
+WORKER_BOOT_TIMEOUT = env_float("PROXY_WORKER_BOOT_TIMEOUT", 60.0)
+PROFILE = env_str("PROXY_PROFILE", "default")
+BACKLOG = env_int("PROXY_BACKLOG", 4096)
+KEEPALIVE_TIMEOUT = env_float("PROXY_KEEPALIVE_TIMEOUT", 75.0)
+
+DEFAULT_PROFILE = "default"
+PERFORMANCE_PROFILE = "performance"
+PROFILES = (DEFAULT_PROFILE, PERFORMANCE_PROFILE)
+
+# Defaults that make per-process state shared once there are several workers
+SHARED_STATE = {
+    "PROXY_RATELIMIT_STORE": "shm",
+    "PROXY_BREAKER_STORE": "shm",
+    "PROXY_CACHE_SHARED": "1",
+    "PROXY_IDEMPOTENCY_SHARED": "1",
+}
+
+spawn = multiprocessing.get_context("spawn")
+
+
+def configure_shared_state(workers: int, environ=os.environ) -> Dict[str, str]:
+    """Point single-process stores at shared ones; returns what was set"""
+    if workers <= 1:
+        return {}
+    applied = {}
+    for name, value in SHARED_STATE.items():
+        if not environ.get(name, "").strip():
+            environ[name] = value
+            applied[name] = value
+    return applied
+
+
+def module_available(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+def profile_options(profile: str, environ=os.environ) -> Dict[str, object]:
+    """uvicorn settings for a runtime profile, on top of host, port and timeouts"""
+    if profile == DEFAULT_PROFILE:
+        return {}
+    if profile != PERFORMANCE_PROFILE:
+        raise ValueError(f"Unknown profile: {profile!r}")
+    options: Dict[str, object] = {
+        "backlog": BACKLOG,
+        "timeout_keep_alive": KEEPALIVE_TIMEOUT,
+        "access_log": False,
+    }
+    for option, module, fallback in (("loop", "uvloop", "asyncio"), ("http", "httptools", "h11")):
+        if module_available(module):
+            options[option] = module
+        else:
+            logger.warning("%s is not installed, the performance profile falls back to %s", module, fallback)
+            options[option] = fallback
+    if not environ.get("PROXY_ACCESS_LOG", "").strip():
+        environ["PROXY_ACCESS_LOG"] = "batched"
+    return options
+
+
+class Worker(uvicorn.Server):
+    """uvicorn server that reports when its startup (lifespan included) is done"""
+
+    def __init__(self, config: uvicorn.Config, ready):
+        super().__init__(config)
+        self.ready = ready
+
+    async def startup(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        await super().startup(sockets=sockets)
+        if self.started:
+            self.ready.set()
+
+
+def serve(options: Dict[str, object], sock: socket.socket, ready) -> None:
+    """Worker process entry point"""
+    # Reloads are the supervisor's business; a stray hangup must not kill us
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    Worker(uvicorn.Config(APP, **options), ready).run(sockets=[sock])
+
+
+class Supervisor:
+    """Keeps ``workers`` processes serving one socket, restarting them on SIGHUP"""
+
+    def __init__(
+        self,
+        options: Dict[str, object],
+        sock: socket.socket,
+        workers: int,
+        graceful_timeout: float = GRACEFUL_TIMEOUT,
+        boot_timeout: float = WORKER_BOOT_TIMEOUT,
+    ):
+        self.options = options
+        self.sock = sock
+        self.workers_num = workers
+        self.graceful_timeout = graceful_timeout
+        self.boot_timeout = boot_timeout
+        self.processes: List[multiprocessing.Process] = []
+        self.should_exit = False
+        self.reload_requested = False
+
+    def start_worker(self) -> multiprocessing.Process:
+        ready = spawn.Event()
+        process = spawn.Process(target=serve, args=(self.options, self.sock, ready), daemon=False)
+        process.ready = ready
+        process.start()
+        return process
+
+    def retire(self, process: multiprocessing.Process) -> None:
+        """SIGTERM lets uvicorn finish in-flight requests before exiting"""
+        process.terminate()
+        process.join(self.graceful_timeout + 5)
+        if process.is_alive():
+            logger.warning("Worker %s did not stop in time, killing it", process.pid)
+            process.kill()
+            process.join()
+
+    def rolling_restart(self) -> None:
+        logger.info("Restarting %d workers one at a time", len(self.processes))
+        for index, old in enumerate(list(self.processes)):
+            if self.should_exit:
+                return
+            new = self.start_worker()
+            if not new.ready.wait(self.boot_timeout):
+                logger.error("Worker %s did not start in time; keeping %s and aborting the restart", new.pid, old.pid)
+                new.kill()
+                new.join()
+                return
+            self.processes[index] = new
+            self.retire(old)
+            logger.info("Replaced worker %s with %s", old.pid, new.pid)
+
+    def replace_dead(self) -> None:
+        for index, process in enumerate(self.processes):
+            if not process.is_alive() and not self.should_exit:
+                logger.warning("Worker %s exited with %s, starting a new one", process.pid, process.exitcode)
+                process.join()
+                self.processes[index] = self.start_worker()
+
+    def handle_exit(self, sig, frame) -> None:
+        self.should_exit = True
+
+    def handle_reload(self, sig, frame) -> None:
+        self.reload_requested = True
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.handle_exit)
+        signal.signal(signal.SIGINT, self.handle_exit)
+        signal.signal(signal.SIGHUP, self.handle_reload)
+        logger.info("Starting %d workers on %s (supervisor %d)", self.workers_num, self.sock.getsockname(), os.getpid())
+        self.processes = [self.start_worker() for _ in range(self.workers_num)]
+        try:
+            while not self.should_exit:
+                if self.reload_requested:
+                    self.reload_requested = False
+                    self.rolling_restart()
+                self.replace_dead()
+                time.sleep(0.5)
+        finally:
+            for process in self.processes:
+                if process.is_alive():
+                    process.terminate()
+            deadline = time.monotonic() + self.graceful_timeout + 5
+            for process in self.processes:
+                process.join(max(0.0, deadline - time.monotonic()))
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+            logger.info("All workers stopped")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the WebWaka gateway")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--profile", choices=PROFILES, default=PROFILE)
+    parser.add_argument("--graceful-timeout", type=float, default=GRACEFUL_TIMEOUT)
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s:     %(message)s")
+    options = {
+        "host": args.host,
+        "port": args.port,
+        "timeout_graceful_shutdown": args.graceful_timeout,
+        "log_level": args.log_level,
+    }
+    options.update(profile_options(args.profile))
+    if args.workers <= 1:
+        uvicorn.run(APP, **options)
+        return
+    for name, value in configure_shared_state(args.workers).items():
+        logger.info("%s=%s for %d workers", name, value, args.workers)
+    sock = uvicorn.Config(APP, **options).bind_socket()
+    try:
+        Supervisor(options, sock, args.workers, graceful_timeout=args.graceful_timeout).run()
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,92 +1,800 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse, Response
+import asyncio
+import hmac
+import json
+import math
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import FrozenSet
+
+from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 import httpx
-import os
 
-app = FastAPI()
+from . import (
+    accesslog, admission, balancer, cache, coalesce, compression, etag, forwarding, idempotency,
+    json_validation, metrics, ratelimit, realtime, resilience, static, tenancy, tracing, upstream
+)
+from .config import env_bool, env_int, env_str
+from .upstream import UpstreamResponse
+
+# Streaming pass-through: forward request and response bodies chunk by chunk
+# instead of buffering them, so memory per request stays bounded
+STREAMING = env_bool("PROXY_STREAMING", False)
+STREAM_CHUNK_SIZE = env_int("PROXY_STREAM_CHUNK_SIZE", 64 * 1024)
+
+# JSON bodies are forwarded as raw bytes; optionally reject malformed ones
+VALIDATE_JSON = env_bool("PROXY_VALIDATE_JSON", False)
+
+# Guards the mutating /__proxy endpoints; without it only loopback may call
+# them. Set it whenever anything on the same host (a reverse proxy, a
+# sidecar) forwards client traffic to the proxy, as that arrives from loopback.
+ADMIN_TOKEN = env_str("PROXY_ADMIN_TOKEN", "")
+
+REDIRECT_STATUSES = [301, 302, 303, 307, 308]
+
+DEADLINE_HEADER = resilience.DEADLINE_HEADER.lower().encode()
+REQUEST_ID_HEADER = tracing.REQUEST_ID_HEADER.lower().encode()
+
+# Upstream response headers uvicorn or the proxy write themselves;
+# Server-Timing is merged into the proxy's own, or not exposed at all
+STREAM_DROP = forwarding.dropping(b"date", b"server", b"server-timing")
+RESPONSE_DROP = STREAM_DROP | {b"content-length"}
+RESPONSE_DROP_ETAG = RESPONSE_DROP | {b"etag"}
+NOT_MODIFIED_DROP = frozenset([b"content-type", b"content-encoding"])
+
+
+@lru_cache(maxsize=None)
+def request_drop(keep_length: bool, conditional: bool, identity: bool) -> FrozenSet[bytes]:
+    """Client headers never forwarded as sent.
+
+    httpx sets Host (and the length, unless the body is streamed), and the
+    proxy replaces the deadline with what is left of it, the request id
+    with its own and, when it compresses, Accept-Encoding with identity.
+    On the buffered path the proxy validates conditional GETs itself, so
+    upstream always returns the full body; streamed responses are never
+    compared, so there If-None-Match goes through and Next.js answers it.
+    """
+    names = [b"host", DEADLINE_HEADER, REQUEST_ID_HEADER]
+    if not keep_length:
+        names.append(b"content-length")
+    if conditional:
+        names.append(b"if-none-match")
+    if identity:
+        names.append(b"accept-encoding")
+    return forwarding.dropping(*names)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client for the lifetime of the app instead of one per request
+    app.state.upstream = balancer.create_upstream()
+    await app.state.upstream.start()
+    app.state.cache = cache.create_cache()
+    app.state.single_flight = coalesce.create_single_flight()
+    app.state.idempotency = idempotency.create_store()
+    app.state.rate_limiter = ratelimit.create_rate_limiter()
+    app.state.tenant_resolver = tenancy.create_resolver(app.state.upstream)
+    app.state.timeouts = resilience.create_timeouts()
+    # The shared breaker table takes a blocking file lock while it is set up
+    app.state.breakers = await asyncio.to_thread(resilience.create_breakers)
+    app.state.admission = admission.create_scheduler()
+    app.state.static = static.create_static_files()
+    app.state.realtime = realtime.create_realtime()
+    app.state.metrics = metrics.create_metrics()
+    app.state.access_log = accesslog.create_access_log()
+    app.state.cors = forwarding.create_cors()
+    if app.state.access_log is not None:
+        await app.state.access_log.start()
+    if app.state.metrics is not None:
+        app.state.metrics.gauge(
+            "proxy_upstream_requests_in_flight",
+            "Requests currently waiting on Next.js",
+            lambda: app.state.upstream.in_flight,
+        )
+        if app.state.admission is not None:
+            app.state.metrics.gauge(
+                "proxy_admission_queue_depth",
+                "Requests waiting for an upstream slot",
+                app.state.admission.queue_depths,
+                label_names=("lane", "tenant"),
+            )
+            app.state.metrics.gauge(
+                "proxy_admission_in_flight",
+                "Upstream slots currently held",
+                app.state.admission.in_flight_by_lane,
+                label_names=("lane",),
+            )
+        if app.state.realtime is not None:
+            app.state.metrics.gauge(
+                "proxy_realtime_connections",
+                "Open WebSocket and SSE connections",
+                app.state.realtime.open_by_kind,
+                label_names=("kind",),
+            )
+    try:
+        yield
+    finally:
+        await app.state.upstream.aclose()
+        if app.state.access_log is not None:
+            await app.state.access_log.aclose()
+        if app.state.rate_limiter is not None:
+            await app.state.rate_limiter.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.get("/__proxy/pool")
+async def pool_stats(request: Request):
+    """Connection pool usage (per node when load balancing)"""
+    return request.app.state.upstream.stats()
+
+
+@app.get("/__metrics")
+async def metrics_endpoint(request: Request):
+    """Latency histograms in the Prometheus text format"""
+    registry = request.app.state.metrics
+    if registry is None:
+        return JSONResponse(content={"error": "Metrics are disabled"}, status_code=404)
+    return Response(content=registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/__proxy/cache")
+async def cache_stats(request: Request):
+    """Hit/miss counters and size of the response cache"""
+    store = request.app.state.cache
+    if store is None:
+        return {"enabled": False}
+    return {"enabled": True, **store.stats()}
+
+
+@app.get("/__proxy/idempotency")
+async def idempotency_stats(request: Request):
+    """Originals, replays and conflicts of Idempotency-Key requests"""
+    replays = request.app.state.idempotency
+    if replays is None:
+        return {"enabled": False}
+    return {"enabled": True, **replays.stats()}
+
+
+@app.get("/__proxy/static")
+async def static_stats(request: Request):
+    """Hits and memory use of the static asset fast path"""
+    statics = request.app.state.static
+    if statics is None:
+        return {"enabled": False}
+    return {"enabled": True, **statics.stats()}
+
+
+@app.get("/__proxy/realtime")
+async def realtime_stats(request: Request):
+    """Open, total and idle-closed WebSocket and SSE connections"""
+    relay = request.app.state.realtime
+    if relay is None:
+        return {"enabled": False}
+    return {"enabled": True, **relay.stats()}
+
+
+@app.get("/__proxy/coalesce")
+async def coalesce_stats(request: Request):
+    """Leader/follower counters of request coalescing"""
+    flights = request.app.state.single_flight
+    if flights is None:
+        return {"enabled": False}
+    return {"enabled": True, **flights.stats()}
+
+
+@app.get("/__proxy/ratelimit")
+async def ratelimit_stats(request: Request):
+    """Allowed/rejected counters and policies of the gateway rate limiter"""
+    limiter = request.app.state.rate_limiter
+    if limiter is None:
+        return {"enabled": False}
+    return {"enabled": True, **limiter.stats()}
+
+
+@app.get("/__proxy/breakers")
+async def breaker_stats(request: Request):
+    """State of the per-route circuit breakers"""
+    breakers = request.app.state.breakers
+    if breakers is None:
+        return {"enabled": False}
+    return {"enabled": True, "routes": breakers.stats()}
+
+
+@app.get("/__proxy/admission")
+async def admission_stats(request: Request):
+    """Slots, queues and shed counters of each admission lane"""
+    scheduler = request.app.state.admission
+    if scheduler is None:
+        return {"enabled": False}
+    return {"enabled": True, **scheduler.stats()}
+
+
+def is_admin(request: Request) -> bool:
+    """The admin token when one is configured; otherwise any loopback client"""
+    if ADMIN_TOKEN:
+        token = request.headers.get("x-proxy-admin-token", "")
+        return hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+    return request.client is not None and request.client.host in ("127.0.0.1", "::1")
+
+
+@app.get("/__proxy/tenants")
+async def tenant_stats(request: Request):
+    """Domain resolution cache counters"""
+    resolver = request.app.state.tenant_resolver
+    if resolver is None:
+        return {"enabled": False}
+    return {"enabled": True, **resolver.stats()}
+
+
+@app.post("/__proxy/tenants/invalidate")
+async def invalidate_tenants(request: Request):
+    """Drop cached domain resolutions, e.g. after a lifecycle state change.
+
+    Body: {"hosts": ["shop.example.com"]} or {} to clear everything.
+    """
+    if not is_admin(request):
+        return JSONResponse(content={"error": "Forbidden"}, status_code=403)
+    resolver = request.app.state.tenant_resolver
+    if resolver is None:
+        return {"enabled": False, "invalidated": 0}
+    body = await request.body()
+    try:
+        payload = json.loads(body) if body else {}
+    except ValueError:
+        payload = None
+    hosts = payload.get("hosts") if isinstance(payload, dict) else None
+    valid = isinstance(payload, dict) and (
+        hosts is None or (isinstance(hosts, list) and all(isinstance(host, str) for host in hosts))
+    )
+    if not valid:
+        return JSONResponse(
+            content={"error": 'Body must be {"hosts": [...]} or {}'}, status_code=400
+        )
+    return {"enabled": True, "invalidated": resolver.invalidate(hosts)}
+
+
+def rate_limited_response(result: ratelimit.RateLimitResult) -> JSONResponse:
+    """429 in the same shape as applyRateLimit in security-middleware.ts"""
+    retry_after = math.ceil(result.retry_after)
+    return JSONResponse(
+        content={
+            "success": False,
+            "error": result.message or "Too many requests",
+            "retryAfter": retry_after
+        },
+        status_code=429,
+        headers={
+            "X-RateLimit-Limit": str(result.limit),
+            "X-RateLimit-Remaining": str(result.remaining),
+            "X-RateLimit-Reset": str(math.ceil(time.time() + result.reset_after)),
+            "Retry-After": str(retry_after)
+        }
+    )
+
+
+def circuit_open_response(error: resilience.CircuitOpen) -> JSONResponse:
+    """Fail fast while a route's upstream is unhealthy"""
+    retry_after = math.ceil(error.retry_after)
+    return JSONResponse(
+        content={
+            "success": False,
+            "error": "Service temporarily unavailable. Please try again later.",
+            "retryAfter": retry_after
+        },
+        status_code=503,
+        headers={"Retry-After": str(retry_after)}
+    )
+
+
+def overloaded_response(error: admission.Overloaded) -> JSONResponse:
+    """Shed load once a tenant's queue is full or it waited too long"""
+    retry_after = math.ceil(error.retry_after)
+    return JSONResponse(
+        content={
+            "success": False,
+            "error": "Too many concurrent requests. Please try again shortly.",
+            "retryAfter": retry_after
+        },
+        status_code=429,
+        headers={"Retry-After": str(retry_after)}
+    )
+
+
+def timeout_response() -> JSONResponse:
+    return JSONResponse(
+        content={"error": "Proxy error: upstream timed out"},
+        status_code=504
+    )
+
+
+def forward_request_headers(
+    request: Request, keep_length: bool = False, identity: bool = False, conditional: bool = False
+) -> forwarding.RawHeaders:
+    """Client headers for Next.js, repeated ones and cookies included, in one pass"""
+    drop = request_drop(keep_length, conditional, identity)
+    extra = [(REQUEST_ID_HEADER, request.state.request_id.encode())]
+    if identity:
+        extra.append((b"accept-encoding", b"identity"))
+
+    # Governance headers resolved by the gateway replace any sent by the client
+    domain_headers = getattr(request.state, "domain_headers", None)
+    if domain_headers:
+        extra.extend((name.encode(), value.encode()) for name, value in domain_headers.items())
+    return forwarding.request_headers(
+        request.scope["headers"],
+        drop,
+        (b"x-ww-",) if domain_headers is not None else (),
+        extra,
+    )
+
+
+def raw_response(status_code: int, raw_headers: forwarding.RawHeaders, content: bytes = b"") -> Response:
+    """Response carrying already forwarded headers, length computed here"""
+    response = Response(content=content, status_code=status_code)
+    response.raw_headers.extend(raw_headers)
+    return response
+
+
+async def fetch_from_nextjs(request: Request, path: str) -> UpstreamResponse:
+    """Buffered round trip to Next.js"""
+    client = request.app.state.upstream
+
+    # Build the target URL
+    url = client.url_for(path, str(request.query_params))
+
+    # HEAD is answered from a GET so that its length, ETag and encoding are
+    # the GET's; the server leaves the body out
+    method = "GET" if request.method == "HEAD" else request.method
+
+    # Get request body if present
+    body = None
+    if request.method in ["POST", "PUT", "PATCH"]:
+        body = await request.body()
+
+    # The proxy negotiates compression and answers If-None-Match itself, so
+    # ask for the plain, full body
+    headers = forward_request_headers(
+        request,
+        identity=compression.COMPRESSION_ENABLED,
+        conditional=etag.ETAG_ENABLED and request.method in etag.ETAG_METHODS,
+    )
+
+    # Make the proxied request
+    return await call_upstream(
+        request,
+        path,
+        headers,
+        lambda timeout: client.fetch(
+            method=method,
+            url=url,
+            headers=headers,
+            content=body,
+            timeout=timeout,
+        ),
+    )
+
+
+async def call_upstream(request: Request, path: str, headers: forwarding.RawHeaders, send):
+    """Run ``send(timeout)`` within the route's time budget and breaker.
+
+    The remaining budget bounds the whole call (balancer retries included)
+    and is passed on to Next.js in the deadline header. With admission
+    control the call first waits for a slot in its route's lane; a
+    streamed response keeps it until the body is closed.
+    """
+    route = request.app.state.timeouts.for_path(path)
+    left = resilience.remaining(request.state.deadline)
+
+    breakers = request.app.state.breakers
+    breaker = breakers.for_path(path) if breakers is not None else None
+    if breaker is not None:
+        await breaker.admit()
+
+    ok = None
+    slot = None
+    try:
+        scheduler = request.app.state.admission
+        if scheduler is not None and not getattr(request.state, "event_stream", False):
+            try:
+                slot = await scheduler.for_path(path).acquire(
+                    tenant_key(request) or request.headers.get("host", ""), left
+                )
+            except admission.Overloaded:
+                # Waiting used up the whole budget: that is a timeout, not a shed
+                resilience.remaining(request.state.deadline)
+                raise
+            left = resilience.remaining(request.state.deadline)
+        headers.append((DEADLINE_HEADER, str(int(left * 1000)).encode()))
+
+        response = await asyncio.wait_for(send(route.budget(left)), left)
+        ok = resilience.outcome(response)
+        request.state.upstream_timing = (
+            response.timing if isinstance(response, UpstreamResponse) else upstream.timing_of(response)
+        )
+        request.state.upstream_server_timing = response.headers.get_list("server-timing")
+        if slot is not None and isinstance(response, httpx.Response):
+            admission.release_on_close(response, slot)
+            slot = None
+        return response
+    except asyncio.TimeoutError as e:
+        ok = False
+        raise resilience.DeadlineExceeded("request deadline exceeded") from e
+    except BaseException as e:
+        ok = resilience.outcome(error=e)
+        raise
+    finally:
+        if slot is not None:
+            slot.release()
+        if breaker is not None:
+            await breaker.report(ok)
+
+
+async def fetch_coalesced(request: Request, path: str) -> UpstreamResponse:
+    """Share one upstream round trip between identical concurrent GETs"""
+    flights = request.app.state.single_flight
+    if flights is None or request.method not in coalesce.COALESCE_METHODS:
+        return await fetch_from_nextjs(request, path)
+
+    # Always the full-header key, on cached routes too: a miss may come back
+    # private or with Set-Cookie, which must not reach another user
+    key = flights.key_for(request.method, path, str(request.query_params), request.headers.items())
+    response, _ = await flights.do(key, lambda: fetch_from_nextjs(request, path))
+    return response
+
+
+async def fetch_idempotent(request: Request, path: str, key: str):
+    """Execute a keyed write once and replay its response to retries"""
+    replays = request.app.state.idempotency
+    body = await request.body()
+    scope = replays.scope_key(key, tenant_key(request), request.headers)
+    fp = idempotency.fingerprint(request.method, path, str(request.query_params), body)
+    return await replays.do(
+        scope,
+        fp,
+        lambda: fetch_from_nextjs(request, path),
+        resilience.remaining(request.state.deadline),
+    )
+
+
+async def fetch_cached(request: Request, path: str, ttl: float):
+    """Serve a cacheable GET from the response cache, filling it on a miss"""
+    store = request.app.state.cache
+    key = store.key_for(request.method, path, str(request.query_params), request.headers)
 
-NEXTJS_URL = os.environ.get("NEXTJS_URL", "http://localhost:3000")
+    # A client asking for a fresh copy skips the lookup but refills the entry
+    if "no-cache" not in request.headers.get("cache-control", ""):
+        entry, state = store.lookup(key)
+        if state == cache.FRESH:
+            return entry.response, "HIT"
+        if state == cache.STALE:
+            store.revalidate(key, lambda: fetch_for_cache(request, path), ttl)
+            return entry.response, "STALE"
 
-@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"])
+    response = await fetch_coalesced(request, path)
+    if compression.COMPRESSION_ENABLED:
+        await compression.precompress(response)
+    store.store(key, response, ttl)
+    return response, "MISS"
+
+
+async def fetch_for_cache(request: Request, path: str) -> UpstreamResponse:
+    """Upstream fetch for a background cache refresh, variants included"""
+    response = await fetch_from_nextjs(request, path)
+    if compression.COMPRESSION_ENABLED:
+        await compression.precompress(response)
+    return response
+
+
+async def build_response(request: Request, response: UpstreamResponse, cache_status: str = "") -> Response:
+    """Client response for a buffered upstream response"""
+    # Every end-to-end header is forwarded, each repeated line on its own;
+    # the proxy's own ETag replaces the upstream one
+    tagged = etag.ETAG_ENABLED and request.method in etag.ETAG_METHODS and etag.is_etaggable(response)
+    resp_headers = forwarding.filter_headers(response.headers.raw, RESPONSE_DROP_ETAG if tagged else RESPONSE_DROP)
+
+    # Redirects go back to the client with all of their cookies
+    if response.status_code in REDIRECT_STATUSES:
+        return raw_response(response.status_code, resp_headers)
+
+    # The body is relayed as received (JSON included, never re-encoded);
+    # only the compression step below may swap in an encoded variant
+    content = response.content
+    content_type = response.headers.get("content-type", "")
+    content_encoding = response.headers.get("content-encoding", "")
+    if cache_status:
+        resp_headers.append((b"x-proxy-cache", cache_status.encode()))
+
+    # Encoded bodies cannot be checked without decoding them, skip those
+    if (
+        VALIDATE_JSON
+        and "application/json" in content_type
+        and content_encoding in ("", "identity")
+        and not json_validation.is_well_formed(content)
+    ):
+        return JSONResponse(
+            content={"error": "Proxy error: upstream returned malformed JSON"},
+            status_code=502
+        )
+
+    # Compress identity bodies with the best coding the client accepts
+    # (compressible bodies are identity, so there is no upstream coding to replace)
+    encoding = None
+    if compression.COMPRESSION_ENABLED and compression.is_compressible(response):
+        resp_headers.append((b"vary", b"Accept-Encoding"))
+        encoding = compression.negotiate(request.headers.get("accept-encoding"))
+        if encoding:
+            content = await compression.compressed(response, encoding)
+            resp_headers.append((b"content-encoding", encoding.encode()))
+
+    # Conditional GET: answer a matching If-None-Match without the body
+    if tagged:
+        tag = etag.for_encoding(etag.ensure_etag(response), encoding)
+        resp_headers.append((b"etag", tag.encode("latin-1")))
+        if etag.if_none_match(request.headers.get("if-none-match"), tag):
+            return raw_response(
+                304, [(name, value) for name, value in resp_headers if name not in NOT_MODIFIED_DROP]
+            )
+
+    return raw_response(response.status_code, resp_headers, content)
+
+
+def add_trace_headers(request: Request, response: Response, started_at: float) -> None:
+    """Return the request id and the merged Server-Timing breakdown"""
+    response.headers[tracing.REQUEST_ID_HEADER] = request.state.request_id
+    if not tracing.SERVER_TIMING_ENABLED:
+        return
+    entries = tracing.proxy_entries(
+        started_at,
+        time.perf_counter(),
+        getattr(request.state, "upstream_timing", None),
+        response.headers.get("x-proxy-cache", ""),
+    )
+    response.headers["server-timing"] = tracing.merge_server_timing(
+        getattr(request.state, "upstream_server_timing", []), entries
+    )
+
+
+def tenant_key(request: Request) -> str:
+    """``x-tenant-id`` or the tenant resolved from the Host, if any"""
+    domain_headers = getattr(request.state, "domain_headers", None) or {}
+    return request.headers.get("x-tenant-id") or domain_headers.get(tenancy.TENANT_HEADER, "")
+
+
+def observe(request: Request, path: str, response: Response, started_at: float) -> None:
+    """Record the request in the latency histograms and access log once it is answered"""
+    registry = request.app.state.metrics
+    access_log = request.app.state.access_log
+    if registry is None and access_log is None:
+        return
+    tenant = tenant_key(request)
+
+    def record() -> None:
+        finished_at = time.perf_counter()
+        if registry is not None:
+            registry.observe(
+                path,
+                tenant,
+                response.status_code,
+                started_at,
+                finished_at,
+                getattr(request.state, "upstream_timing", None),
+            )
+        if access_log is not None:
+            access_log.record(
+                request.method, path, response.status_code, finished_at - started_at,
+                tenant, request.state.request_id,
+            )
+
+    if not isinstance(response, StreamingResponse):
+        record()
+        return
+
+    # Streamed bodies are only done once the background task runs
+    background = response.background
+
+    async def finish() -> None:
+        if background is not None:
+            await background()
+        record()
+
+    response.background = BackgroundTask(finish)
+
+
+@app.api_route("/{path:path}", methods=["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"])
 async def proxy_to_nextjs(request: Request, path: str):
     """Proxy all requests to Next.js"""
+    started_at = time.perf_counter()
+    request.state.request_id = tracing.request_id(request.headers.get(tracing.REQUEST_ID_HEADER))
+    response = await proxy_request(request, path)
+    cors = request.app.state.cors
+    if cors is not None:
+        origin = request.headers.get("origin")
+        cors.apply(response.raw_headers, origin.encode("latin-1") if origin else None)
+    add_trace_headers(request, response, started_at)
+    observe(request, path, response, started_at)
+    return response
+
+
+async def proxy_request(request: Request, path: str):
+    """Rate limit, resolve, then answer from the cache or Next.js"""
+    # Build output and public files never need Node (or any of the below)
+    statics = request.app.state.static
+    if statics is not None:
+        response = await statics.serve(request.method, "/" + path, request.headers)
+        if response is not None:
+            return response
+
+    # The route's time budget starts now, queueing in the proxy included
+    request.state.deadline = request.app.state.timeouts.deadline(
+        path, request.headers.get(resilience.DEADLINE_HEADER)
+    )
+
+    # Reject abusive clients before any work is done on their behalf
+    limiter = request.app.state.rate_limiter
+    if limiter is not None:
+        client_host = request.client.host if request.client else None
+        result = await limiter.check(
+            ratelimit.client_identifier(request.headers, client_host), "/" + path
+        )
+        if not result.allowed:
+            return rate_limited_response(result)
+
+    # Resolve Host to partner/tenant/suite once, instead of in Next.js
+    resolver = request.app.state.tenant_resolver
+    if resolver is not None:
+        request.state.domain_headers = await resolver.headers_for(request.headers.get("host", ""))
+
+    store = request.app.state.cache
+    ttl = store.ttl_for(request.method, path) if store is not None else None
+
+    # Event streams stay open: relay them unbuffered and never cache them
+    if realtime.SSE_ENABLED and request.app.state.realtime is not None and realtime.wants_event_stream(request.headers):
+        return await stream_to_nextjs(request, path, event_stream=True)
+
+    # Writes carrying an Idempotency-Key run once; retries get the same answer
+    replays = request.app.state.idempotency
+    key = None
+    if replays is not None and replays.applies(request.method, path):
+        key = request.headers.get(idempotency.IDEMPOTENCY_HEADER)
+
+    # Cacheable routes and replayable writes always take the buffered path so they can be stored
+    if STREAMING and ttl is None and key is None:
+        return await stream_to_nextjs(request, path)
+
     try:
-        async with httpx.AsyncClient(follow_redirects=False) as client:
-            # Build the target URL
-            url = f"{NEXTJS_URL}/{path}"
-            if request.query_params:
-                url += f"?{request.query_params}"
-            
-            # Get request body if present
-            body = None
-            if request.method in ["POST", "PUT", "PATCH"]:
-                body = await request.body()
-            
-            # Forward headers including cookies
-            headers = {}
-            for key, value in request.headers.items():
-                # Forward most headers, skip some
-                lower_key = key.lower()
-                if lower_key not in ['host', 'content-length']:
-                    headers[key] = value
-            
-            # Make the proxied request
-            response = await client.request(
+        if key is not None:
+            response, replayed = await fetch_idempotent(request, path, key)
+            built = await build_response(request, response)
+            if replayed:
+                built.headers[idempotency.REPLAYED_HEADER] = "true"
+            return built
+
+        if ttl is not None:
+            response, cache_status = await fetch_cached(request, path, ttl)
+            return await build_response(request, response, cache_status)
+
+        return await build_response(request, await fetch_coalesced(request, path))
+
+    except idempotency.InvalidKey:
+        return JSONResponse(
+            content={"success": False, "error": "Invalid Idempotency-Key header"},
+            status_code=400
+        )
+    except idempotency.KeyReused:
+        return JSONResponse(
+            content={"success": False, "error": "Idempotency-Key was already used for a different request"},
+            status_code=422
+        )
+    except resilience.CircuitOpen as e:
+        return circuit_open_response(e)
+    except admission.Overloaded as e:
+        return overloaded_response(e)
+    except (resilience.DeadlineExceeded, httpx.TimeoutException, asyncio.TimeoutError):
+        return timeout_response()
+    except httpx.HTTPError as e:
+        return JSONResponse(
+            content={"error": f"Proxy error: {str(e)}"},
+            status_code=502
+        )
+    except Exception as e:
+        return JSONResponse(
+            content={"error": str(e)},
+            status_code=500
+        )
+
+
+async def stream_to_nextjs(request: Request, path: str, event_stream: bool = False):
+    """Streaming variant of the proxy.
+
+    The request body is handed to httpx as the ASGI receive stream and the
+    upstream body is relayed with ``aiter_raw``. StreamingResponse only pulls
+    the next chunk once the previous one has been sent, so a slow client
+    applies backpressure all the way to Next.js and at most one chunk per
+    direction is held in memory.
+
+    Event streams are relayed as each chunk arrives and hold one of the
+    realtime connections until they end.
+    """
+    relay = request.app.state.realtime
+    if event_stream:
+        if not relay.admit(realtime.SSE):
+            return JSONResponse(
+                content={"error": "Too many open event streams"},
+                status_code=503,
+                headers={"Retry-After": "5"}
+            )
+        request.state.event_stream = True
+
+    response = await open_stream(request, path, event_stream)
+    if event_stream and (not isinstance(response, httpx.Response) or response.status_code in REDIRECT_STATUSES):
+        relay.done(realtime.SSE)
+    if not isinstance(response, httpx.Response):
+        return response
+
+    # Raw bytes are relayed untouched, so the encoding and length still apply
+    resp_headers = forwarding.filter_headers(response.headers.raw, STREAM_DROP)
+
+    if response.status_code in REDIRECT_STATUSES:
+        await response.aclose()
+        return raw_response(
+            response.status_code, [(name, value) for name, value in resp_headers if name != b"content-length"]
+        )
+
+    if event_stream:
+        if "cache-control" not in response.headers:
+            resp_headers.append((b"cache-control", b"no-cache"))
+        resp_headers.append((b"x-accel-buffering", b"no"))
+
+        async def finish() -> None:
+            await response.aclose()
+            relay.done(realtime.SSE)
+
+        body, background = relay.relay_events(response), BackgroundTask(finish)
+    else:
+        body, background = response.aiter_raw(STREAM_CHUNK_SIZE), BackgroundTask(response.aclose)
+
+    streamed = StreamingResponse(body, status_code=response.status_code, background=background)
+    streamed.raw_headers.extend(resp_headers)
+    return streamed
+
+
+async def open_stream(request: Request, path: str, event_stream: bool = False):
+    """The upstream response with its body unread, or an error response"""
+    client = request.app.state.upstream
+    try:
+        url = client.url_for(path, str(request.query_params))
+
+        body = None
+        if request.method in ["POST", "PUT", "PATCH"]:
+            body = request.stream()
+
+        headers = forward_request_headers(request, keep_length=True)
+        # The total budget covers the wait for the response headers; the
+        # body is then bounded by the per-chunk read timeout
+        response = await call_upstream(
+            request,
+            path,
+            headers,
+            lambda timeout: client.stream(
                 method=request.method,
                 url=url,
                 headers=headers,
                 content=body,
-                timeout=30.0
-            )
-            
-            # Build response headers
-            resp_headers = {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "*",
-                "Access-Control-Allow-Headers": "*"
-            }
-            
-            # Forward Set-Cookie headers
-            if "set-cookie" in response.headers:
-                resp_headers["set-cookie"] = response.headers["set-cookie"]
-            
-            # Handle redirects - return them to the client with cookies
-            if response.status_code in [301, 302, 303, 307, 308]:
-                location = response.headers.get("location", "/")
-                
-                # Create redirect response
-                redirect_resp = Response(
-                    content=None,
-                    status_code=response.status_code,
-                    headers={
-                        "location": location,
-                        **resp_headers
-                    }
-                )
-                
-                # Copy all Set-Cookie headers
-                for cookie in response.headers.get_list("set-cookie"):
-                    redirect_resp.headers.append("set-cookie", cookie)
-                
-                return redirect_resp
-            
-            # Handle JSON responses
-            content_type = response.headers.get("content-type", "")
-            if "application/json" in content_type:
-                return JSONResponse(
-                    content=response.json(),
-                    status_code=response.status_code,
-                    headers=resp_headers
-                )
-            
-            # Handle other responses (HTML, etc.)
-            return Response(
-                content=response.content,
-                status_code=response.status_code,
-                media_type=content_type,
-                headers=resp_headers
-            )
-            
+                # Between events only the idle timeout applies
+                timeout=realtime.sse_timeout(timeout) if event_stream else timeout,
+            ),
+        )
+        return response
+    except resilience.CircuitOpen as e:
+        return circuit_open_response(e)
+    except admission.Overloaded as e:
+        return overloaded_response(e)
+    except (resilience.DeadlineExceeded, httpx.TimeoutException):
+        return timeout_response()
     except httpx.HTTPError as e:
         return JSONResponse(
             content={"error": f"Proxy error: {str(e)}"},
@@ -98,6 +806,27 @@ async def proxy_to_nextjs(request: Request, path: str):
             status_code=500
         )
 
+
+@app.websocket("/{path:path}")
+async def proxy_websocket(websocket: WebSocket, path: str):
+    """Relay WebSocket connections to Next.js"""
+    relay = websocket.app.state.realtime
+    if relay is None or not realtime.WEBSOCKETS_ENABLED:
+        await websocket.close()
+        return
+
+    extra = {tracing.REQUEST_ID_HEADER: tracing.request_id(websocket.headers.get(tracing.REQUEST_ID_HEADER))}
+    headers = websocket.headers.items()
+    resolver = websocket.app.state.tenant_resolver
+    if resolver is not None:
+        extra.update(await resolver.headers_for(websocket.headers.get("host", "")))
+        # Governance headers resolved by the gateway replace any sent by the client
+        headers = [(name, value) for name, value in headers if not name.lower().startswith("x-ww-")]
+
+    url = websocket.app.state.upstream.websocket_url(path, str(websocket.query_params))
+    await relay.relay_websocket(websocket, url, realtime.websocket_headers(headers, extra))
+
+
 @app.get("/")
 async def root():
     return {"status": "ok", "message": "Backend proxy to Next.js"}
@@ -0,0 +1,353 @@
+"""Static asset fast path: ``/_next/static`` and ``public/`` served by the proxy.
+
+Every ``/_next/static/*`` chunk, icon and manifest used to make a round trip
+through Node. With PROXY_STATIC enabled the proxy answers them itself from
+the build output (PROXY_STATIC_NEXT_DIR, ``frontend/.next/static``) and
+from ``frontend/public`` (PROXY_STATIC_PUBLIC_DIR) for the prefixes in
+PROXY_STATIC_PUBLIC_PATHS, so Node workers only see dynamic requests.
+
+- Files up to PROXY_STATIC_MEMORY_FILE_MAX bytes are kept in memory, in an
+  LRU bounded by PROXY_STATIC_MEMORY_MAX_BYTES; larger files are streamed
+  from disk with ``pread`` in the thread pool (uvicorn offers no sendfile
+  to ASGI apps).
+- ``/_next/static`` names are content hashed, so they are sent with
+  ``Cache-Control: public, max-age=31536000, immutable`` and never
+  re-checked on disk. Public files revalidate (``max-age=0``) and are
+  re-read when their size or mtime changes.
+- Precompressed ``.br`` and ``.gz`` siblings are served when the client
+  accepts them; otherwise small compressible files are compressed once in
+  memory, as the proxy does for API responses.
+- ETag/Last-Modified, If-None-Match and single ``Range`` requests (with
+  If-Range) are answered here. Ranges always apply to the identity body.
+
+Anything not found on disk falls through to Next.js as before.
+"""
+
+import mimetypes
+import os
+import stat
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from email.utils import formatdate
+from typing import AsyncIterator, Dict, List, Mapping, Optional, Tuple
+
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from . import compression, etag
+from .config import env_bool, env_int, env_list, env_str
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend")
+
+STATIC_ENABLED = env_bool("PROXY_STATIC", False)
+STATIC_NEXT_DIR = env_str("PROXY_STATIC_NEXT_DIR", os.path.join(FRONTEND_DIR, ".next", "static"))
+STATIC_PUBLIC_DIR = env_str("PROXY_STATIC_PUBLIC_DIR", os.path.join(FRONTEND_DIR, "public"))
+STATIC_PUBLIC_PATHS = env_list(
+    "PROXY_STATIC_PUBLIC_PATHS",
+    "/icons,/images,/manifest.json,/manifest.webmanifest,/robots.txt,/favicon.ico",
+)
+STATIC_MEMORY_MAX_BYTES = env_int("PROXY_STATIC_MEMORY_MAX_BYTES", 64 * 1024 * 1024)
+STATIC_MEMORY_FILE_MAX = env_int("PROXY_STATIC_MEMORY_FILE_MAX", 1024 * 1024)
+STATIC_CHUNK_SIZE = env_int("PROXY_STATIC_CHUNK_SIZE", 256 * 1024)
+
+NEXT_STATIC_PREFIX = "/_next/static"
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=0, must-revalidate"
+
+# Precompressed sibling suffix per content-coding
+PRECOMPRESSED = {"br": ".br", "gzip": ".gz"}
+
+STATIC_METHODS = ("GET", "HEAD")
+
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+mimetypes.add_type("application/javascript", ".js")
+mimetypes.add_type("font/woff2", ".woff2")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, end inclusive) of a single ``bytes=`` range.
+
+    None means "ignore and send everything" (multiple or malformed ranges,
+    which RFC 7233 allows a server to do); RangeNotSatisfiable means 416.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start, end = max(0, size - int(last)), size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if start < 0 or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+@dataclass
+class StaticFile:
+    path: str
+    size: int
+    mtime_ns: int
+    content_type: str
+    immutable: bool
+    # content-coding -> path of a precompressed sibling
+    siblings: Dict[str, str] = field(default_factory=dict)
+    # Bodies held in memory, "" for the identity body
+    bodies: Dict[str, bytes] = field(default_factory=dict)
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.size:x}-{self.mtime_ns:x}"'
+
+    def compressible(self, memory_file_max: int) -> bool:
+        """Whether the proxy may compress it (only files it keeps in memory)"""
+        return (
+            compression.COMPRESSION_ENABLED
+            and compression.COMPRESSION_MIN_SIZE <= self.size <= memory_file_max
+            and any(self.content_type.startswith(p) for p in compression.COMPRESSION_TYPES)
+        )
+
+    def encodings(self, memory_file_max: int) -> List[str]:
+        """Codings this file can be sent in, server preference order"""
+        compressible = self.compressible(memory_file_max)
+        return [
+            name for name in compression.COMPRESSION_ENCODINGS
+            if name in self.siblings or (compressible and name in compression.COMPRESSORS)
+        ]
+
+    def memory_size(self) -> int:
+        return sum(len(body) for body in self.bodies.values())
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def file_chunks(path: str, start: int, length: int, chunk_size: int = STATIC_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    fd = await run_in_threadpool(os.open, path, os.O_RDONLY)
+    try:
+        while length > 0:
+            chunk = await run_in_threadpool(os.pread, fd, min(chunk_size, length), start)
+            if not chunk:
+                break
+            start += len(chunk)
+            length -= len(chunk)
+            yield chunk
+    finally:
+        os.close(fd)
+
+
+class StaticFiles:
+    """Maps URL paths to files under the mounted directories and serves them"""
+
+    def __init__(
+        self,
+        mounts: Optional[List[Tuple[str, str, bool]]] = None,
+        memory_max_bytes: int = STATIC_MEMORY_MAX_BYTES,
+        memory_file_max: int = STATIC_MEMORY_FILE_MAX,
+    ):
+        if mounts is None:
+            mounts = [(NEXT_STATIC_PREFIX, STATIC_NEXT_DIR, True)] + [
+                (prefix, os.path.join(STATIC_PUBLIC_DIR, prefix.strip("/")), False)
+                for prefix in STATIC_PUBLIC_PATHS
+            ]
+        # (url prefix, real filesystem root, immutable), longest prefix first
+        self.mounts = sorted(
+            ((prefix.rstrip("/"), os.path.realpath(root), immutable) for prefix, root, immutable in mounts),
+            key=lambda mount: len(mount[0]),
+            reverse=True,
+        )
+        self.memory_max_bytes = memory_max_bytes
+        self.memory_file_max = memory_file_max
+        self._files: Dict[str, StaticFile] = {}
+        # URL paths whose bodies are in memory, least recently used first
+        self._memory: "OrderedDict[str, StaticFile]" = OrderedDict()
+        self.memory_bytes = 0
+        self.hits = 0
+        self.not_modified = 0
+        self.partial = 0
+        self.misses = 0
+
+    def resolve(self, url_path: str) -> Optional[Tuple[str, bool]]:
+        """Filesystem path and immutability for ``url_path``, if it is mounted"""
+        for prefix, root, immutable in self.mounts:
+            if url_path != prefix and not url_path.startswith(prefix + "/"):
+                continue
+            relative = url_path[len(prefix):].lstrip("/")
+            target = os.path.realpath(os.path.join(root, relative)) if relative else root
+            # No escaping the mount through "..", symlinks or encoded slashes
+            if target != root and not target.startswith(root + os.sep):
+                return None
+            return target, immutable
+        return None
+
+    def lookup(self, url_path: str) -> Optional[StaticFile]:
+        known = self._files.get(url_path)
+        if known is not None and known.immutable:
+            return known
+        resolved = self.resolve(url_path)
+        if resolved is None:
+            return None
+        path, immutable = resolved
+        try:
+            info = os.stat(path)
+        except OSError:
+            self._forget(url_path)
+            return None
+        if not stat.S_ISREG(info.st_mode):
+            return None
+        if known is not None and known.size == info.st_size and known.mtime_ns == info.st_mtime_ns:
+            return known
+        self._forget(url_path)
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+            content_type += "; charset=utf-8"
+        static_file = StaticFile(path, info.st_size, info.st_mtime_ns, content_type, immutable)
+        for encoding, suffix in PRECOMPRESSED.items():
+            if os.path.isfile(path + suffix):
+                static_file.siblings[encoding] = path + suffix
+        self._files[url_path] = static_file
+        return static_file
+
+    def _forget(self, url_path: str) -> None:
+        static_file = self._files.pop(url_path, None)
+        if static_file is not None and self._memory.pop(url_path, None) is not None:
+            self.memory_bytes -= static_file.memory_size()
+
+    async def body(self, url_path: str, static_file: StaticFile, encoding: Optional[str]) -> Optional[bytes]:
+        """The body in ``encoding`` from memory, loading it when it fits; None for disk"""
+        key = encoding or ""
+        body = static_file.bodies.get(key)
+        if body is not None:
+            self._memory.move_to_end(url_path)
+            return body
+
+        source = static_file.siblings.get(encoding) if encoding else static_file.path
+        if source is not None:
+            if os.path.getsize(source) > self.memory_file_max:
+                return None
+            body = await run_in_threadpool(read_file, source)
+        else:
+            # No sibling: compress the identity body once
+            identity = await self.body(url_path, static_file, None)
+            if identity is None:
+                return None
+            body = await compression.compress(encoding, identity)
+
+        if len(body) <= self.memory_max_bytes:
+            if url_path in self._memory:
+                self._memory.move_to_end(url_path)
+            else:
+                self._memory[url_path] = static_file
+            static_file.bodies[key] = body
+            self.memory_bytes += len(body)
+            self._evict(keep=url_path)
+        return body
+
+    def _evict(self, keep: str) -> None:
+        while self.memory_bytes > self.memory_max_bytes and len(self._memory) > 1:
+            url_path = next(iter(self._memory))
+            if url_path == keep:
+                self._memory.move_to_end(url_path)
+                continue
+            static_file = self._memory.pop(url_path)
+            self.memory_bytes -= static_file.memory_size()
+            static_file.bodies.clear()
+
+    async def serve(self, method: str, url_path: str, headers: Mapping[str, str]) -> Optional[Response]:
+        """Response for a static asset, or None to let Next.js handle the path"""
+        if method not in STATIC_METHODS:
+            return None
+        static_file = self.lookup(url_path)
+        if static_file is None:
+            if self.resolve(url_path) is not None:
+                self.misses += 1
+            return None
+        self.hits += 1
+
+        resp_headers = {
+            "cache-control": IMMUTABLE if static_file.immutable else REVALIDATE,
+            "last-modified": formatdate(static_file.mtime_ns / 1e9, usegmt=True),
+            "accept-ranges": "bytes",
+            "content-type": static_file.content_type,
+        }
+
+        byte_range = None
+        range_header = headers.get("range")
+        if range_header and method == "GET":
+            if_range = headers.get("if-range")
+            if not if_range or if_range.strip() == static_file.etag:
+                try:
+                    byte_range = parse_range(range_header, static_file.size)
+                except RangeNotSatisfiable:
+                    return Response(
+                        status_code=416,
+                        headers={**resp_headers, "content-range": f"bytes */{static_file.size}"},
+                    )
+
+        encodings = static_file.encodings(self.memory_file_max)
+        encoding = None
+        if encodings:
+            resp_headers["vary"] = "Accept-Encoding"
+            if byte_range is None:
+                encoding = compression.negotiate(headers.get("accept-encoding"), encodings)
+
+        tag = etag.for_encoding(static_file.etag, encoding)
+        resp_headers["etag"] = tag
+        if etag.if_none_match(headers.get("if-none-match"), tag):
+            self.not_modified += 1
+            del resp_headers["content-type"]
+            return Response(status_code=304, headers=resp_headers)
+        if encoding:
+            resp_headers["content-encoding"] = encoding
+
+        status_code = 200
+        body = await self.body(url_path, static_file, encoding)
+        source = static_file.siblings.get(encoding, static_file.path)
+        size = len(body) if body is not None else os.path.getsize(source)
+        start, length = 0, size
+        if byte_range is not None:
+            status_code = 206
+            self.partial += 1
+            start, end = byte_range
+            length = end - start + 1
+            resp_headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+        if method == "HEAD":
+            resp_headers["content-length"] = str(length)
+            return Response(status_code=status_code, headers=resp_headers)
+        if body is not None:
+            return Response(content=body[start:start + length], status_code=status_code, headers=resp_headers)
+        resp_headers["content-length"] = str(length)
+        return StreamingResponse(file_chunks(source, start, length), status_code=status_code, headers=resp_headers)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "mounts": {prefix: root for prefix, root, _ in self.mounts},
+            "files": len(self._files),
+            "files_in_memory": len(self._memory),
+            "memory_bytes": self.memory_bytes,
+            "memory_max_bytes": self.memory_max_bytes,
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "partial": self.partial,
+            "misses": self.misses,
+        }
+
+
+def create_static_files() -> Optional[StaticFiles]:
+    if not STATIC_ENABLED:
+        return None
+    return StaticFiles()
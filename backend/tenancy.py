@@ -0,0 +1,274 @@
+"""Host to partner/tenant/suite resolution at the gateway.
+
+``frontend/middleware.ts`` and ``frontend/src/lib/tenant-resolver.ts`` work
+this out again on every request, and the tenant resolver goes to Prisma to
+do it. With PROXY_TENANT_RESOLUTION enabled the proxy resolves each Host
+once and injects the result as ``x-ww-partner``, ``x-ww-tenant``,
+``x-ww-suite`` (and ``x-ww-instance``) request headers for Next.js.
+
+Hosts are resolved, in order, from:
+
+1. the static domain registry (``domain_registry.json``, the same entries
+   as ``DOMAIN_REGISTRY`` in middleware.ts)
+2. ``GET /api/tenants/resolve?host=`` on the upstream, for custom domains
+   and tenant subdomains stored in the database
+
+Lookup results, including "no tenant" answers, are kept in a bounded LRU
+for PROXY_TENANT_TTL (PROXY_TENANT_NEGATIVE_TTL for misses). Concurrent
+lookups for one host share a single upstream call. When a domain's
+lifecycle state changes, POST /__proxy/tenants/invalidate drops it.
+
+Next.js also listens on its own port, so middleware.ts only believes these
+headers (and skips its own resolution) when they arrive with
+``x-ww-gateway`` set to the PROXY_GATEWAY_TOKEN both processes share. The
+token is only sent once a Host has actually been answered; after a failed
+lookup Next.js resolves the request itself.
+"""
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlencode
+
+from .coalesce import SingleFlight
+from .config import env_bool, env_float, env_int, env_str
+from .upstream import UpstreamClient
+
+logger = logging.getLogger("backend.tenancy")
+
+RESOLUTION_ENABLED = env_bool("PROXY_TENANT_RESOLUTION", False)
+RESOLUTION_LOOKUP = env_bool("PROXY_TENANT_LOOKUP", True)
+RESOLUTION_TTL = env_float("PROXY_TENANT_TTL", 300.0)
+RESOLUTION_NEGATIVE_TTL = env_float("PROXY_TENANT_NEGATIVE_TTL", 30.0)
+RESOLUTION_MAX_ENTRIES = env_int("PROXY_TENANT_CACHE_SIZE", 10000)
+GATEWAY_TOKEN = env_str("PROXY_GATEWAY_TOKEN", "")
+DOMAIN_REGISTRY_PATH = env_str(
+    "PROXY_DOMAIN_REGISTRY", os.path.join(os.path.dirname(__file__), "domain_registry.json")
+)
+
+PARTNER_HEADER = "x-ww-partner"
+TENANT_HEADER = "x-ww-tenant"
+SUITE_HEADER = "x-ww-suite"
+INSTANCE_HEADER = "x-ww-instance"
+DOMAIN_STATE_HEADER = "x-ww-domain-state"
+REGULATOR_MODE_HEADER = "x-ww-regulator-mode"
+GATEWAY_HEADER = "x-ww-gateway"
+
+# Development/preview hosts are never resolved (same list as middleware.ts)
+DEV_HOST_MARKERS = ("localhost", "127.0.0.1", ".vercel.app", ".emergent.")
+
+
+@dataclass
+class DomainContext:
+    host: str
+    tenant: str
+    partner: str = ""
+    suite: str = ""
+    instance: str = ""
+    state: str = "ACTIVE"
+    regulator_mode: bool = False
+    source: str = "registry"
+
+    def headers(self) -> Dict[str, str]:
+        """Governance headers to send downstream"""
+        if self.state != "ACTIVE":
+            # Next.js rewrites PENDING/SUSPENDED domains itself
+            return {DOMAIN_STATE_HEADER: self.state}
+        headers = {TENANT_HEADER: self.tenant, DOMAIN_STATE_HEADER: self.state}
+        if self.partner:
+            headers[PARTNER_HEADER] = self.partner
+        if self.suite:
+            headers[SUITE_HEADER] = self.suite
+        if self.instance:
+            headers[INSTANCE_HEADER] = self.instance
+        if self.regulator_mode:
+            headers[REGULATOR_MODE_HEADER] = "true"
+        return headers
+
+
+def normalize_host(host: str) -> str:
+    return host.split(":")[0].strip().lower()
+
+
+def load_registry(path: str = DOMAIN_REGISTRY_PATH) -> Dict[str, DomainContext]:
+    try:
+        with open(path) as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        logger.warning("Domain registry %s not found; using database lookups only", path)
+        return {}
+    registry = {}
+    for entry in entries:
+        host = normalize_host(entry["domain"])
+        registry[host] = DomainContext(
+            host=host,
+            tenant=entry["tenant_slug"],
+            partner=entry.get("partner_slug", ""),
+            suite=entry.get("primary_suite", ""),
+            state=entry.get("lifecycle_state", "ACTIVE"),
+            regulator_mode=bool(entry.get("regulator_mode", False)),
+        )
+    return registry
+
+
+Lookup = Callable[[str], Awaitable[Optional[DomainContext]]]
+
+
+class TenantResolver:
+    """Registry + cached upstream lookups, with negative caching"""
+
+    def __init__(
+        self,
+        registry: Optional[Dict[str, DomainContext]] = None,
+        lookup: Optional[Lookup] = None,
+        ttl: float = RESOLUTION_TTL,
+        negative_ttl: float = RESOLUTION_NEGATIVE_TTL,
+        max_entries: int = RESOLUTION_MAX_ENTRIES,
+    ):
+        self.registry = load_registry() if registry is None else registry
+        self.lookup = lookup
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Optional[DomainContext], float]]" = OrderedDict()
+        self._flights = SingleFlight()
+        # Bumped by invalidate so lookups already in flight neither write
+        # their (possibly stale) answer back nor get joined by new callers
+        self._generation = 0
+        self.registry_hits = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.lookups = 0
+        self.lookup_errors = 0
+        self.invalidations = 0
+
+    async def resolve(self, host: str) -> Optional[DomainContext]:
+        try:
+            return await self._resolve(host)
+        except Exception:
+            self._lookup_failed(host)
+            return None
+
+    async def headers_for(self, host: str) -> Dict[str, str]:
+        """Headers for Next.js, carrying the gateway token once ``host`` is answered"""
+        try:
+            context = await self._resolve(host)
+        except Exception:
+            self._lookup_failed(host)
+            return {}
+        headers = context.headers() if context is not None else {}
+        if GATEWAY_TOKEN:
+            headers[GATEWAY_HEADER] = GATEWAY_TOKEN
+        return headers
+
+    def _lookup_failed(self, host: str) -> None:
+        # Leave it to Next.js to resolve; do not remember the failure
+        self.lookup_errors += 1
+        logger.warning("Tenant lookup failed for %s", host, exc_info=True)
+
+    async def _resolve(self, host: str) -> Optional[DomainContext]:
+        host = normalize_host(host)
+        if not host or any(marker in host for marker in DEV_HOST_MARKERS):
+            return None
+
+        context = self.registry.get(host)
+        if context is not None:
+            self.registry_hits += 1
+            return context
+        if self.lookup is None:
+            return None
+
+        now = time.monotonic()
+        cached = self._entries.get(host)
+        if cached is not None:
+            context, expires_at = cached
+            if now < expires_at:
+                self._entries.move_to_end(host)
+                if context is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+                return context
+            del self._entries[host]
+
+        generation = self._generation
+        context, _ = await self._flights.do(
+            f"{generation}:{host}", lambda: self._lookup(host, generation)
+        )
+        return context
+
+    async def _lookup(self, host: str, generation: int) -> Optional[DomainContext]:
+        self.lookups += 1
+        context = await self.lookup(host)
+        if generation != self._generation:
+            return context
+        ttl = self.ttl if context is not None else self.negative_ttl
+        self._entries[host] = (context, time.monotonic() + ttl)
+        self._entries.move_to_end(host)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return context
+
+    def invalidate(self, hosts: Optional[Iterable[str]] = None) -> int:
+        """Forget cached lookups for ``hosts`` (all of them when None)"""
+        self._generation += 1
+        if hosts is None:
+            removed = len(self._entries)
+            self._entries.clear()
+        else:
+            removed = 0
+            for host in hosts:
+                if self._entries.pop(normalize_host(host), None) is not None:
+                    removed += 1
+        self.invalidations += removed
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "registry_domains": len(self.registry),
+            "entries": len(self._entries),
+            "registry_hits": self.registry_hits,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "lookups": self.lookups,
+            "lookup_errors": self.lookup_errors,
+            "invalidations": self.invalidations,
+        }
+
+
+def upstream_lookup(client: UpstreamClient) -> Lookup:
+    """Resolve a host through GET /api/tenants/resolve on Next.js"""
+
+    async def lookup(host: str) -> Optional[DomainContext]:
+        response = await client.fetch(
+            "GET",
+            client.url_for("api/tenants/resolve", urlencode({"host": host})),
+            headers={"accept": "application/json", "accept-encoding": "identity"},
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"tenant resolve returned {response.status_code}")
+        tenant = json.loads(response.content).get("tenant")
+        if not tenant:
+            return None
+        instance = tenant.get("platformInstance") or {}
+        suites = instance.get("suiteKeys") or []
+        return DomainContext(
+            host=host,
+            tenant=tenant["slug"],
+            suite=suites[0] if suites else "",
+            instance=instance.get("id", ""),
+            state=tenant.get("status", "ACTIVE"),
+            source="lookup",
+        )
+
+    return lookup
+
+
+def create_resolver(client: UpstreamClient) -> Optional[TenantResolver]:
+    if not RESOLUTION_ENABLED:
+        return None
+    return TenantResolver(lookup=upstream_lookup(client) if RESOLUTION_LOOKUP else None)
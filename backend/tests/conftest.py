@@ -0,0 +1,56 @@
+"""
+Shared fixtures for the FastAPI proxy tests.
+
+The proxy is exercised in-process: the upstream Next.js server is replaced by
+an ``httpx.MockTransport`` so no network or Next.js build is needed.
+"""
+
+import inspect
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import server, upstream
+
+
+def as_socket(handler):
+    """Hand responses back unread, the way a real upstream connection does.
+
+    ``httpx.Response(content=...)`` pre-reads (and decodes) its body, which
+    a network transport never does; re-wrapping the original byte stream
+    keeps the raw bytes available to ``aiter_raw``.
+    """
+    async def handle(request):
+        response = handler(request)
+        if inspect.isawaitable(response):
+            response = await response
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=response.stream,
+            extensions=response.extensions,
+        )
+    return handle
+
+
+@pytest.fixture
+def make_proxy(monkeypatch):
+    """Build a TestClient whose upstream is served by ``handler``"""
+    clients = []
+
+    def _make(handler, **upstream_kwargs):
+        def create_upstream():
+            return upstream.UpstreamClient(
+                transport=httpx.MockTransport(as_socket(handler)), **upstream_kwargs
+            )
+
+        monkeypatch.setattr(upstream, "create_upstream", create_upstream)
+        client = TestClient(server.app)
+        client.__enter__()
+        clients.append(client)
+        return client
+
+    yield _make
+    for client in clients:
+        client.__exit__(None, None, None)
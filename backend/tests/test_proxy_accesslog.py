@@ -0,0 +1,95 @@
+"""
+PROXY ACCESS LOG: Batched structured access log and the performance profile tests
+
+This test suite verifies:
+1. Requests are only buffered on the request path and written as JSON lines
+2. A full batch wakes the writer before the interval is up
+3. The buffer is bounded and overflow is counted
+4. Proxied requests are logged once answered, streams included
+5. The performance profile picks uvloop/httptools when present and batched logs
+"""
+
+import asyncio
+import io
+import json
+
+import httpx
+
+from backend import accesslog, run
+from backend.accesslog import AccessLog
+
+
+class TestAccessLog:
+    """AccessLog buffering and writing"""
+
+    def test_records_are_written_as_json_lines(self):
+        stream = io.StringIO()
+        log = AccessLog(stream=stream)
+        log.record("GET", "api/health", 200, 0.0123, "t1", "req-1")
+        log.record("POST", "/api/pos/sales", 201, 0.5)
+        assert stream.getvalue() == ""
+
+        assert log.flush() == 2
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert lines[0]["path"] == "/api/health"
+        assert lines[0]["duration_ms"] == 12.3
+        assert lines[0]["tenant"] == "t1"
+        assert lines[1]["status"] == 201
+        assert log.stats()["batches"] == 1
+
+    def test_full_batch_is_written_early(self):
+        async def run_log():
+            stream = io.StringIO()
+            log = AccessLog(stream=stream, interval=60, batch_size=2)
+            await log.start()
+            log.record("GET", "/a", 200, 0.001)
+            log.record("GET", "/b", 200, 0.001)
+            await asyncio.sleep(0.01)
+            written = stream.getvalue().count("\n")
+            await log.aclose()
+            return written
+
+        assert asyncio.run(run_log()) == 2
+
+    def test_buffer_is_bounded(self):
+        log = AccessLog(stream=io.StringIO(), max_buffer=2)
+        for _ in range(3):
+            log.record("GET", "/a", 200, 0.001)
+        assert log.stats()["buffered"] == 2
+        assert log.stats()["dropped"] == 1
+
+
+class TestAccessLogInProxy:
+    """Records from proxy_to_nextjs"""
+
+    def test_proxied_requests_are_logged(self, make_proxy, monkeypatch):
+        stream = io.StringIO()
+        monkeypatch.setattr(accesslog, "create_access_log", lambda: AccessLog(stream=stream))
+        client = make_proxy(lambda request: httpx.Response(200, json={"status": "healthy"}))
+        response = client.get("/api/health", headers={"x-tenant-id": "t1"})
+        client.__exit__(None, None, None)
+
+        (line,) = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert line["method"] == "GET"
+        assert line["path"] == "/api/health"
+        assert line["status"] == 200
+        assert line["tenant"] == "t1"
+        assert line["request_id"] == response.headers["x-request-id"]
+
+
+class TestPerformanceProfile:
+    """backend.run --profile"""
+
+    def test_default_profile_keeps_uvicorn_defaults(self):
+        assert run.profile_options("default", {}) == {}
+
+    def test_performance_profile(self, monkeypatch):
+        monkeypatch.setattr(run, "module_available", lambda name: name == "uvloop")
+        environ = {}
+        options = run.profile_options("performance", environ)
+        assert options["loop"] == "uvloop"
+        assert options["http"] == "h11"
+        assert options["access_log"] is False
+        assert options["backlog"] == run.BACKLOG
+        assert options["timeout_keep_alive"] == run.KEEPALIVE_TIMEOUT
+        assert environ == {"PROXY_ACCESS_LOG": "batched"}
@@ -0,0 +1,166 @@
+"""
+PROXY ADMISSION: Per-tenant concurrency limits and fair queueing tests
+
+This test suite verifies:
+1. Slots are granted up to the global and per-tenant limits
+2. Freed slots go to backlogged tenants in proportion to their weights
+3. Full queues and long waits are shed with Overloaded
+4. Idle tenants are forgotten
+5. Busy tenants get a 429 through the proxy while others are still served
+6. Queue depth is exported on /__metrics and /__proxy/admission
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from backend import admission, server
+from backend.admission import FairScheduler, LaneScheduler, Overloaded
+
+
+class TestFairScheduler:
+    """Slot accounting and scheduling order"""
+
+    def test_tenant_limit_leaves_room_for_others(self):
+        async def run():
+            scheduler = FairScheduler(concurrency=3, tenant_concurrency=2, max_wait=0.05)
+            first = [await scheduler.acquire("big") for _ in range(2)]
+            with pytest.raises(Overloaded) as info:
+                await scheduler.acquire("big")
+            small = await scheduler.acquire("small")
+            assert info.value.reason == admission.QUEUE_TIMEOUT
+            assert scheduler.in_flight == 3
+            for slot in first + [small]:
+                slot.release()
+            return scheduler
+
+        scheduler = asyncio.run(run())
+        assert scheduler.in_flight == 0
+        assert scheduler.stats()["tenants"] == {}
+
+    def test_release_is_idempotent(self):
+        async def run():
+            scheduler = FairScheduler(concurrency=1)
+            slot = await scheduler.acquire("t")
+            slot.release()
+            slot.release()
+            return scheduler.in_flight
+
+        assert asyncio.run(run()) == 0
+
+    def test_weighted_fair_order(self):
+        async def run():
+            scheduler = FairScheduler(concurrency=1, max_wait=5, weights={"pos": 2.0})
+            blocker = await scheduler.acquire("warmup")
+            order = []
+
+            async def request(tenant):
+                slot = await scheduler.acquire(tenant)
+                order.append(tenant)
+                await asyncio.sleep(0)
+                slot.release()
+
+            tasks = [asyncio.ensure_future(request(t)) for t in ["reports"] * 4 + ["pos"] * 4]
+            await asyncio.sleep(0)
+            blocker.release()
+            await asyncio.gather(*tasks)
+            return order
+
+        order = asyncio.run(run())
+        # Weight 2 gets two slots for every one of the default weight
+        assert order[:6].count("pos") == 4
+        assert order[:3].count("pos") == 2
+
+    def test_full_queue_is_shed_immediately(self):
+        async def run():
+            scheduler = FairScheduler(concurrency=1, queue_size=1, max_wait=5)
+            slot = await scheduler.acquire("t")
+            waiting = asyncio.ensure_future(scheduler.acquire("t"))
+            await asyncio.sleep(0)
+            with pytest.raises(Overloaded) as info:
+                await scheduler.acquire("t")
+            slot.release()
+            (await waiting).release()
+            return info.value, scheduler.stats()
+
+        error, stats = asyncio.run(run())
+        assert error.reason == admission.QUEUE_FULL
+        assert error.retry_after >= 1
+        assert stats["rejected"][admission.QUEUE_FULL] == 1
+        assert stats["in_flight"] == 0
+
+    def test_cancelled_waiter_gives_up_its_place(self):
+        async def run():
+            scheduler = FairScheduler(concurrency=1, max_wait=5)
+            slot = await scheduler.acquire("a")
+            waiting = asyncio.ensure_future(scheduler.acquire("b"))
+            await asyncio.sleep(0)
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+            slot.release()
+            return scheduler.stats()
+
+        stats = asyncio.run(run())
+        assert stats["queued"] == 0
+        assert stats["in_flight"] == 0
+
+
+class TestAdmissionInProxy:
+    """429s and metrics through proxy_to_nextjs"""
+
+    @pytest.fixture
+    def busy_proxy(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(
+            admission, "create_scheduler",
+            lambda: LaneScheduler({
+                "default": FairScheduler(concurrency=10, tenant_concurrency=1, queue_size=5, max_wait=0.05),
+            }, routes={}),
+        )
+        release = asyncio.Event()
+
+        async def handler(request):
+            if request.url.path == "/api/reports/export":
+                await release.wait()
+            return httpx.Response(200, json={"ok": True})
+
+        return make_proxy(handler), release
+
+    def test_busy_tenant_is_shed_other_tenants_are_served(self, busy_proxy):
+        client, release = busy_proxy
+        portal = client.portal
+
+        async def hold_then_probe():
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=server.app), base_url="http://testserver"
+            ) as http:
+                held = asyncio.ensure_future(
+                    http.get("/api/reports/export", headers={"x-tenant-id": "big"})
+                )
+                await asyncio.sleep(0.02)
+                shed = await http.get("/api/svm/products", headers={"x-tenant-id": "big"})
+                served = await http.get("/api/svm/products", headers={"x-tenant-id": "small"})
+                depth = (await http.get("/__proxy/admission")).json()["lanes"]["default"]
+                release.set()
+                return shed, served, depth, await held
+
+        shed, served, depth, held = portal.call(hold_then_probe)
+        assert shed.status_code == 429
+        assert shed.json()["success"] is False
+        assert int(shed.headers["retry-after"]) >= 1
+        assert served.status_code == 200
+        assert held.status_code == 200
+        assert depth["rejected"][admission.QUEUE_TIMEOUT] == 1
+        assert depth["tenants"]["big"]["in_flight"] == 1
+
+    def test_queue_depth_is_exported(self, busy_proxy):
+        client, _ = busy_proxy
+        client.get("/api/health", headers={"x-tenant-id": "t1"})
+        text = client.get("/__metrics").text
+        assert "# TYPE proxy_admission_queue_depth gauge" in text
+        assert 'proxy_admission_in_flight{lane="default"} 0' in text
+        assert client.get("/__proxy/admission").json()["lanes"]["default"]["admitted"] == 1
+
+    def test_disabled_by_default(self, make_proxy):
+        client = make_proxy(lambda request: httpx.Response(200, json={}))
+        assert client.get("/__proxy/admission").json() == {"enabled": False}
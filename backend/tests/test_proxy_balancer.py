@@ -0,0 +1,202 @@
+"""
+PROXY LOAD BALANCER: Multiple Next.js upstreams tests
+
+This test suite verifies:
+1. Requests go to the node with the fewest outstanding requests
+2. Idempotent requests are retried on another node after errors and 502/503/504
+3. Non-idempotent requests are not retried after the request was sent
+4. Nodes are ejected after consecutive failures and skipped while ejected
+5. Active health checks mark nodes down and bring them back, whatever a
+   probe raises
+6. The proxy serves through the balancer and reports per-node stats
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from backend import balancer, upstream
+from backend.balancer import LoadBalancer
+
+from conftest import as_socket
+
+
+def node(name, handler=None):
+    def default(request):
+        return httpx.Response(200, json={"node": name})
+    return upstream.UpstreamClient(
+        base_url=f"http://{name}", transport=httpx.MockTransport(as_socket(handler or default))
+    )
+
+
+def refused(request):
+    raise httpx.ConnectError("refused", request=request)
+
+
+def unavailable(request):
+    return httpx.Response(503, json={"error": "down"})
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestNodeSelection:
+    """least-outstanding and power-of-two choices"""
+
+    def test_least_outstanding_wins(self):
+        lb = LoadBalancer([node("a"), node("b"), node("c")], strategy="least")
+        lb.nodes[0].client.in_flight = 4
+        lb.nodes[1].client.in_flight = 1
+        lb.nodes[2].client.in_flight = 2
+        assert lb.pick() is lb.nodes[1]
+
+    def test_p2c_never_picks_the_busiest_of_two(self):
+        lb = LoadBalancer([node("a"), node("b")], strategy="p2c")
+        lb.nodes[0].client.in_flight = 3
+        assert all(lb.pick() is lb.nodes[1] for _ in range(20))
+
+    def test_unavailable_nodes_are_skipped(self):
+        lb = LoadBalancer([node("a"), node("b")], strategy="least")
+        lb.nodes[1].client.in_flight = 5
+        lb.nodes[0].healthy = False
+        assert lb.pick() is lb.nodes[1]
+
+    def test_all_down_still_picks_a_node(self):
+        lb = LoadBalancer([node("a"), node("b")])
+        for n in lb.nodes:
+            n.healthy = False
+        assert lb.pick() in lb.nodes
+
+    def test_unknown_strategy_is_rejected(self):
+        with pytest.raises(ValueError):
+            LoadBalancer([node("a")], strategy="random")
+
+
+class TestRetries:
+    """Failed attempts move to another node when that is safe"""
+
+    def test_get_is_retried_after_connect_error(self):
+        lb = LoadBalancer([node("a", refused), node("b")], strategy="least")
+        response = run(lb.fetch("GET", "/api/health"))
+        assert response.status_code == 200
+        assert lb.retries_total == 1
+        assert lb.nodes[0].consecutive_failures == 1
+
+    def test_get_is_retried_after_503(self):
+        lb = LoadBalancer([node("a", unavailable), node("b")], strategy="least")
+        response = run(lb.fetch("GET", "/api/health"))
+        assert response.status_code == 200
+
+    def test_put_is_retried_only_on_connect_errors(self):
+        lb = LoadBalancer([node("a", unavailable), node("b")], strategy="least")
+        assert run(lb.fetch("PUT", "/api/x", content=b"{}")).status_code == 503
+        lb = LoadBalancer([node("a", refused), node("b")], strategy="least")
+        assert run(lb.fetch("PUT", "/api/x", content=b"{}")).status_code == 200
+
+    def test_post_is_never_retried(self):
+        def timeout(request):
+            raise httpx.ReadTimeout("slow", request=request)
+
+        lb = LoadBalancer([node("a", timeout), node("b")], strategy="least")
+        with pytest.raises(httpx.ReadTimeout):
+            run(lb.fetch("POST", "/api/x", content=b"{}"))
+        assert lb.retries_total == 0
+
+    def test_streamed_bodies_are_not_retried(self):
+        async def body():
+            yield b"{}"
+
+        lb = LoadBalancer([node("a", refused), node("b")], strategy="least")
+        with pytest.raises(httpx.ConnectError):
+            run(lb.fetch("GET", "/api/x", content=body()))
+
+
+class TestPassiveEjection:
+    """Consecutive failures take a node out of rotation"""
+
+    def test_node_is_ejected_after_consecutive_failures(self, monkeypatch):
+        monkeypatch.setattr(balancer, "EJECT_FAILURES", 2)
+        lb = LoadBalancer([node("a", unavailable), node("b")], strategy="least", retries=0)
+        lb.nodes[1].client.in_flight = 10
+        run(lb.fetch("GET", "/"))
+        run(lb.fetch("GET", "/"))
+        assert lb.nodes[0].ejections == 1
+        assert lb.pick() is lb.nodes[1]
+
+    def test_success_resets_the_failure_count(self):
+        lb = LoadBalancer([node("a")])
+        lb.nodes[0].consecutive_failures = 2
+        run(lb.fetch("GET", "/"))
+        assert lb.nodes[0].consecutive_failures == 0
+
+
+class TestHealthChecks:
+    """Active probes of PROXY_HEALTH_PATH"""
+
+    def test_node_goes_down_and_comes_back(self, monkeypatch):
+        monkeypatch.setattr(balancer, "HEALTH_FALL", 2)
+        monkeypatch.setattr(balancer, "HEALTH_RISE", 2)
+        state = {"up": False, "paths": []}
+
+        def handler(request):
+            state["paths"].append(request.url.path)
+            return httpx.Response(200 if state["up"] else 500)
+
+        lb = LoadBalancer([node("a", handler)])
+        target = lb.nodes[0]
+
+        async def probes(count):
+            for _ in range(count):
+                await lb.probe(target)
+
+        run(probes(2))
+        assert target.healthy is False
+        assert state["paths"][0] == balancer.HEALTH_PATH
+        state["up"] = True
+        run(probes(1))
+        assert target.healthy is False
+        run(probes(1))
+        assert target.healthy is True
+
+    def test_unexpected_probe_errors_count_as_failures(self, monkeypatch):
+        monkeypatch.setattr(balancer, "HEALTH_FALL", 1)
+
+        def broken(request):
+            raise RuntimeError("bad transport")
+
+        lb = LoadBalancer([node("a", broken), node("b")])
+
+        async def probe_all():
+            await asyncio.gather(*(lb.probe(n) for n in lb.nodes))
+
+        run(probe_all())
+        assert [n.healthy for n in lb.nodes] == [False, True]
+
+
+class TestProxyIntegration:
+    """The proxy uses the balancer like a single upstream"""
+
+    def test_requests_and_pool_stats(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(balancer, "HEALTH_INTERVAL", 0)
+        lb = LoadBalancer([node("a", refused), node("b")], strategy="least")
+        monkeypatch.setattr(balancer, "create_upstream", lambda: lb)
+        client = make_proxy(lambda request: httpx.Response(200))
+
+        response = client.get("/api/health")
+        assert response.status_code == 200
+        assert response.json() == {"node": "b"}
+
+        stats = client.get("/__proxy/pool").json()
+        assert stats["strategy"] == "least"
+        assert stats["retries_total"] == 1
+        assert [n["consecutive_failures"] for n in stats["nodes"]] == [1, 0]
+
+    def test_single_url_keeps_a_plain_client(self, monkeypatch):
+        monkeypatch.setattr(balancer, "NEXTJS_URLS", ["http://a"])
+        single = balancer.create_upstream()
+        assert isinstance(single, upstream.UpstreamClient)
+        assert str(single.base_url).startswith("http://a")
+        monkeypatch.setattr(balancer, "NEXTJS_URLS", ["http://a", "http://b"])
+        assert isinstance(balancer.create_upstream(), LoadBalancer)
@@ -0,0 +1,225 @@
+"""
+PROXY RESPONSE CACHE: Tenant-aware TTL + LRU tests
+
+This test suite verifies:
+1. Cache keys normalise the query and separate tenants, hosts and Vary headers
+2. Only configured GET routes are cacheable: exact paths, or the longest
+   opted-in prefix
+3. Only shareable 200 responses are stored
+4. The LRU stays within its byte budget
+5. Fresh, stale and expired lookups
+6. Repeated proxied reads are served without reaching Next.js
+7. Stale entries are served while one background request revalidates them
+"""
+
+import time
+
+import httpx
+import pytest
+
+from backend import cache, server, tenancy
+from backend.upstream import UpstreamResponse
+
+ROUTES = {"/api/svm/catalog/*": 30.0, "/api/svm/catalog/featured": 5.0, "/api/capabilities": 300.0}
+
+
+def ok(body: bytes = b'{"items": []}', **headers) -> UpstreamResponse:
+    return UpstreamResponse(200, httpx.Headers({"content-type": "application/json", **headers}), body)
+
+
+class TestCacheKeys:
+    """Key construction"""
+
+    def test_query_order_does_not_matter(self):
+        store = cache.ResponseCache(routes=ROUTES)
+        a = store.key_for("GET", "api/svm/catalog", "b=2&a=1", {})
+        b = store.key_for("GET", "api/svm/catalog", "a=1&b=2", {})
+        assert a == b
+
+    def test_tenants_are_isolated(self):
+        store = cache.ResponseCache(routes=ROUTES)
+        a = store.key_for("GET", "api/svm/catalog", "", {"x-tenant-id": "tenant-a"})
+        b = store.key_for("GET", "api/svm/catalog", "", {"x-tenant-id": "tenant-b"})
+        assert a != b
+
+    def test_hosts_are_isolated(self):
+        store = cache.ResponseCache(routes=ROUTES)
+        a = store.key_for("GET", "api/svm/catalog", "", {"host": "shop-a.example.com"})
+        b = store.key_for("GET", "api/svm/catalog", "", {"host": "shop-b.example.com"})
+        assert a != b
+        assert a == store.key_for("GET", "api/svm/catalog", "", {"host": "Shop-A.example.com:443"})
+
+    def test_vary_headers_are_part_of_the_key(self):
+        store = cache.ResponseCache(routes=ROUTES, vary=["accept-language"])
+        assert "accept-encoding" in store.vary
+        a = store.key_for("GET", "api/capabilities", "", {"accept-encoding": "gzip"})
+        b = store.key_for("GET", "api/capabilities", "", {"accept-encoding": "br"})
+        c = store.key_for("GET", "api/capabilities", "", {"accept-encoding": "br", "accept-language": "yo"})
+        assert len({a, b, c}) == 3
+
+
+class TestCachePolicy:
+    """Which requests and responses are cacheable"""
+
+    def test_route_ttls(self):
+        store = cache.ResponseCache(routes=ROUTES)
+        assert store.ttl_for("GET", "api/svm/catalog") == 30.0
+        assert store.ttl_for("GET", "api/svm/catalog/123") == 30.0
+        assert store.ttl_for("GET", "api/svm/catalog/featured") == 5.0
+        assert store.ttl_for("GET", "api/svm/catalogue") is None
+        assert store.ttl_for("POST", "api/svm/catalog") is None
+        assert store.ttl_for("GET", "api/svm/orders") is None
+        assert store.ttl_for("GET", "api/capabilities") == 300.0
+        assert store.ttl_for("GET", "api/capabilities/tenant") is None
+
+    def test_parse_routes(self):
+        assert cache.parse_routes(["/api/a=10", "/api/b/=2.5", "/api/c/*=5"]) == {
+            "/api/a": 10.0, "/api/b": 2.5, "/api/c/*": 5.0,
+        }
+
+    def test_default_routes_do_not_cover_session_routes(self):
+        store = cache.ResponseCache()
+        assert store.ttl_for("GET", "api/capabilities") == 300.0
+        assert store.ttl_for("GET", "api/capabilities/tenant") is None
+        assert store.ttl_for("GET", "api/svm/products/prod_1") == 30.0
+
+    @pytest.mark.parametrize("response", [
+        UpstreamResponse(404, httpx.Headers(), b"{}"),
+        ok(**{"set-cookie": "session=1"}),
+        ok(**{"cache-control": "private, max-age=60"}),
+        ok(**{"cache-control": "no-store"}),
+        ok(**{"vary": "Cookie"}),
+        ok(**{"vary": "*"}),
+    ])
+    def test_unshareable_responses_are_not_stored(self, response):
+        store = cache.ResponseCache(routes=ROUTES)
+        assert store.store("key", response, 30.0) is False
+        assert len(store) == 0
+
+    def test_vary_on_accept_encoding_is_storable(self):
+        store = cache.ResponseCache(routes=ROUTES)
+        assert store.store("key", ok(vary="Accept-Encoding"), 30.0) is True
+
+
+class TestCacheStorage:
+    """TTL, stale window and LRU byte budget"""
+
+    def test_fresh_stale_and_expired(self):
+        store = cache.ResponseCache(routes=ROUTES, stale_seconds=10.0)
+        store.store("key", ok(), 30.0, now=100.0)
+        assert store.lookup("key", now=120.0)[1] == cache.FRESH
+        assert store.lookup("key", now=135.0)[1] == cache.STALE
+        assert store.lookup("key", now=141.0)[1] == cache.MISS
+        assert len(store) == 0
+        assert (store.hits, store.stale_hits, store.misses) == (1, 1, 1)
+
+    def test_lru_evicts_least_recently_used_within_byte_budget(self):
+        body = b"x" * 1000
+        store = cache.ResponseCache(routes=ROUTES, max_bytes=3 * 1400)
+        for key in ("a", "b", "c"):
+            assert store.store(key, ok(body), 30.0)
+        store.lookup("a")
+        store.store("d", ok(body), 30.0)
+        assert store.bytes <= store.max_bytes
+        assert store.lookup("b")[1] == cache.MISS
+        assert store.lookup("a")[1] == cache.FRESH
+        assert store.evictions == 1
+
+    def test_oversized_responses_are_not_stored(self):
+        store = cache.ResponseCache(routes=ROUTES, max_bytes=512)
+        assert store.store("key", ok(b"x" * 1024), 30.0) is False
+
+
+@pytest.fixture
+def cached_proxy(make_proxy, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_ENABLED", True)
+    monkeypatch.setattr(cache, "CACHE_ROUTES", ["/api/svm/catalog=30"])
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        tenant = request.headers.get("x-tenant-id", "")
+        return httpx.Response(200, json={"tenant": tenant, "call": len(calls)})
+
+    return make_proxy(handler), calls
+
+
+class TestProxyCaching:
+    """End-to-end behaviour through proxy_to_nextjs"""
+
+    def test_repeated_reads_are_served_from_cache(self, cached_proxy):
+        client, calls = cached_proxy
+        headers = {"x-tenant-id": "tenant-a"}
+        first = client.get("/api/svm/catalog?limit=10&page=1", headers=headers)
+        second = client.get("/api/svm/catalog?page=1&limit=10", headers=headers)
+        assert first.headers["x-proxy-cache"] == "MISS"
+        assert second.headers["x-proxy-cache"] == "HIT"
+        assert second.content == first.content
+        assert len(calls) == 1
+        stats = client.get("/__proxy/cache").json()
+        assert stats["enabled"] is True
+        assert stats["hits"] == 1 and stats["misses"] == 1
+
+    def test_tenants_do_not_share_entries(self, cached_proxy):
+        client, calls = cached_proxy
+        a = client.get("/api/svm/catalog", headers={"x-tenant-id": "tenant-a"})
+        b = client.get("/api/svm/catalog", headers={"x-tenant-id": "tenant-b"})
+        assert a.json()["tenant"] == "tenant-a"
+        assert b.json()["tenant"] == "tenant-b"
+        assert len(calls) == 2
+
+    def test_hosts_resolved_to_different_tenants_do_not_share_entries(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(cache, "CACHE_ENABLED", True)
+        monkeypatch.setattr(cache, "CACHE_ROUTES", ["/api/svm/catalog=30"])
+        monkeypatch.setattr(tenancy, "RESOLUTION_ENABLED", True)
+        monkeypatch.setattr(tenancy, "RESOLUTION_LOOKUP", False)
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, json={"tenant": request.headers.get(tenancy.TENANT_HEADER)})
+
+        client = make_proxy(handler)
+        retail = client.get("/api/svm/catalog", headers={"host": "demo-retail.webwaka.com"})
+        school = client.get("/api/svm/catalog", headers={"host": "demo-school.webwaka.com"})
+        assert retail.json()["tenant"] != school.json()["tenant"]
+        assert school.headers["x-proxy-cache"] == "MISS"
+        assert client.get("/api/svm/catalog", headers={"host": "demo-retail.webwaka.com"}).json() == retail.json()
+        assert len(calls) == 2
+
+    def test_uncached_routes_always_reach_upstream(self, cached_proxy):
+        client, calls = cached_proxy
+        client.get("/api/svm/orders")
+        response = client.get("/api/svm/orders")
+        assert "x-proxy-cache" not in response.headers
+        assert len(calls) == 2
+
+    def test_no_cache_request_bypasses_lookup(self, cached_proxy):
+        client, calls = cached_proxy
+        client.get("/api/svm/catalog")
+        response = client.get("/api/svm/catalog", headers={"cache-control": "no-cache"})
+        assert response.headers["x-proxy-cache"] == "MISS"
+        assert len(calls) == 2
+
+    def test_stale_entry_is_served_and_revalidated(self, cached_proxy):
+        client, calls = cached_proxy
+        client.get("/api/svm/catalog")
+        store = server.app.state.cache
+        for entry in store._entries.values():
+            entry.stored_at -= 31.0
+        stale = client.get("/api/svm/catalog")
+        assert stale.headers["x-proxy-cache"] == "STALE"
+        assert stale.json()["call"] == 1
+
+        deadline = time.monotonic() + 2
+        while store.revalidations == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(calls) == 2
+        fresh = client.get("/api/svm/catalog")
+        assert fresh.headers["x-proxy-cache"] == "HIT"
+        assert fresh.json()["call"] == 2
+
+    def test_cache_disabled_by_default(self, make_proxy):
+        client = make_proxy(lambda request: httpx.Response(200, json={}))
+        assert client.get("/__proxy/cache").json() == {"enabled": False}
+        assert "x-proxy-cache" not in client.get("/api/svm/catalog").headers
@@ -0,0 +1,158 @@
+"""
+PROXY REQUEST COALESCING: Single-flight tests
+
+This test suite verifies:
+1. Concurrent identical calls share one execution
+2. Failures are delivered to every waiter and do not stick
+3. A cancelled leader does not cancel the shared fetch
+4. Keys separate users (cookies, authorization) but ignore noise headers
+5. Concurrent identical GETs through the proxy reach Next.js once
+6. Writes are never coalesced
+7. Concurrent misses on a cached route do not share one user's response
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from backend import cache, coalesce, server
+
+
+class TestSingleFlight:
+    """SingleFlight.do semantics"""
+
+    def test_concurrent_calls_share_one_execution(self):
+        flights = coalesce.SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return "catalog"
+
+        async def run():
+            return await asyncio.gather(*[flights.do("key", fetch) for _ in range(10)])
+
+        results = asyncio.run(run())
+        assert len(calls) == 1
+        assert [value for value, _ in results] == ["catalog"] * 10
+        assert sum(1 for _, shared in results if shared) == 9
+        assert flights.stats() == {"in_flight": 0, "leaders": 1, "followers": 9}
+
+    def test_errors_reach_every_waiter_and_are_not_cached(self):
+        flights = coalesce.SingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise httpx.ConnectError("refused")
+
+        async def run():
+            return await asyncio.gather(
+                *[flights.do("key", failing) for _ in range(3)], return_exceptions=True
+            )
+
+        results = asyncio.run(run())
+        assert all(isinstance(result, httpx.ConnectError) for result in results)
+        assert flights.in_flight == 0
+
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        flights = coalesce.SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.05)
+            return "catalog"
+
+        async def run():
+            leader = asyncio.ensure_future(flights.do("key", fetch))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flights.do("key", fetch))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await follower
+
+        assert asyncio.run(run()) == ("catalog", True)
+
+    def test_keys_separate_users_but_ignore_noise(self):
+        flights = coalesce.SingleFlight()
+        base = [("x-tenant-id", "t1"), ("cookie", "session=alice")]
+        a = flights.key_for("GET", "api/svm/cart", "b=2&a=1", base + [("user-agent", "Chrome")])
+        b = flights.key_for("GET", "api/svm/cart", "a=1&b=2", base + [("user-agent", "Safari")])
+        c = flights.key_for("GET", "api/svm/cart", "a=1&b=2", [("x-tenant-id", "t1"), ("cookie", "session=bob")])
+        d = flights.key_for("GET", "api/svm/cart", "a=1&b=2", base + [("authorization", "Bearer x")])
+        assert a == b
+        assert len({a, c, d}) == 3
+
+
+@pytest.fixture
+def coalescing(monkeypatch):
+    monkeypatch.setattr(coalesce, "COALESCE_ENABLED", True)
+
+
+async def fire(method, path, count, **kwargs):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        return await asyncio.gather(*[client.request(method, path, **kwargs) for _ in range(count)])
+
+
+class TestProxyCoalescing:
+    """Coalescing through proxy_to_nextjs"""
+
+    def test_identical_gets_reach_upstream_once(self, make_proxy, coalescing):
+        calls = []
+
+        async def handler(request):
+            calls.append(request)
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={"products": ["jollof", "suya"]})
+
+        client = make_proxy(handler)
+        responses = asyncio.run(fire("GET", "/api/svm/products?tenantId=t1", 20))
+        assert all(r.status_code == 200 for r in responses)
+        assert all(r.json() == {"products": ["jollof", "suya"]} for r in responses)
+        assert len(calls) == 1
+        stats = client.get("/__proxy/coalesce").json()
+        assert stats["leaders"] == 1 and stats["followers"] == 19
+
+    def test_writes_are_not_coalesced(self, make_proxy, coalescing):
+        calls = []
+
+        async def handler(request):
+            calls.append(request)
+            await asyncio.sleep(0.02)
+            return httpx.Response(201, json={"ok": True})
+
+        make_proxy(handler)
+        asyncio.run(fire("POST", "/api/svm/orders", 5, json={"sku": "A"}))
+        assert len(calls) == 5
+
+    def test_cached_route_misses_keep_users_apart(self, make_proxy, coalescing, monkeypatch):
+        monkeypatch.setattr(cache, "CACHE_ENABLED", True)
+        monkeypatch.setattr(cache, "CACHE_ROUTES", ["/api/svm/catalog=30"])
+
+        async def handler(request):
+            await asyncio.sleep(0.05)
+            user = request.headers["cookie"].split("=", 1)[1]
+            return httpx.Response(
+                200,
+                json={"user": user},
+                headers={"cache-control": "private", "set-cookie": f"seen={user}"},
+            )
+
+        make_proxy(handler)
+
+        async def both():
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                return await asyncio.gather(*[
+                    client.get("/api/svm/catalog", headers={"cookie": f"session={user}"})
+                    for user in ("alice", "bob")
+                ])
+
+        alice, bob = asyncio.run(both())
+        assert alice.json() == {"user": "alice"} and alice.headers["set-cookie"] == "seen=alice"
+        assert bob.json() == {"user": "bob"} and bob.headers["set-cookie"] == "seen=bob"
+
+    def test_disabled_by_default(self, make_proxy):
+        client = make_proxy(lambda request: httpx.Response(200, json={}))
+        assert client.get("/__proxy/coalesce").json() == {"enabled": False}
@@ -0,0 +1,180 @@
+"""
+PROXY COMPRESSION: Accept-Encoding negotiation tests
+
+This test suite verifies:
+1. Accept-Encoding parsing honours q-values, exclusions and "*"
+2. Only large enough text/JSON identity bodies are compressed, and large
+   ones off the event loop
+3. Proxied responses are gzip compressed when the client accepts it
+4. Upstream-compressed bodies are relayed untouched
+5. Next.js is asked for identity bodies
+6. Cached responses carry precompressed variants and one entry serves all clients
+7. Each coding gets its own strong ETag
+"""
+
+import asyncio
+import gzip
+import json
+import threading
+
+import httpx
+import pytest
+
+from backend import cache, compression, server
+from backend.upstream import UpstreamResponse
+
+LARGE = json.dumps({"products": [{"sku": f"SKU-{i}", "name": "Ankara fabric"} for i in range(200)]}).encode()
+
+
+def json_response(body: bytes = LARGE, **headers) -> UpstreamResponse:
+    return UpstreamResponse(200, httpx.Headers({"content-type": "application/json", **headers}), body)
+
+
+class TestNegotiation:
+    """negotiate() picks the best accepted coding"""
+
+    @pytest.mark.parametrize("header,expected", [
+        ("gzip, deflate", "gzip"),
+        ("gzip;q=0, deflate", None),
+        ("*", compression.available_encodings()[0]),
+        ("identity", None),
+        ("", None),
+        (None, None),
+        ("GZIP;q=0.5", "gzip"),
+    ])
+    def test_negotiate(self, header, expected):
+        assert compression.negotiate(header) == expected
+
+    def test_parse_accept_encoding(self):
+        assert compression.parse_accept_encoding("br;q=1.0, gzip;q=0.8, *;q=0") == {
+            "br": 1.0, "gzip": 0.8, "*": 0.0,
+        }
+
+    def test_preference_order_breaks_ties(self, monkeypatch):
+        monkeypatch.setitem(compression.COMPRESSORS, "br", lambda body: body)
+        assert compression.negotiate("gzip, br") == "br"
+
+
+class TestCompressibility:
+    """is_compressible() rules"""
+
+    def test_large_json_is_compressible(self):
+        assert compression.is_compressible(json_response())
+
+    @pytest.mark.parametrize("response", [
+        json_response(b"{}"),
+        json_response(**{"content-encoding": "gzip"}),
+        json_response(**{"cache-control": "no-transform"}),
+        UpstreamResponse(200, httpx.Headers({"content-type": "image/png"}), LARGE),
+    ])
+    def test_not_compressible(self, response):
+        assert not compression.is_compressible(response)
+
+    def test_variants_are_computed_once(self):
+        response = json_response()
+        first = asyncio.run(compression.compressed(response, "gzip"))
+        assert asyncio.run(compression.compressed(response, "gzip")) is first
+        assert gzip.decompress(first) == LARGE
+
+    def test_precompress_fills_every_available_encoding(self):
+        response = asyncio.run(compression.precompress(json_response()))
+        assert sorted(response.variants) == sorted(compression.available_encodings())
+
+    def test_large_bodies_are_compressed_in_the_threadpool(self, monkeypatch):
+        threads = []
+
+        def compressor(body):
+            threads.append(threading.current_thread())
+            return body
+
+        monkeypatch.setitem(compression.COMPRESSORS, "gzip", compressor)
+        monkeypatch.setattr(compression, "COMPRESSION_THREAD_SIZE", len(LARGE))
+        asyncio.run(compression.compress("gzip", LARGE[:-1]))
+        asyncio.run(compression.compress("gzip", LARGE))
+        assert threads[0] is threading.main_thread()
+        assert threads[1] is not threading.main_thread()
+
+
+class TestProxyCompression:
+    """Compression through proxy_to_nextjs"""
+
+    def test_json_is_gzipped_for_accepting_clients(self, make_proxy):
+        seen = []
+
+        def handler(request):
+            seen.append(request.headers.get("accept-encoding"))
+            return httpx.Response(200, content=LARGE, headers={"content-type": "application/json"})
+
+        client = make_proxy(handler)
+        response = client.get("/api/svm/products", headers={"accept-encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.json() == json.loads(LARGE)
+        assert seen == ["identity"]
+
+    def test_identity_clients_get_plain_body(self, make_proxy):
+        client = make_proxy(lambda request: httpx.Response(200, content=LARGE, headers={"content-type": "application/json"}))
+        response = client.get("/api/svm/products", headers={"accept-encoding": "identity"})
+        assert "content-encoding" not in response.headers
+        assert response.content == LARGE
+
+    def test_upstream_compressed_body_is_untouched(self, make_proxy):
+        body = gzip.compress(LARGE)
+
+        def handler(request):
+            return httpx.Response(200, content=body, headers={
+                "content-type": "application/json", "content-encoding": "gzip",
+            })
+
+        client = make_proxy(handler)
+        with client.stream("GET", "/api/svm/products", headers={"accept-encoding": "gzip"}) as response:
+            raw = b"".join(response.iter_raw())
+        assert raw == body
+
+    def test_each_coding_has_its_own_etag(self, make_proxy):
+        client = make_proxy(lambda request: httpx.Response(200, content=LARGE, headers={"content-type": "application/json"}))
+        plain = client.get("/api/svm/products", headers={"accept-encoding": "identity"}).headers["etag"]
+        gzipped = client.get("/api/svm/products", headers={"accept-encoding": "gzip"}).headers["etag"]
+        assert plain != gzipped
+        assert gzipped.endswith('-gzip"')
+        again = client.get("/api/svm/products", headers={"accept-encoding": "gzip", "if-none-match": gzipped})
+        assert again.status_code == 304
+
+    def test_disabled_forwards_client_encoding(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(compression, "COMPRESSION_ENABLED", False)
+        seen = []
+
+        def handler(request):
+            seen.append(request.headers.get("accept-encoding"))
+            return httpx.Response(200, content=LARGE, headers={"content-type": "application/json"})
+
+        client = make_proxy(handler)
+        response = client.get("/api/svm/products", headers={"accept-encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+        assert seen == ["gzip"]
+
+
+class TestCompressionWithCache:
+    """Cached entries hold precompressed variants"""
+
+    def test_one_entry_serves_every_encoding(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(cache, "CACHE_ENABLED", True)
+        monkeypatch.setattr(cache, "CACHE_ROUTES", ["/api/svm/catalog=30"])
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, content=LARGE, headers={"content-type": "application/json"})
+
+        client = make_proxy(handler)
+        miss = client.get("/api/svm/catalog", headers={"accept-encoding": "gzip"})
+        hit = client.get("/api/svm/catalog", headers={"accept-encoding": "identity"})
+        assert miss.headers["content-encoding"] == "gzip"
+        assert hit.headers["x-proxy-cache"] == "HIT"
+        assert hit.content == LARGE
+        assert len(calls) == 1
+
+        store = server.app.state.cache
+        (entry,) = store._entries.values()
+        assert "gzip" in entry.response.variants
+        assert entry.size > len(LARGE) + len(entry.response.variants["gzip"])
@@ -0,0 +1,133 @@
+"""
+PROXY ETAGS: Conditional GET tests
+
+This test suite verifies:
+1. Strong ETags are generated from the body bytes
+2. If-None-Match is matched with weak comparison, lists and "*"
+3. Matching conditional GETs get an empty 304
+4. Personalised and non-200 responses get no ETag
+5. Upstream ETags are kept, and cached responses reuse their ETag
+6. If-None-Match is not forwarded upstream, except on the streaming path
+7. HEAD gets the GET's ETag and length, and 304s, without a body
+"""
+
+import httpx
+import pytest
+
+from backend import cache, etag, server
+
+
+class TestEtagHelpers:
+    """compute_etag / if_none_match"""
+
+    def test_etag_is_strong_and_content_based(self):
+        tag = etag.compute_etag(b'{"items": []}')
+        assert tag.startswith('"') and tag.endswith('"')
+        assert tag == etag.compute_etag(b'{"items": []}')
+        assert tag != etag.compute_etag(b'{"items": [1]}')
+
+    @pytest.mark.parametrize("header,expected", [
+        ('"abc"', True),
+        ('W/"abc"', True),
+        ('"xyz", "abc"', True),
+        ("*", True),
+        ('"xyz"', False),
+        ("", False),
+        (None, False),
+    ])
+    def test_if_none_match(self, header, expected):
+        assert etag.if_none_match(header, '"abc"') is expected
+
+
+def catalog_handler(calls):
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"products": ["garri", "ofada"]})
+    return handler
+
+
+class TestConditionalGet:
+    """ETag and 304 handling through proxy_to_nextjs"""
+
+    def test_etag_is_added_and_304_returned(self, make_proxy):
+        calls = []
+        client = make_proxy(catalog_handler(calls))
+        first = client.get("/api/svm/products")
+        tag = first.headers["etag"]
+        second = client.get("/api/svm/products", headers={"if-none-match": tag})
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["etag"] == tag
+        assert "if-none-match" not in calls[1].headers
+
+    def test_head_is_answered_from_a_get(self, make_proxy):
+        calls = []
+        client = make_proxy(catalog_handler(calls))
+        get = client.get("/api/svm/products")
+        head = client.head("/api/svm/products")
+        assert head.status_code == 200
+        assert head.content == b""
+        assert head.headers["etag"] == get.headers["etag"]
+        assert head.headers["content-length"] == str(len(get.content))
+        assert calls[1].method == "GET"
+        assert client.head("/api/svm/products", headers={"if-none-match": get.headers["etag"]}).status_code == 304
+
+    def test_changed_body_returns_200(self, make_proxy):
+        calls = []
+        client = make_proxy(catalog_handler(calls))
+        response = client.get("/api/svm/products", headers={"if-none-match": '"stale"'})
+        assert response.status_code == 200
+        assert response.json() == {"products": ["garri", "ofada"]}
+
+    def test_upstream_etag_is_kept(self, make_proxy):
+        client = make_proxy(lambda request: httpx.Response(200, text="page", headers={"etag": 'W/"next-1"'}))
+        response = client.get("/dashboard")
+        assert response.headers["etag"] == 'W/"next-1"'
+        assert client.get("/dashboard", headers={"if-none-match": 'W/"next-1"'}).status_code == 304
+
+    @pytest.mark.parametrize("response", [
+        httpx.Response(404, json={"error": "not found"}),
+        httpx.Response(200, json={}, headers={"set-cookie": "session=1"}),
+        httpx.Response(200, json={}, headers={"cache-control": "no-store"}),
+    ])
+    def test_personalised_or_failed_responses_have_no_etag(self, make_proxy, response):
+        client = make_proxy(lambda request: response)
+        assert "etag" not in client.get("/api/auth/session").headers
+
+    def test_writes_have_no_etag(self, make_proxy):
+        client = make_proxy(lambda request: httpx.Response(200, json={"ok": True}))
+        assert "etag" not in client.post("/api/svm/orders", json={}).headers
+
+    def test_streamed_responses_leave_if_none_match_to_upstream(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(server, "STREAMING", True)
+
+        def handler(request):
+            if request.headers.get("if-none-match") == 'W/"next-1"':
+                return httpx.Response(304, headers={"etag": 'W/"next-1"'})
+            return httpx.Response(200, text="page", headers={"etag": 'W/"next-1"'})
+
+        client = make_proxy(handler)
+        assert client.get("/dashboard").status_code == 200
+        response = client.get("/dashboard", headers={"if-none-match": 'W/"next-1"'})
+        assert response.status_code == 304
+        assert response.content == b""
+
+    def test_disabled(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(etag, "ETAG_ENABLED", False)
+        client = make_proxy(lambda request: httpx.Response(200, json={}))
+        assert "etag" not in client.get("/api/svm/products").headers
+
+
+class TestEtagWithCache:
+    """Cache hits carry the ETag computed on the miss"""
+
+    def test_cache_hit_revalidates(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(cache, "CACHE_ENABLED", True)
+        monkeypatch.setattr(cache, "CACHE_ROUTES", ["/api/svm/catalog=30"])
+        calls = []
+        client = make_proxy(catalog_handler(calls))
+        tag = client.get("/api/svm/catalog").headers["etag"]
+        response = client.get("/api/svm/catalog", headers={"if-none-match": tag})
+        assert response.status_code == 304
+        assert response.headers["x-proxy-cache"] == "HIT"
+        assert len(calls) == 1
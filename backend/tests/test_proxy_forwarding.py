@@ -0,0 +1,134 @@
+"""
+PROXY FORWARDING: Multi-value and hop-by-hop header handling tests
+
+This test suite verifies:
+1. Repeated headers are forwarded line by line in both directions
+2. Hop-by-hop headers and those named in Connection are dropped (RFC 7230)
+3. Proxy-owned request headers replace, never repeat, the client's
+4. Every Set-Cookie reaches the client, streamed and redirected responses included
+5. CORS follows PROXY_CORS_ORIGINS and defers to upstream CORS headers
+"""
+
+import httpx
+import pytest
+
+from backend import forwarding, resilience, server
+from backend.forwarding import CorsPolicy
+
+
+class TestFilterHeaders:
+    """forwarding.filter_headers and request_headers"""
+
+    def test_repeated_headers_are_kept_in_order(self):
+        raw = [(b"Set-Cookie", b"a=1"), (b"Vary", b"Accept"), (b"set-cookie", b"b=2")]
+        assert forwarding.filter_headers(raw) == [
+            (b"set-cookie", b"a=1"), (b"vary", b"Accept"), (b"set-cookie", b"b=2"),
+        ]
+
+    def test_hop_by_hop_headers_are_dropped(self):
+        raw = [
+            (b"connection", b"keep-alive, X-Debug"), (b"keep-alive", b"timeout=5"),
+            (b"transfer-encoding", b"chunked"), (b"upgrade", b"h2c"), (b"te", b"trailers"),
+            (b"x-debug", b"1"), (b"content-type", b"text/plain"),
+        ]
+        assert forwarding.filter_headers(raw) == [(b"content-type", b"text/plain")]
+
+    def test_extra_headers_replace_client_ones(self):
+        raw = [(b"x-request-id", b"client"), (b"cookie", b"a=1"), (b"cookie", b"b=2"), (b"host", b"shop")]
+        headers = forwarding.request_headers(
+            raw, forwarding.dropping(b"host", b"x-request-id"), extra=[(b"x-request-id", b"proxy")]
+        )
+        assert headers == [(b"cookie", b"a=1"), (b"cookie", b"b=2"), (b"x-request-id", b"proxy")]
+
+    def test_client_governance_headers_are_replaced(self, make_proxy):
+        calls = []
+        client = make_proxy(lambda request: calls.append(request) or httpx.Response(200))
+        client.get("/api/health", headers={"accept-encoding": "br", "x-request-id": "abc"})
+        assert calls[0].headers.get_list("x-request-id") == ["abc"]
+
+
+class TestCorsPolicy:
+    """PROXY_CORS_*"""
+
+    def test_wildcard_by_default(self):
+        assert dict(CorsPolicy(["*"]).headers_for(b"https://shop.example"))[b"access-control-allow-origin"] == b"*"
+
+    def test_listed_origin_is_echoed(self):
+        policy = CorsPolicy(["https://shop.example"])
+        headers = policy.headers_for(b"https://shop.example")
+        assert (b"access-control-allow-origin", b"https://shop.example") in headers
+        assert (b"vary", b"Origin") in headers
+        assert policy.headers_for(b"https://evil.example") == []
+
+    def test_credentials_never_use_wildcard(self):
+        headers = dict(CorsPolicy(["*"], credentials=True).headers_for(b"https://a.example"))
+        assert headers[b"access-control-allow-origin"] == b"https://a.example"
+        assert headers[b"access-control-allow-credentials"] == b"true"
+
+    def test_upstream_cors_wins(self):
+        headers = [(b"access-control-allow-origin", b"https://app.example")]
+        CorsPolicy(["*"]).apply(headers, None)
+        assert len(headers) == 1
+
+
+class TestForwardingInProxy:
+    """Headers through proxy_to_nextjs"""
+
+    @pytest.fixture
+    def upstream(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(
+                200,
+                headers=[
+                    ("content-type", "application/json"), ("set-cookie", "session=1; HttpOnly"),
+                    ("set-cookie", "theme=dark"), ("link", "</a.css>; rel=preload"),
+                    ("link", "</b.js>; rel=preload"), ("connection", "close"), ("x-nextjs-cache", "HIT"),
+                ],
+                json={"ok": True},
+            )
+        return handler, calls
+
+    def test_repeated_headers_reach_both_sides(self, make_proxy, upstream):
+        handler, calls = upstream
+        client = make_proxy(handler)
+        response = client.get(
+            "/api/svm/orders",
+            headers=[("accept", "application/json"), ("x-trace", "a"), ("x-trace", "b"),
+                     (resilience.DEADLINE_HEADER, "900000")],
+        )
+        assert response.headers.get_list("set-cookie") == ["session=1; HttpOnly", "theme=dark"]
+        assert len(response.headers.get_list("link")) == 2
+        assert response.headers["x-nextjs-cache"] == "HIT"
+        assert "connection" not in response.headers
+
+        sent = calls[0].headers
+        assert sent.get_list("x-trace") == ["a", "b"]
+        assert len(sent.get_list(resilience.DEADLINE_HEADER)) == 1
+        assert int(sent[resilience.DEADLINE_HEADER]) < 900000
+
+    def test_streamed_and_redirected_responses_keep_every_cookie(self, make_proxy, monkeypatch, upstream):
+        handler, _ = upstream
+        monkeypatch.setattr(server, "STREAMING", True)
+        client = make_proxy(handler)
+        streamed = client.get("/api/svm/orders")
+        assert streamed.headers.get_list("set-cookie") == ["session=1; HttpOnly", "theme=dark"]
+
+        client = make_proxy(lambda request: httpx.Response(
+            302, headers=[("location", "/login"), ("set-cookie", "a=1"), ("set-cookie", "b=2")]
+        ))
+        redirect = client.get("/api/auth/logout", follow_redirects=False)
+        assert redirect.status_code == 302
+        assert redirect.headers["location"] == "/login"
+        assert redirect.headers.get_list("set-cookie") == ["a=1", "b=2"]
+
+    def test_cors_origins_are_configurable(self, make_proxy, monkeypatch, upstream):
+        handler, _ = upstream
+        monkeypatch.setattr(forwarding, "create_cors", lambda: CorsPolicy(["https://shop.example"]))
+        client = make_proxy(handler)
+        allowed = client.get("/api/svm/orders", headers={"origin": "https://shop.example"})
+        assert allowed.headers["access-control-allow-origin"] == "https://shop.example"
+        other = client.get("/api/svm/orders", headers={"origin": "https://evil.example"})
+        assert "access-control-allow-origin" not in other.headers
@@ -0,0 +1,222 @@
+"""
+PROXY IDEMPOTENCY: Idempotency-Key enforcement and replay tests
+
+This test suite verifies:
+1. A retried write is answered from the stored response without Next.js
+2. Concurrent duplicates wait for the original and reach Next.js once
+3. Reusing a key for another request is refused with 422, a bad key with 400
+4. Server errors and transient statuses are not stored, so retries go through
+5. Keys are scoped per tenant and per caller credentials (session cookie only)
+6. The store is bounded and a shared tier replays across workers
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from backend import idempotency, server
+from backend.cache import SharedCacheStore
+from backend.idempotency import IdempotencyStore, KeyReused
+from backend.upstream import UpstreamResponse
+
+
+def created(body=b'{"orderId": 1}', status=201):
+    return UpstreamResponse(status, httpx.Headers({"content-type": "application/json"}), body)
+
+
+class TestIdempotencyStore:
+    """IdempotencyStore.do semantics"""
+
+    def test_second_call_is_replayed(self):
+        store = IdempotencyStore(routes=["/api/svm/orders"])
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            return created()
+
+        async def run():
+            first = await store.do("k", "fp", fetch)
+            second = await store.do("k", "fp", fetch)
+            return first, second
+
+        (first, replayed_first), (second, replayed_second) = asyncio.run(run())
+        assert len(calls) == 1
+        assert not replayed_first and replayed_second
+        assert second.content == first.content
+        assert store.stats()["replays"] == 1
+
+    def test_concurrent_duplicates_wait_for_the_original(self):
+        store = IdempotencyStore(routes=["/api/svm/orders"])
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return created()
+
+        async def run():
+            return await asyncio.gather(*[store.do("k", "fp", fetch) for _ in range(5)])
+
+        results = asyncio.run(run())
+        assert len(calls) == 1
+        assert sum(1 for _, replayed in results if replayed) == 4
+        assert store.stats()["joined"] == 4
+
+    def test_key_reused_for_another_request(self):
+        store = IdempotencyStore(routes=["/api/svm/orders"])
+
+        async def run():
+            await store.do("t1\nscope\nk", "fp", lambda: asyncio.sleep(0, created()))
+            await store.do("t1\nscope\nk", "other", lambda: asyncio.sleep(0, created()))
+
+        with pytest.raises(KeyReused) as error:
+            asyncio.run(run())
+        assert error.value.key == "k"
+
+    @pytest.mark.parametrize("status", [500, 503, 429, 409])
+    def test_failures_are_not_stored(self, status):
+        store = IdempotencyStore(routes=["/api/svm/orders"])
+
+        async def run():
+            await store.do("k", "fp", lambda: asyncio.sleep(0, created(status=status)))
+            return await store.do("k", "fp", lambda: asyncio.sleep(0, created()))
+
+        response, replayed = asyncio.run(run())
+        assert response.status_code == 201 and not replayed
+        assert store.stats()["not_stored"] == 1
+
+    def test_store_is_bounded(self):
+        store = IdempotencyStore(routes=["/api"], max_entries=2)
+
+        async def run():
+            for key in ("a", "b", "c"):
+                await store.do(key, "fp", lambda: asyncio.sleep(0, created()))
+
+        asyncio.run(run())
+        assert store.stats()["entries"] == 2
+        assert store.stats()["evictions"] == 1
+
+    def test_entries_expire(self):
+        store = IdempotencyStore(routes=["/api"], ttl=10)
+
+        async def run():
+            await store.do("k", "fp", lambda: asyncio.sleep(0, created()))
+            return await store.do("k", "fp", lambda: asyncio.sleep(0, created()), now=store._entries["k"].expires_at)
+
+        _, replayed = asyncio.run(run())
+        assert not replayed
+
+    def test_shared_tier_replays_on_another_worker(self, tmp_path):
+        first = IdempotencyStore(routes=["/api"], shared=SharedCacheStore(str(tmp_path)))
+        second = IdempotencyStore(routes=["/api"], shared=SharedCacheStore(str(tmp_path)))
+
+        async def run():
+            await first.do("k", "fp", lambda: asyncio.sleep(0, created()))
+            replay = await second.do("k", "fp", lambda: asyncio.sleep(0, created(b"{}")))
+            with pytest.raises(KeyReused):
+                await second.do("k", "other", lambda: asyncio.sleep(0, created()))
+            return replay
+
+        response, replayed = asyncio.run(run())
+        assert replayed
+        assert response.content == b'{"orderId": 1}'
+
+    def test_scope_separates_tenants_and_callers(self):
+        store = IdempotencyStore(routes=["/api"])
+        alice = store.scope_key("k", "t1", {"cookie": "session_token=alice"})
+        bob = store.scope_key("k", "t1", {"cookie": "session_token=bob"})
+        other_tenant = store.scope_key("k", "t2", {"cookie": "session_token=alice"})
+        bearer = store.scope_key("k", "t1", {"authorization": "Bearer alice"})
+        assert len({alice, bob, other_tenant, bearer}) == 4
+        with pytest.raises(idempotency.InvalidKey):
+            store.scope_key("x" * 300, "t1", {})
+
+    def test_scope_ignores_cookies_other_than_the_session(self):
+        store = IdempotencyStore(routes=["/api"])
+        first = store.scope_key("k", "t1", {"cookie": "_ga=GA1.1; session_token=alice"})
+        retry = store.scope_key("k", "t1", {"cookie": "session_token=alice; _ga=GA1.2; theme=dark"})
+        assert first == retry
+
+
+@pytest.fixture
+def idempotent(monkeypatch):
+    monkeypatch.setattr(idempotency, "create_store", lambda: IdempotencyStore(routes=["/api/svm/orders"]))
+
+
+@pytest.fixture
+def orders():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.02)
+        return httpx.Response(201, json={"orderId": len(calls)})
+
+    return handler, calls
+
+
+class TestIdempotencyInProxy:
+    """Idempotency-Key through proxy_to_nextjs"""
+
+    def test_retry_is_replayed(self, make_proxy, idempotent, orders):
+        handler, calls = orders
+        client = make_proxy(handler)
+        headers = {"idempotency-key": "order-1", "x-tenant-id": "t1"}
+        first = client.post("/api/svm/orders", json={"sku": "A"}, headers=headers)
+        retry = client.post("/api/svm/orders", json={"sku": "A"}, headers=headers)
+        assert first.status_code == retry.status_code == 201
+        assert retry.json() == first.json() == {"orderId": 1}
+        assert retry.headers[idempotency.REPLAYED_HEADER] == "true"
+        assert idempotency.REPLAYED_HEADER not in first.headers
+        assert len(calls) == 1
+
+    def test_concurrent_duplicates_reach_upstream_once(self, make_proxy, idempotent, orders):
+        handler, calls = orders
+        make_proxy(handler)
+
+        async def fire():
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                return await asyncio.gather(*[
+                    client.post("/api/svm/orders", json={"sku": "A"}, headers={"idempotency-key": "k"})
+                    for _ in range(5)
+                ])
+
+        responses = asyncio.run(fire())
+        assert [r.json() for r in responses] == [{"orderId": 1}] * 5
+        assert len(calls) == 1
+
+    def test_conflicting_and_invalid_keys(self, make_proxy, idempotent, orders):
+        handler, calls = orders
+        client = make_proxy(handler)
+        client.post("/api/svm/orders", json={"sku": "A"}, headers={"idempotency-key": "k"})
+        conflict = client.post("/api/svm/orders", json={"sku": "B"}, headers={"idempotency-key": "k"})
+        assert conflict.status_code == 422
+        invalid = client.post("/api/svm/orders", json={"sku": "A"}, headers={"idempotency-key": "x" * 300})
+        assert invalid.status_code == 400
+        assert len(calls) == 1
+        assert client.get("/__proxy/idempotency").json()["conflicts"] == 1
+
+    def test_other_callers_and_unkeyed_writes_go_through(self, make_proxy, idempotent, orders):
+        handler, calls = orders
+        client = make_proxy(handler)
+        client.post("/api/svm/orders", json={}, headers={"idempotency-key": "k", "cookie": "session_token=alice"})
+        bob = client.post("/api/svm/orders", json={}, headers={"idempotency-key": "k", "cookie": "session_token=bob"})
+        assert bob.json() == {"orderId": 2}
+        client.post("/api/svm/orders", json={})
+        client.post("/api/svm/orders", json={})
+        client.post("/api/pos/sales", json={}, headers={"idempotency-key": "k"})
+        assert len(calls) == 5
+
+    def test_server_errors_are_retried(self, make_proxy, idempotent):
+        statuses = [503, 201]
+        client = make_proxy(lambda request: httpx.Response(statuses.pop(0), json={}))
+        headers = {"idempotency-key": "k"}
+        assert client.post("/api/svm/orders", json={}, headers=headers).status_code == 503
+        assert client.post("/api/svm/orders", json={}, headers=headers).status_code == 201
+
+    def test_disabled_by_default(self, make_proxy):
+        client = make_proxy(lambda request: httpx.Response(200, json={}))
+        assert client.get("/__proxy/idempotency").json() == {"enabled": False}
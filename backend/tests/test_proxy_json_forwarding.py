@@ -0,0 +1,92 @@
+"""
+PROXY JSON FORWARDING: Zero-reparse tests
+
+This test suite verifies:
+1. JSON bodies are forwarded byte for byte instead of parsed and re-encoded
+2. Upstream content-type and content-encoding are preserved
+3. PROXY_VALIDATE_JSON rejects malformed JSON with a 502
+4. The well-formedness check accepts valid documents of every shape
+"""
+
+import gzip
+
+import httpx
+import pytest
+
+from backend import json_validation, server
+
+
+class TestRawJsonForwarding:
+    """application/json responses are relayed untouched"""
+
+    def test_body_bytes_are_preserved(self, make_proxy):
+        # Key order, spacing and number formatting would all change on a
+        # parse/re-encode round trip
+        raw = b'{"z": 1.50,  "a": [1,2,3], "name": "Ad\\u00e9"}'
+
+        def handler(request):
+            return httpx.Response(
+                200, content=raw, headers={"content-type": "application/json; charset=utf-8"}
+            )
+
+        client = make_proxy(handler)
+        response = client.get("/api/svm/orders")
+        assert response.status_code == 200
+        assert response.content == raw
+        assert response.headers["content-type"] == "application/json; charset=utf-8"
+
+    def test_content_encoding_is_preserved(self, make_proxy):
+        compressed = gzip.compress(b'{"entries": []}')
+
+        def handler(request):
+            return httpx.Response(
+                200,
+                content=compressed,
+                headers={"content-type": "application/json", "content-encoding": "gzip"},
+            )
+
+        client = make_proxy(handler)
+        response = client.get("/api/accounting/ledger")
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.json() == {"entries": []}
+
+    def test_status_code_is_preserved(self, make_proxy):
+        def handler(request):
+            return httpx.Response(401, json={"error": "Tenant ID required"})
+
+        client = make_proxy(handler)
+        response = client.get("/api/church")
+        assert response.status_code == 401
+        assert response.json() == {"error": "Tenant ID required"}
+
+
+class TestJsonValidation:
+    """Optional malformed-JSON guard"""
+
+    def test_malformed_json_is_passed_through_by_default(self, make_proxy):
+        def handler(request):
+            return httpx.Response(200, content=b'{"truncated": ', headers={"content-type": "application/json"})
+
+        client = make_proxy(handler)
+        response = client.get("/api/svm/products")
+        assert response.status_code == 200
+        assert response.content == b'{"truncated": '
+
+    def test_malformed_json_is_rejected_when_enabled(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(server, "VALIDATE_JSON", True)
+
+        def handler(request):
+            return httpx.Response(200, content=b'{"truncated": ', headers={"content-type": "application/json"})
+
+        client = make_proxy(handler)
+        response = client.get("/api/svm/products")
+        assert response.status_code == 502
+        assert "malformed JSON" in response.json()["error"]
+
+    @pytest.mark.parametrize("body", [b"{}", b"[]", b'"text"', b"0", b"null", b'{"a": [1, {"b": null}]}'])
+    def test_valid_documents(self, body):
+        assert json_validation.is_well_formed(body)
+
+    @pytest.mark.parametrize("body", [b"", b"{", b"[1,]", b"{'a': 1}", b"\xff\xfe"])
+    def test_invalid_documents(self, body):
+        assert not json_validation.is_well_formed(body)
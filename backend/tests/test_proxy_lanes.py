@@ -0,0 +1,121 @@
+"""
+PROXY LANES: Priority lanes for checkout over reporting traffic tests
+
+This test suite verifies:
+1. Lanes and their yielded concurrency are parsed in priority order
+2. Checkout, report and other routes land in their own lanes
+3. A saturated report lane never delays checkout requests
+4. Lower lanes shrink while a higher lane is backlogged and recover after
+5. Lane state is reported per lane through the proxy
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from backend import admission
+from backend.admission import FairScheduler, LaneScheduler, Overloaded
+
+
+def lanes(**spec):
+    return {
+        name: FairScheduler(concurrency=c, yielded_concurrency=y, max_wait=0.05)
+        for name, (c, y) in spec.items()
+    }
+
+
+class TestLaneConfig:
+    """PROXY_ADMISSION_LANES and PROXY_ADMISSION_LANE_ROUTES"""
+
+    def test_lanes_keep_priority_order(self):
+        parsed = admission.parse_lanes(["checkout=50", "default=100", "reports=20/2"])
+        assert list(parsed) == ["checkout", "default", "reports"]
+        assert parsed["checkout"] == (50, 50)
+        assert parsed["reports"] == (20, 2)
+
+    def test_default_lane_is_added_when_missing(self):
+        assert admission.DEFAULT_LANE in admission.parse_lanes(["checkout=5"])
+
+    def test_default_routes(self):
+        scheduler = LaneScheduler()
+        assert scheduler.lane_for("api/pos/sales") == "checkout"
+        assert scheduler.lane_for("api/svm/orders/123") == "checkout"
+        assert scheduler.lane_for("api/payments/verify") == "checkout"
+        assert scheduler.lane_for("api/analytics/sales") == "reports"
+        assert scheduler.lane_for("api/accounting/reports/trial-balance") == "reports"
+        assert scheduler.lane_for("api/partner/analytics") == "reports"
+        assert scheduler.lane_for("api/pos/reports/daily") == "reports"
+        assert scheduler.lane_for("api/accounting/journals") == "default"
+        assert scheduler.lane_for("api/partner/settings") == "default"
+        assert scheduler.lane_for("api/svm/products") == "default"
+        assert scheduler.lane_for("api/paymentsx") == "default"
+
+    def test_unknown_lane_is_rejected(self):
+        with pytest.raises(ValueError):
+            LaneScheduler(lanes(default=(1, 1)), routes={"/api/pos": "checkout"})
+
+
+class TestPriority:
+    """Isolation and yielding between lanes"""
+
+    def test_full_report_lane_does_not_block_checkout(self):
+        async def run():
+            scheduler = LaneScheduler(
+                lanes(checkout=(1, 1), default=(1, 1), reports=(1, 1)),
+                routes={"/api/pos": "checkout", "/api/analytics": "reports"},
+            )
+            held = await scheduler.for_path("api/analytics/export").acquire("t")
+            with pytest.raises(Overloaded):
+                await scheduler.for_path("api/analytics/sales").acquire("t")
+            slot = await scheduler.for_path("api/pos/sales").acquire("t")
+            slot.release()
+            held.release()
+            return scheduler.in_flight
+
+        assert asyncio.run(run()) == 0
+
+    def test_lower_lane_yields_while_checkout_is_backlogged(self):
+        async def run():
+            scheduler = LaneScheduler(
+                lanes(checkout=(1, 1), reports=(3, 1), default=(1, 1)), routes={}
+            )
+            checkout, reports = scheduler.lanes["checkout"], scheduler.lanes["reports"]
+            reports.max_wait = checkout.max_wait = 5
+            first = await reports.acquire("t")
+            busy = await checkout.acquire("t")
+            waiting = asyncio.ensure_future(checkout.acquire("t"))
+            await asyncio.sleep(0)
+            assert reports.capacity == 1
+
+            # Over the yielded concurrency, so the report waits
+            report = asyncio.ensure_future(reports.acquire("t"))
+            await asyncio.sleep(0)
+            assert not report.done()
+
+            # Once checkout drains, reports get their full pool back
+            busy.release()
+            (await waiting).release()
+            await asyncio.sleep(0)
+            assert report.done()
+            assert reports.capacity == 3
+            (await report).release()
+            first.release()
+            return scheduler.in_flight
+
+        assert asyncio.run(run()) == 0
+
+
+class TestLanesInProxy:
+    """Lanes through proxy_to_nextjs"""
+
+    def test_stats_are_reported_per_lane(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(admission, "ADMISSION_ENABLED", True)
+        client = make_proxy(lambda request: httpx.Response(200, json={"ok": True}))
+        assert client.post("/api/pos/sales", json={}).status_code == 200
+        assert client.get("/api/analytics/sales").status_code == 200
+        data = client.get("/__proxy/admission").json()
+        assert data["lanes"]["checkout"]["admitted"] == 1
+        assert data["lanes"]["reports"]["admitted"] == 1
+        assert data["lanes"]["default"]["admitted"] == 0
+        assert data["routes"]["/api/payments"] == "checkout"
@@ -0,0 +1,221 @@
+"""
+PROXY LOAD TEST: asyncio load generator tests
+
+This test suite verifies:
+1. The HDR histogram reports percentiles within its precision and merges
+2. Steps fill in per-run values, so every checkout has its own key
+3. Closed and open models drive a real server, the mix follows its weights
+4. The JSON report keeps the keys run-load-tests.js wrote
+5. Latency is also reported corrected for coordinated omission
+6. Unanswered requests are dropped, not forgotten
+"""
+
+import asyncio
+import json
+import os
+import random
+from contextlib import asynccontextmanager
+
+import pytest
+import uvicorn
+
+from backend.benchmarks.mock_upstream import MockRoute, MockUpstream
+from backend.loadtest import __main__ as cli, report
+from backend.loadtest.histogram import Histogram
+from backend.loadtest.runner import EXPECTED_INTERVAL, INTENDED_START, Runner
+from backend.loadtest.scenarios import CREATE_ORDER, OPEN, WORKLOADS, Scenario, Step, Workload, run_values
+
+LEGACY_REPORT = os.path.join(os.path.dirname(__file__), "..", "..", "frontend", "load-tests", "report-1767349526057.json")
+
+
+@asynccontextmanager
+async def serve(app):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="error", lifespan="off"))
+    task = asyncio.ensure_future(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await task
+
+
+class TestHistogram:
+    """loadtest.histogram.Histogram"""
+
+    def test_percentiles_within_precision(self):
+        rng = random.Random(1)
+        values = sorted(int(rng.lognormvariate(9, 1.2)) + 1 for _ in range(20000))
+        histogram = Histogram()
+        for value in values:
+            histogram.record(value)
+        for percent in (50, 90, 99, 99.9):
+            exact = values[int(percent / 100 * len(values)) - 1]
+            assert histogram.percentile(percent) == pytest.approx(exact, rel=2e-3)
+        assert histogram.min == values[0] and histogram.max == values[-1]
+        assert histogram.mean == pytest.approx(sum(values) / len(values))
+
+    def test_add_and_round_trip(self):
+        first, second = Histogram(), Histogram()
+        for value in range(1, 1001):
+            first.record(value)
+            second.record(value * 1000)
+        first.add(second)
+        assert first.total == 2000
+        assert first.percentile(50) == 1000
+        restored = Histogram.from_list(first.to_list())
+        assert restored.total == 2000
+        assert restored.percentile(99) == first.percentile(99)
+
+
+    def test_corrected_recording_fills_in_missed_intervals(self):
+        histogram = Histogram()
+        histogram.record_corrected(1000, 100)
+        assert histogram.total == 10
+        assert histogram.min == 100 and histogram.max == 1000
+
+        stalled = Histogram()
+        for _ in range(99):
+            stalled.record(10)
+        stalled.record(10000)
+        corrected = stalled.corrected(10)
+        assert stalled.percentile(90) == 10
+        assert corrected.percentile(90) > 1000
+
+
+class TestScenarios:
+    """Steps and workloads"""
+
+    def test_values_are_filled_in_per_run(self):
+        values = run_values()
+        path, headers, body = CREATE_ORDER.render(values)
+        assert path == "/api/svm/orders"
+        assert f"Idempotency-Key: {values['key']}\r\n".encode() in headers
+        assert json.loads(body)["customerId"] == values["customer"]
+        assert run_values()["key"] != values["key"]
+
+    def test_legacy_workloads_are_kept(self):
+        assert WORKLOADS["cartRead"].connections == 50
+        assert WORKLOADS["highConcurrency"].duration == 20
+
+
+class TestRunner:
+    """Runner against an in-process server"""
+
+    def test_closed_model_mix(self):
+        mock = MockUpstream({"default": MockRoute(size=256, statuses=[(200, 1)])})
+        workload = Workload(
+            "mix", "Mix",
+            [Scenario("browse", [Step("GET", "/api/svm/products")], 3), Scenario("cart", [Step("POST", "/api/svm/cart", {})], 1)],
+            duration=1, connections=4,
+        )
+
+        async def run():
+            async with serve(mock) as url:
+                return await Runner(url, seed=3).run(workload)
+
+        result = asyncio.run(run())
+        assert result.errors == 0
+        assert result.latency.total == sum(result.statuses.values()) > 50
+        assert 2 < result.scenarios["browse"] / result.scenarios["cart"] < 4.5
+        assert sum(result.bytes_per_second) > 256 * sum(result.requests_per_second)
+
+    def test_open_model_keeps_its_rate(self):
+        mock = MockUpstream({"default": MockRoute(size=10, latency=0.05)})
+        workload = Workload("open", "Open", [Scenario("a", [Step("GET", "/")])], duration=1, connections=50, model=OPEN, rate=40)
+
+        async def run():
+            async with serve(mock) as url:
+                return await Runner(url).run(workload)
+
+        result = asyncio.run(run())
+        # Latency does not slow the arrivals down, unlike a closed loop of few users
+        assert 36 <= result.scenarios["a"] <= 41
+        assert result.latency.percentile(50) >= 50000
+
+    def test_errors_are_counted(self):
+        workload = Workload("down", "Down", [Scenario("a", [Step("GET", "/")])], duration=0.2, connections=1)
+        result = asyncio.run(Runner("http://127.0.0.1:9").run(workload))
+        assert result.errors > 0 and result.latency.total == 0
+        assert result.dropped.total == result.corrected.total == result.errors
+
+
+class TestCoordinatedOmission:
+    """Intended-start timeline"""
+
+    def run(self, workload, latency=0.05, timeout=10.0):
+        async def run():
+            async with serve(MockUpstream({"default": MockRoute(size=10, latency=latency)})) as url:
+                return await Runner(url, timeout=timeout).run(workload)
+
+        return asyncio.run(run())
+
+    def test_saturated_open_model_counts_the_queueing(self):
+        # One connection serves 20/s; the other 20 arrivals per second wait for it
+        workload = Workload("open", "Open", [Scenario("a", [Step("GET", "/")])], duration=1, connections=1, model=OPEN, rate=40)
+        result = self.run(workload)
+        assert result.correction == INTENDED_START
+        assert result.latency.percentile(90) < 100000
+        assert result.corrected.percentile(90) > 2 * result.latency.percentile(90)
+
+    def test_arrivals_left_at_the_end_are_dropped(self):
+        # Half the arrivals are still queued when the run and its grace period end
+        workload = Workload("open", "Open", [Scenario("a", [Step("GET", "/")])], duration=1, connections=1, model=OPEN, rate=40)
+        result = self.run(workload, timeout=0.2)
+        assert result.errors == 0
+        assert result.dropped.total >= 10
+        assert result.latency.total + result.dropped.total == 40
+        assert result.corrected.total == result.latency.total + result.dropped.total
+        assert result.dropped.percentile(50) > 200000
+
+    def test_paced_closed_model_falls_behind_its_schedule(self):
+        workload = Workload("paced", "Paced", [Scenario("a", [Step("GET", "/")])], duration=1, connections=2, rate=80)
+        result = self.run(workload)
+        assert result.latency.total < 60
+        assert result.corrected.percentile(99) > 3 * result.latency.percentile(99)
+
+    def test_unsaturated_schedule_adds_nothing(self):
+        workload = Workload("paced", "Paced", [Scenario("a", [Step("GET", "/")])], duration=1, connections=2, rate=10)
+        result = self.run(workload, latency=0.01)
+        # About ten samples: the median, as one event loop hiccup is the whole tail
+        assert result.corrected.percentile(50) < result.latency.percentile(50) + 5000
+
+    def test_unpaced_closed_model_uses_the_expected_interval(self):
+        workload = Workload("closed", "Closed", [Scenario("a", [Step("GET", "/")])], duration=0.5, connections=2)
+        result = self.run(workload, latency=0.01)
+        assert result.correction == EXPECTED_INTERVAL
+        assert result.expected_interval == result.latency.percentile(50)
+        assert result.corrected.total >= result.latency.total
+
+
+class TestReport:
+    """JSON report"""
+
+    def test_report_keeps_the_legacy_keys(self, tmp_path):
+        workload = WORKLOADS["health"].with_options(duration=0.5, connections=2)
+
+        async def run():
+            async with serve(MockUpstream()) as url:
+                return await Runner(url).run(workload)
+
+        path = report.write([report.entry("health", asyncio.run(run()))], str(tmp_path))
+        (entry,) = report.load(path)
+        (legacy, *_) = report.load(LEGACY_REPORT)
+        assert set(legacy) <= set(entry)
+        assert set(legacy["analysis"]) <= set(entry["analysis"])
+        for section in ("requests", "latency", "throughput"):
+            assert set(legacy["analysis"][section]) <= set(entry["analysis"][section])
+        assert entry["analysis"]["latency"]["p99"] > 0
+        assert entry["assessment"][1] == "✅ No errors"
+        assert entry["analysis"]["correction"]["method"] == EXPECTED_INTERVAL
+        assert entry["analysis"]["dropped"] == 0
+
+    def test_command_line_overrides(self):
+        args = cli.parse_args(["shopping", "--model", "open", "--rate", "200"])
+        workload = WORKLOADS[args.workloads[0]].with_options(
+            duration=args.duration, connections=args.connections, model=args.model, rate=args.rate
+        )
+        assert (workload.model, workload.rate, workload.duration) == (OPEN, 200, 30)
+        assert cli.main(["nope"]) == 1
@@ -0,0 +1,127 @@
+"""
+PROXY METRICS: Latency histograms and /__metrics tests
+
+This test suite verifies:
+1. Histograms bucket observations cumulatively in Prometheus format
+2. Routes are normalised and label cardinality is bounded
+3. Proxied requests are recorded per route, tenant and status
+4. Upstream requests are split into queue, connect, TTFB and transfer phases
+5. Streamed responses are recorded once the body has been sent
+6. /__metrics serves the text exposition format
+"""
+
+import re
+
+import httpx
+
+from backend import metrics, server
+from backend.metrics import Histogram, ProxyMetrics
+from backend.upstream import UpstreamTiming
+
+
+def ok_handler(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, json={"ok": True})
+
+
+def sample(text: str, name: str, **labels) -> float:
+    """Value of the first sample of ``name`` carrying all of ``labels``"""
+    for line in text.splitlines():
+        if not line.startswith((name + "{", name + " ")):
+            continue
+        if all(f'{key}="{value}"' in line for key, value in labels.items()):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"no sample {name} {labels}")
+
+
+class TestHistogram:
+    """Bucketing and rendering"""
+
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram("h", "help", ("route",), [0.1, 1])
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(("/a",), value)
+        text = "\n".join(histogram.render())
+        assert sample(text, "h_bucket", le="0.1") == 2
+        assert sample(text, "h_bucket", le="1") == 3
+        assert sample(text, "h_bucket", le="+Inf") == 4
+        assert sample(text, "h_sum") == 3.65
+        assert sample(text, "h_count") == 4
+
+    def test_label_values_are_escaped(self):
+        histogram = Histogram("h", "help", ("route",), [1])
+        histogram.observe(('a"b',), 0.5)
+        assert 'route="a\\"b"' in "\n".join(histogram.render())
+
+
+class TestLabels:
+    """Route normalisation and bounded cardinality"""
+
+    def test_ids_are_replaced_and_depth_limited(self):
+        assert metrics.route_label("api/svm/orders/123/items") == "/api/svm/orders"
+        assert metrics.route_label("api/orders/clx9f2k3j0000abcdxyz1234") == "/api/orders/:id"
+        assert metrics.route_label("") == "/"
+
+    def test_new_values_fold_into_other_past_the_limit(self):
+        label = metrics.BoundedLabel(2)
+        assert [label(v) for v in ("a", "b", "c", "a")] == ["a", "b", "other", "a"]
+
+    def test_phases_are_observed(self):
+        registry = ProxyMetrics(buckets=[1])
+        timing = UpstreamTiming(sent_at=10.5, connect=0.1, headers_at=10.8, done_at=11.0)
+        registry.observe("api/health", "t1", 200, 10.0, 11.2, timing)
+        labels = ("/api/health", "t1", "200")
+        assert registry.duration.count(labels) == 1
+        for phase in ProxyMetrics.PHASES:
+            assert registry.phases.count(labels + (phase,)) == 1
+        assert abs(timing.ttfb - 0.2) < 1e-9
+        assert abs(timing.transfer - 0.2) < 1e-9
+
+
+class TestProxyMetrics:
+    """Recording proxied requests"""
+
+    def test_requests_are_recorded(self, make_proxy):
+        client = make_proxy(ok_handler)
+        client.get("/api/capabilities", headers={"x-tenant-id": "acme"})
+        client.get("/api/capabilities", headers={"x-tenant-id": "acme"})
+
+        response = client.get("/__metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        text = response.text
+        assert sample(
+            text, "proxy_request_duration_seconds_count",
+            route="/api/capabilities", tenant="acme", status="200",
+        ) == 2
+        for phase in ProxyMetrics.PHASES:
+            assert sample(text, "proxy_request_phase_seconds_count", phase=phase) == 2
+        assert sample(text, "proxy_upstream_requests_in_flight") == 0
+
+    def test_failed_requests_are_recorded_by_status(self, make_proxy):
+        def failing(request):
+            raise httpx.ConnectError("refused", request=request)
+
+        client = make_proxy(failing)
+        client.get("/api/health")
+        text = client.get("/__metrics").text
+        assert sample(text, "proxy_request_duration_seconds_count", status="502") == 1
+        assert "proxy_request_phase_seconds_count" not in text
+
+    def test_streamed_responses_are_recorded(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(server, "STREAMING", True)
+        client = make_proxy(ok_handler)
+        client.get("/api/health")
+        text = client.get("/__metrics").text
+        assert sample(text, "proxy_request_duration_seconds_count", route="/api/health") == 1
+        assert sample(text, "proxy_request_phase_seconds_count", phase="transfer") == 1
+
+    def test_internal_endpoints_are_not_recorded(self, make_proxy):
+        client = make_proxy(ok_handler)
+        client.get("/__proxy/pool")
+        assert not re.search(r'route="/__proxy', client.get("/__metrics").text)
+
+    def test_disabled_metrics(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+        client = make_proxy(ok_handler)
+        assert client.get("/api/health").status_code == 200
+        assert client.get("/__metrics").status_code == 404
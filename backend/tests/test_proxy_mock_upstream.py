@@ -0,0 +1,104 @@
+"""
+PROXY MOCK UPSTREAM: Canned Next.js stand-in for benchmarks tests
+
+This test suite verifies:
+1. Route specs parse into size, latency, jitter and status mix
+2. Bodies have the configured size and health matches the real route
+3. The status mix follows its weights and a seed makes it repeatable
+4. The proxy runs in front of the mock with no Next.js and no network
+"""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import server, upstream
+from backend.benchmarks import mock_upstream
+from backend.benchmarks.mock_upstream import MockRoute, MockUpstream, parse_routes
+
+
+def call(app, method, path, **kwargs):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://mock") as client:
+            return await client.request(method, path, **kwargs)
+
+    return asyncio.run(run())
+
+
+class TestRouteSpecs:
+    """MOCK_UPSTREAM_ROUTES"""
+
+    def test_parse(self):
+        routes = parse_routes(["/api/svm/orders=4096/20/10/200:98+503:2"])
+        orders = routes["/api/svm/orders"]
+        assert orders.size == 4096
+        assert orders.latency == pytest.approx(0.02)
+        assert orders.jitter == pytest.approx(0.01)
+        assert orders.statuses == [(200, 98.0), (503, 2.0)]
+        assert routes["default"].statuses == [(200, 1.0)]
+
+
+class TestMockUpstream:
+    """MockUpstream responses"""
+
+    def test_body_size_and_health(self):
+        app = MockUpstream({"/api/health": MockRoute(size=0), "default": MockRoute(size=1000)})
+        response = call(app, "POST", "/api/svm/cart", json={"sku": "A"})
+        assert response.status_code == 200
+        assert len(response.content) == 1000
+        assert response.json()["success"] is True
+        assert call(app, "GET", "/api/health").content == mock_upstream.HEALTH
+
+    def test_status_mix_is_weighted_and_seeded(self):
+        routes = {"default": MockRoute(size=10, statuses=[(200, 9), (503, 1)])}
+        first, second = MockUpstream(routes, seed=7), MockUpstream(routes, seed=7)
+
+        async def statuses(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://mock") as client:
+                return [(await client.get("/api/x")).status_code for _ in range(400)]
+
+        drawn = asyncio.run(statuses(first))
+        assert drawn == asyncio.run(statuses(second))
+        assert 10 < drawn.count(503) < 80
+        assert first.stats()["default"]["503"] == drawn.count(503)
+
+    def test_latency(self):
+        app = MockUpstream({"default": MockRoute(latency=0.05)})
+        loop = asyncio.new_event_loop()
+        started = loop.time()
+        loop.run_until_complete(app({"type": "http", "path": "/"}, _receive, _discard))
+        assert loop.time() - started >= 0.05
+        loop.close()
+
+    def test_stats_endpoint(self):
+        app = MockUpstream()
+        call(app, "GET", "/api/health")
+        assert call(app, "GET", mock_upstream.STATS_PATH).json() == {"/api/health": {"200": 1}}
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _discard(message):
+    pass
+
+
+class TestProxyInFrontOfMock:
+    """backend.server with the mock as its upstream"""
+
+    def test_proxy_forwards_to_mock(self, monkeypatch):
+        mock = MockUpstream({"default": MockRoute(size=512, statuses=[(201, 1)])})
+        monkeypatch.setattr(
+            upstream, "create_upstream",
+            lambda: upstream.UpstreamClient(base_url="http://mock", transport=httpx.ASGITransport(app=mock)),
+        )
+        with TestClient(server.app) as client:
+            response = client.post("/api/svm/orders", json={"sku": "A"})
+        assert response.status_code == 201
+        assert len(response.content) == 512
+        assert mock.stats() == {"default": {"201": 1}}
@@ -0,0 +1,230 @@
+"""
+PROXY RATE LIMITING: GCRA limiter tests
+
+This test suite verifies:
+1. Policies mirror frontend/src/lib/rate-limiter.ts
+2. GCRA allows a burst of `limit` requests, then spaces them by the interval
+3. Keys normalise dynamic path segments and use the client IP alone,
+   trusting forwarding headers only from PROXY_TRUSTED_PROXIES
+4. The shared-memory store is shared between independent store instances
+   and waits for a stripe locked by another process without blocking
+5. Over-limit requests get a 429 in the Next.js response shape
+6. Store failures fail open
+"""
+
+import asyncio
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+from backend import ratelimit
+
+
+def policies(spec):
+    return ratelimit.parse_policies(spec)
+
+
+class TestPolicies:
+    """Policy parsing and selection"""
+
+    def test_default_policies_match_rate_limiter_ts(self):
+        limiter = ratelimit.RateLimiter(ratelimit.MemoryStore())
+        assert limiter.policy_for("/api/auth/login").limit == 10
+        assert limiter.policy_for("/api/wallets/abc").limit == 60
+        assert limiter.policy_for("/api/svm/cart").limit == 100
+        assert limiter.policy_for("/api/svm/orders").limit == 30
+        assert limiter.policy_for("/api/svm/products").limit == 200
+        assert limiter.policy_for("/api/auth").message.startswith("Too many authentication")
+
+    def test_key_normalises_dynamic_segments(self):
+        key = ratelimit.RateLimiter.key_for("t1:1.2.3.4", "/api/wallets/clx7a8b9c0d1e2f3g4h5i6j7/balance")
+        assert key == "ratelimit:t1:1.2.3.4:/api/wallets/:id/balance"
+
+    @pytest.mark.parametrize("headers,expected", [
+        ({"x-forwarded-for": "203.0.113.4, 172.16.0.1"}, "203.0.113.4"),
+        # All hops trusted: the first entry is the client's own, so the peer is used
+        ({"x-forwarded-for": "10.0.0.1, 172.16.0.1"}, "192.168.1.9"),
+        ({"x-real-ip": "10.0.0.2"}, "10.0.0.2"),
+        ({}, "192.168.1.9"),
+        # The client chooses x-tenant-id, so it must not pick the bucket
+        ({"x-tenant-id": "tenant-a", "x-real-ip": "10.0.0.2"}, "10.0.0.2"),
+    ])
+    def test_client_identifier(self, headers, expected):
+        assert ratelimit.client_identifier(headers, "192.168.1.9") == expected
+
+    @pytest.mark.parametrize("peer,headers,expected", [
+        # A client talking to the proxy directly cannot choose its own key
+        ("203.0.113.5", {"x-forwarded-for": "10.9.9.9"}, "203.0.113.5"),
+        ("203.0.113.5", {"x-real-ip": "10.9.9.9"}, "203.0.113.5"),
+        # Behind the ingress, hops the client made up are left of its real address
+        ("10.0.0.3", {"x-forwarded-for": "198.51.100.7, 203.0.113.9"}, "203.0.113.9"),
+        ("10.0.0.3", {"x-forwarded-for": "203.0.113.9, 10.0.0.8"}, "203.0.113.9"),
+        (None, {"x-forwarded-for": "203.0.113.9"}, "203.0.113.9"),
+        (None, {"x-forwarded-for": "10.0.0.1, 10.0.0.8"}, "10.0.0.8"),
+    ])
+    def test_forwarding_headers_need_a_trusted_peer(self, peer, headers, expected):
+        assert ratelimit.client_identifier(headers, peer) == expected
+        ingress = ratelimit.parse_networks(["203.0.113.0/24"])
+        assert ratelimit.client_identifier({"x-forwarded-for": "10.9.9.9"}, "203.0.113.5", ingress) == "10.9.9.9"
+
+
+class TestGcra:
+    """Algorithm behaviour"""
+
+    def test_burst_then_spacing(self):
+        interval, window = 6.0, 60.0
+        tat, now = None, 1000.0
+        for _ in range(10):
+            allowed, tat = ratelimit.gcra(tat, now, interval, window)
+            assert allowed
+        allowed, tat = ratelimit.gcra(tat, now, interval, window)
+        assert not allowed
+        # One interval later exactly one more request fits
+        allowed, tat = ratelimit.gcra(tat, now + interval, interval, window)
+        assert allowed
+
+    def test_result_reports_remaining_and_retry(self):
+        policy = ratelimit.RateLimitPolicy("/api/auth", 10, 60.0, "slow down")
+        result = ratelimit.result_for(policy, True, 1006.0, 1000.0)
+        assert result.remaining == 9
+        denied = ratelimit.result_for(policy, False, 1060.0, 1000.0)
+        assert denied.remaining == 0
+        assert denied.retry_after == pytest.approx(6.0)
+        assert denied.message == "slow down"
+
+
+async def exhaust(store, count, key="ratelimit:k:/api/auth", interval=6.0, window=60.0):
+    return [(await store.hit(key, interval, window))[0] for _ in range(count)]
+
+
+class TestStores:
+    """Memory and shared-memory stores"""
+
+    def test_memory_store(self):
+        assert asyncio.run(exhaust(ratelimit.MemoryStore(), 11)) == [True] * 10 + [False]
+
+    def test_memory_store_is_a_bounded_lru(self):
+        store = ratelimit.MemoryStore(max_keys=3)
+
+        async def run():
+            for key in ("a", "b", "c"):
+                await store.hit(key, 6.0, 60.0)
+            await store.hit("a", 6.0, 60.0)
+            await store.hit("d", 6.0, 60.0)
+
+        asyncio.run(run())
+        assert len(store) == 3
+        assert list(store._tats) == ["c", "a", "d"]
+
+    def test_shared_memory_store_is_shared(self, tmp_path):
+        path = str(tmp_path / "ratelimit")
+
+        async def run():
+            first = ratelimit.SharedMemoryStore(path=path, slots=256)
+            second = ratelimit.SharedMemoryStore(path=path, slots=256)
+            results = await exhaust(first, 6) + await exhaust(second, 5)
+            await first.aclose()
+            await second.aclose()
+            return results
+
+        assert asyncio.run(run()) == [True] * 10 + [False]
+
+    def test_shared_memory_store_reuses_slots_when_full(self, tmp_path):
+        async def run():
+            store = ratelimit.SharedMemoryStore(path=str(tmp_path / "rl"), slots=4, stripe=4)
+            results = [(await store.hit(f"key-{i}", 6.0, 60.0))[0] for i in range(20)]
+            await store.aclose()
+            return results
+
+        assert all(asyncio.run(run()))
+
+    def test_locked_stripe_does_not_block_the_event_loop(self, tmp_path):
+        path = str(tmp_path / "rl")
+        store = ratelimit.SharedMemoryStore(path=path, slots=4, stripe=4)
+        holder = subprocess.Popen(
+            [sys.executable, "-c", (
+                "import fcntl, os, sys, time\n"
+                f"fd = os.open({path!r}, os.O_RDWR)\n"
+                "fcntl.lockf(fd, fcntl.LOCK_EX)\n"
+                "print('locked', flush=True)\n"
+                "time.sleep(0.3)\n"
+            )],
+            stdout=subprocess.PIPE,
+        )
+        assert holder.stdout.readline() == b"locked\n"
+
+        async def run():
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+
+            ticker = asyncio.ensure_future(tick())
+            started = time.monotonic()
+            allowed, _, _ = await store.hit("key", 6.0, 60.0)
+            waited = time.monotonic() - started
+            ticker.cancel()
+            await store.aclose()
+            return allowed, waited, ticks
+
+        allowed, waited, ticks = asyncio.run(run())
+        holder.wait()
+        assert allowed
+        assert waited > 0.1
+        assert ticks > 5
+
+
+class FailingStore:
+    async def hit(self, key, interval, window):
+        raise ConnectionError("redis down")
+
+    async def aclose(self):
+        pass
+
+
+class TestProxyRateLimiting:
+    """429s through proxy_to_nextjs"""
+
+    def test_over_limit_requests_are_rejected(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(ratelimit, "RATELIMIT_ENABLED", True)
+        monkeypatch.setattr(ratelimit, "RATELIMIT_POLICIES", ["/api/auth=3/60", "default=200/60"])
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, json={"ok": True})
+
+        client = make_proxy(handler)
+        statuses = [client.post("/api/auth/login", json={}).status_code for _ in range(4)]
+        assert statuses == [200, 200, 200, 429]
+        assert len(calls) == 3
+
+        denied = client.post("/api/auth/login", json={})
+        assert denied.json()["success"] is False
+        assert denied.json()["error"].startswith("Too many authentication")
+        assert int(denied.headers["retry-after"]) > 0
+        assert denied.headers["x-ratelimit-limit"] == "3"
+        assert denied.headers["x-ratelimit-remaining"] == "0"
+
+        # Rotating x-tenant-id does not buy a new budget; other paths have their own
+        for tenant in ("other", "another"):
+            assert client.post("/api/auth/login", json={}, headers={"x-tenant-id": tenant}).status_code == 429
+        assert client.get("/api/svm/products").status_code == 200
+        assert client.get("/__proxy/ratelimit").json()["rejected"] == 4
+
+    def test_store_failure_fails_open(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(ratelimit, "RATELIMIT_ENABLED", True)
+        monkeypatch.setattr(ratelimit, "create_store", lambda: FailingStore())
+        client = make_proxy(lambda request: httpx.Response(200, json={"ok": True}))
+        assert client.get("/api/auth/session").status_code == 200
+        assert client.get("/__proxy/ratelimit").json()["errors"] == 1
+
+    def test_disabled_by_default(self, make_proxy):
+        client = make_proxy(lambda request: httpx.Response(200, json={}))
+        assert client.get("/__proxy/ratelimit").json() == {"enabled": False}
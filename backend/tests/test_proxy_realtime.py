@@ -0,0 +1,212 @@
+"""
+PROXY REALTIME: WebSocket and Server-Sent Events pass-through tests
+
+This test suite verifies:
+1. Event streams are relayed unbuffered with no-buffering headers
+2. Event streams end quietly on the idle timeout and release their connection
+3. WebSocket frames are relayed both ways with path, query and cookies
+4. Upstream close codes reach the client and idle sockets are closed
+5. The connection limit refuses new streams and sockets
+6. Open connections are exported on /__metrics and /__proxy/realtime
+"""
+
+import asyncio
+
+import httpx
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from backend import realtime, resilience
+from backend.realtime import RealtimeProxy
+
+
+class EventStream(httpx.AsyncByteStream):
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+        if self.error is not None:
+            raise self.error
+
+
+def sse_handler(calls, error=None):
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(
+            200,
+            headers={"content-type": "text/event-stream"},
+            stream=EventStream([b"event: status\ndata: packed\n\n", b"data: shipped\n\n"], error),
+        )
+    return handler
+
+
+class FakeUpstreamSocket:
+    """Echoes every frame back, upper-cased, until closed"""
+
+    def __init__(self, url, headers, subprotocols):
+        self.url = url
+        self.headers = dict(headers)
+        self.subprotocol = subprotocols[0] if subprotocols else None
+        self.close_code = None
+        self.closed = False
+        self.queue = asyncio.Queue()
+
+    async def send(self, data):
+        if data == "bye":
+            self.close_code = 4001
+            await self.queue.put(None)
+            return
+        await self.queue.put(data.upper() if isinstance(data, str) else data[::-1])
+
+    async def recv(self):
+        data = await self.queue.get()
+        if data is None:
+            raise ConnectionError("closed")
+        return data
+
+    async def close(self):
+        self.closed = True
+
+
+class TestHelpers:
+    """Header and timeout helpers"""
+
+    def test_wants_event_stream(self):
+        assert realtime.wants_event_stream({"accept": "text/event-stream"})
+        assert not realtime.wants_event_stream({"accept": "application/json"})
+
+    def test_sse_timeout_only_stretches_reads(self):
+        timeout = realtime.sse_timeout(httpx.Timeout(connect=2, read=10, write=10, pool=2), idle=60)
+        assert timeout.read == 60
+        assert timeout.connect == 2
+
+    def test_handshake_headers_are_not_repeated(self):
+        headers = realtime.websocket_headers(
+            [("Host", "a"), ("Sec-WebSocket-Key", "k"), ("Cookie", "s=1"), ("X-Request-Id", "old")],
+            {"x-request-id": "new"},
+        )
+        assert headers == [("Cookie", "s=1"), ("x-request-id", "new")]
+
+    def test_close_codes_that_cannot_be_sent(self):
+        class Closed:
+            close_code = 1006
+
+        assert realtime.close_code(Closed()) == realtime.INTERNAL_ERROR
+        assert realtime.close_code(object()) == realtime.NORMAL_CLOSURE
+
+
+class TestServerSentEvents:
+    """Event streams through proxy_to_nextjs"""
+
+    def test_events_are_relayed(self, make_proxy):
+        calls = []
+        client = make_proxy(sse_handler(calls))
+        response = client.get(
+            "/api/logistics/tracking/stream", headers={"accept": "text/event-stream"}
+        )
+        assert response.status_code == 200
+        assert response.text == "event: status\ndata: packed\n\ndata: shipped\n\n"
+        assert response.headers["x-accel-buffering"] == "no"
+        assert response.headers["cache-control"] == "no-cache"
+        # The idle timeout replaces the route's read timeout, the deadline is still sent
+        assert resilience.DEADLINE_HEADER in calls[0].headers
+        assert calls[0].extensions["timeout"]["read"] == realtime.SSE_IDLE_TIMEOUT
+
+        stats = client.get("/__proxy/realtime").json()
+        assert stats["total"]["sse"] == 1
+        assert stats["open"]["sse"] == 0
+
+    def test_idle_stream_ends_quietly(self, make_proxy):
+        client = make_proxy(sse_handler([], error=httpx.ReadTimeout("idle")))
+        response = client.get("/api/orders/stream", headers={"accept": "text/event-stream"})
+        assert response.text.endswith("data: shipped\n\n")
+        stats = client.get("/__proxy/realtime").json()
+        assert stats["idle_closed"]["sse"] == 1
+        assert stats["open"]["sse"] == 0
+
+    def test_stream_limit(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(realtime, "create_realtime", lambda: RealtimeProxy(max_connections=0))
+        client = make_proxy(sse_handler([]))
+        response = client.get("/api/orders/stream", headers={"accept": "text/event-stream"})
+        assert response.status_code == 503
+        assert client.get("/__proxy/realtime").json()["rejected"] == 1
+
+    def test_connections_are_exported(self, make_proxy):
+        client = make_proxy(sse_handler([]))
+        client.get("/api/orders/stream", headers={"accept": "text/event-stream"})
+        text = client.get("/__metrics").text
+        assert 'proxy_realtime_connections{kind="sse"} 0' in text
+        assert 'proxy_realtime_connections{kind="websocket"} 0' in text
+
+
+class TestWebSockets:
+    """WebSocket relay through proxy_websocket"""
+
+    @pytest.fixture
+    def sockets(self, monkeypatch):
+        opened = []
+
+        async def connect(url, headers, subprotocols):
+            socket = FakeUpstreamSocket(url, headers, subprotocols)
+            opened.append(socket)
+            return socket
+
+        monkeypatch.setattr(
+            realtime, "create_realtime",
+            lambda: RealtimeProxy(connect=connect, websocket_idle_timeout=0.2),
+        )
+        return opened
+
+    def test_frames_are_relayed_both_ways(self, make_proxy, sockets):
+        client = make_proxy(lambda request: httpx.Response(200))
+        with client.websocket_connect(
+            "/api/logistics/tracking/ws?order=42",
+            headers={"cookie": "session=abc"},
+            subprotocols=["tracking.v1"],
+        ) as ws:
+            assert ws.accepted_subprotocol == "tracking.v1"
+            ws.send_text("hello")
+            assert ws.receive_text() == "HELLO"
+            ws.send_bytes(b"abc")
+            assert ws.receive_bytes() == b"cba"
+            assert client.get("/__proxy/realtime").json()["open"]["websocket"] == 1
+
+        upstream = sockets[0]
+        assert upstream.url == "ws://localhost:3000/api/logistics/tracking/ws?order=42"
+        assert upstream.headers["cookie"] == "session=abc"
+        assert "x-request-id" in upstream.headers
+        assert "sec-websocket-key" not in {name.lower() for name in upstream.headers}
+
+    def test_upstream_close_code_reaches_client(self, make_proxy, sockets):
+        client = make_proxy(lambda request: httpx.Response(200))
+        with client.websocket_connect("/api/orders/live") as ws:
+            ws.send_text("bye")
+            with pytest.raises(WebSocketDisconnect) as info:
+                ws.receive_text()
+        assert info.value.code == 4001
+
+    def test_idle_socket_is_closed(self, make_proxy, sockets):
+        client = make_proxy(lambda request: httpx.Response(200))
+        with client.websocket_connect("/api/orders/live") as ws:
+            with pytest.raises(WebSocketDisconnect) as info:
+                ws.receive_text()
+        assert info.value.code == realtime.GOING_AWAY
+        assert sockets[0].closed
+        stats = client.get("/__proxy/realtime").json()
+        assert stats["idle_closed"]["websocket"] == 1
+        assert stats["open"]["websocket"] == 0
+
+    def test_unreachable_upstream_closes_with_1011(self, make_proxy, monkeypatch):
+        async def connect(url, headers, subprotocols):
+            raise OSError("connection refused")
+
+        monkeypatch.setattr(realtime, "create_realtime", lambda: RealtimeProxy(connect=connect))
+        client = make_proxy(lambda request: httpx.Response(200))
+        with pytest.raises(WebSocketDisconnect) as info:
+            with client.websocket_connect("/api/orders/live") as ws:
+                ws.receive_text()
+        assert info.value.code == realtime.INTERNAL_ERROR
+        assert client.get("/__proxy/realtime").json()["upstream_errors"] == 1
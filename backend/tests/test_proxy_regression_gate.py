@@ -0,0 +1,149 @@
+"""
+PROXY REGRESSION GATE: Load test report comparison tests
+
+This test suite verifies:
+1. A clear latency or throughput slowdown is flagged and exits non-zero
+2. Run-to-run noise of the same system is not flagged
+3. Changes below the threshold pass, improvements are reported as such
+4. Autocannon reports without histograms are compared on point values
+5. With no arguments the two newest reports are compared
+6. More failed or non-2xx requests, or a test not run at all, also fail the gate
+"""
+
+import json
+import os
+import random
+
+import pytest
+
+from backend.loadtest import compare
+from backend.loadtest.histogram import Histogram
+
+LEGACY_REPORT = os.path.join(os.path.dirname(__file__), "..", "..", "frontend", "load-tests", "report-1767349526057.json")
+
+
+def fake_entry(name, seed, scale=1.0, rps=500, count=5000, errors=0, non2xx=0):
+    """A report entry of ``count`` log-normal latencies around 20ms * scale"""
+    rng = random.Random(seed)
+    histogram = Histogram()
+    for _ in range(count):
+        histogram.record(int(rng.lognormvariate(9.9, 0.4) * scale))
+    per_second = [int(rng.gauss(rps, rps * 0.03)) for _ in range(15)]
+    return {
+        "testName": name,
+        "analysis": {
+            "test": name,
+            "requests": {"total": count, "average": sum(per_second) / len(per_second)},
+            "latency": {
+                "p50": histogram.percentile(50) / 1000,
+                "p90": histogram.percentile(90) / 1000,
+                "p99": histogram.percentile(99) / 1000,
+            },
+            "errors": errors,
+            "timeouts": 0,
+            "dropped": errors,
+            "non2xx": non2xx,
+            "requestsPerSecond": per_second,
+            "histogram": histogram.to_list(),
+        },
+        "assessment": [],
+    }
+
+
+def write(tmp_path, name, *entries):
+    path = tmp_path / name
+    path.write_text(json.dumps(list(entries)))
+    return str(path)
+
+
+def by_metric(comparisons):
+    return {(c.test, c.metric): c for c in comparisons}
+
+
+class TestCompareReports:
+    """compare.compare_reports"""
+
+    def test_slower_candidate_is_a_regression(self):
+        baseline = [fake_entry("cartRead", 1)]
+        candidate = [fake_entry("cartRead", 2, scale=1.3, rps=400)]
+        results = by_metric(compare.compare_reports(baseline, candidate))
+        for metric in ("p50", "p99", "throughput"):
+            result = results[("cartRead", metric)]
+            assert result.regression, metric
+            assert result.bootstrapped
+            assert 0 < result.low <= result.change <= result.high
+
+    def test_noise_is_not_a_regression(self):
+        baseline = [fake_entry("walletList", 1)]
+        candidate = [fake_entry("walletList", 2)]
+        results = compare.compare_reports(baseline, candidate, threshold=5)
+        assert not any(result.regression for result in results)
+        assert all(result.low < 0 < result.high for result in results if result.metric not in compare.RATES)
+
+    def test_threshold_and_improvements(self):
+        baseline = [fake_entry("orderList", 1)]
+        slightly_slower = [fake_entry("orderList", 2, scale=1.05)]
+        assert not any(c.regression for c in compare.compare_reports(baseline, slightly_slower, threshold=10))
+        faster = [fake_entry("orderList", 2, scale=0.7, rps=700)]
+        assert all(c.improvement for c in compare.compare_reports(baseline, faster, metrics=("p50", "p99", "throughput")))
+
+    def test_tests_missing_from_the_candidate_are_regressions(self):
+        results = compare.compare_reports([fake_entry("health", 1)], [fake_entry("cartRead", 1)])
+        (missing,) = results
+        assert (missing.test, missing.metric) == ("health", compare.MISSING)
+        assert missing.regression
+        assert compare.verdict(missing) == "MISSING"
+
+    def test_failure_rates_are_gated(self):
+        baseline = [fake_entry("checkout", 1, errors=5, non2xx=10)]
+        failing = [fake_entry("checkout", 1, errors=200, non2xx=400)]
+        results = by_metric(compare.compare_reports(baseline, failing))
+        assert not results[("checkout", "p99")].regression
+        for metric in compare.RATES:
+            result = results[("checkout", metric)]
+            assert result.regression, metric
+            assert result.bootstrapped and 0 < result.low
+        assert results[("checkout", "non2xx")].change == pytest.approx((400 - 10) / 5000)
+
+        slightly = [fake_entry("checkout", 1, errors=20, non2xx=30)]
+        assert not any(c.regression for c in compare.compare_reports(baseline, slightly))
+        assert any(c.regression for c in compare.compare_reports(baseline, slightly, rate_threshold=0.1))
+
+    def test_legacy_reports_use_point_values(self):
+        legacy = json.load(open(LEGACY_REPORT))
+        slower = json.loads(json.dumps(legacy))
+        slower[1]["analysis"]["latency"]["p99"] *= 1.5
+        results = by_metric(compare.compare_reports(legacy, slower))
+        p99 = results[("cartRead", "p99")]
+        assert not p99.bootstrapped
+        assert p99.regression
+        assert p99.change == 0.5
+        assert not results[("health", "p99")].regression
+        assert ("cartRead", "errors") in results and ("cartRead", "non2xx") not in results
+
+
+class TestCommandLine:
+    """python -m backend.loadtest.compare"""
+
+    def test_exit_status(self, tmp_path, capsys):
+        base = write(tmp_path, "report-1.json", fake_entry("cartRead", 1), fake_entry("health", 3))
+        same = write(tmp_path, "report-2.json", fake_entry("cartRead", 2), fake_entry("health", 4))
+        slow = write(tmp_path, "report-3.json", fake_entry("cartRead", 2, scale=1.5), fake_entry("health", 4))
+        assert compare.main([base, same, "--rounds", "500"]) == 0
+        out = tmp_path / "gate.json"
+        assert compare.main([base, same, slow, "--rounds", "500", "--json", str(out)]) == 1
+        assert "REGRESSION" in capsys.readouterr().out
+        flagged = [
+            (c["test"], c["metric"]) for c in json.loads(out.read_text())["comparisons"][slow] if c["regression"]
+        ]
+        assert ("cartRead", "p50") in flagged
+        assert all(test == "cartRead" for test, _ in flagged)
+
+    def test_newest_reports_by_default(self, tmp_path):
+        write(tmp_path, "report-100.json", fake_entry("health", 1, scale=0.5))
+        write(tmp_path, "report-200.json", fake_entry("health", 1))
+        write(tmp_path, "report-1000.json", fake_entry("health", 2))
+        assert compare.newest_reports(str(tmp_path)) == [
+            str(tmp_path / "report-200.json"), str(tmp_path / "report-1000.json"),
+        ]
+        assert compare.main(["--report-dir", str(tmp_path), "--rounds", "500"]) == 0
@@ -0,0 +1,172 @@
+"""
+PROXY RESILIENCE: Per-route timeouts, deadlines and circuit breakers tests
+
+This test suite verifies:
+1. Route timeouts are matched by longest prefix with a default fallback
+2. The deadline header can only shorten a route's budget
+3. The remaining budget is forwarded to Next.js
+4. Slow upstreams are cut off at the total budget with 504
+5. Breakers open after consecutive failures and fail fast with 503 + Retry-After
+6. A single half-open probe closes or re-opens the breaker
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from backend import resilience, server
+from backend.resilience import CircuitBreaker, CircuitOpen, RouteTimeout, RouteTimeouts
+
+
+def ok_handler(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, json={"deadline": request.headers.get(resilience.DEADLINE_HEADER)})
+
+
+class TestRouteTimeouts:
+    """PROXY_ROUTE_TIMEOUTS parsing and lookup"""
+
+    def test_longest_prefix_wins(self):
+        timeouts = RouteTimeouts(resilience.parse_timeouts(
+            ["/api/svm=1/5/5", "/api/svm/cart=1/2/2", "default=5/30/30"]
+        ))
+        assert timeouts.for_path("api/svm/cart/items").total == 2
+        assert timeouts.for_path("api/svm/catalog").total == 5
+        assert timeouts.for_path("api/svm").total == 5
+        assert timeouts.for_path("api/svmx").total == 30
+
+    def test_default_is_added_when_missing(self):
+        assert resilience.parse_timeouts(["/api/pos=1/2/3"])["default"].total == 30
+
+    def test_header_shortens_but_never_extends_the_budget(self):
+        timeouts = RouteTimeouts({"default": RouteTimeout(5, 30, 30)})
+        assert timeouts.deadline("x", "2500", now=100.0) == pytest.approx(102.5)
+        assert timeouts.deadline("x", "600000", now=100.0) == pytest.approx(130.0)
+        assert timeouts.deadline("x", "soon", now=100.0) == pytest.approx(130.0)
+
+    def test_httpx_timeouts_are_clamped_to_the_budget(self):
+        timeout = RouteTimeout(5, 30, 30).budget(2.0)
+        assert timeout.connect == 2.0
+        assert timeout.read == 2.0
+
+
+class TestDeadlines:
+    """Budgets applied to proxied requests"""
+
+    def test_remaining_budget_is_forwarded(self, make_proxy):
+        client = make_proxy(ok_handler)
+        response = client.get("/api/health", headers={resilience.DEADLINE_HEADER: "4000"})
+        assert 0 < int(response.json()["deadline"]) <= 4000
+
+    def test_slow_upstream_times_out_with_504(self, make_proxy):
+        async def slow(request):
+            await asyncio.sleep(1)
+            return httpx.Response(200)
+
+        client = make_proxy(slow)
+        response = client.get("/api/health", headers={resilience.DEADLINE_HEADER: "50"})
+        assert response.status_code == 504
+        assert server.app.state.upstream.in_flight == 0
+
+    def test_spent_budget_is_not_sent_upstream(self, make_proxy):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200)
+
+        client = make_proxy(handler)
+        response = client.get("/api/health", headers={resilience.DEADLINE_HEADER: "0"})
+        assert response.status_code == 504
+        assert calls == []
+
+
+class TestCircuitBreaker:
+    """State machine of a single breaker"""
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker("/api/analytics", failures=2, cooldown=10)
+        for _ in range(2):
+            breaker.acquire(now=0)
+            breaker.record(False, now=0)
+        assert breaker.state == resilience.OPEN
+        with pytest.raises(CircuitOpen) as info:
+            breaker.acquire(now=4)
+        assert info.value.retry_after == pytest.approx(6)
+
+    def test_success_resets_the_count(self):
+        breaker = CircuitBreaker("/api/analytics", failures=2)
+        breaker.record(False)
+        breaker.record(True)
+        breaker.record(False)
+        assert breaker.state == resilience.CLOSED
+
+    def test_half_open_admits_one_probe(self):
+        breaker = CircuitBreaker("/api/analytics", failures=1, cooldown=10)
+        breaker.record(False, now=0)
+        breaker.acquire(now=11)
+        assert breaker.state == resilience.HALF_OPEN
+        with pytest.raises(CircuitOpen):
+            breaker.acquire(now=11)
+        breaker.record(True, now=12)
+        assert breaker.state == resilience.CLOSED
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker("/api/analytics", failures=1, cooldown=10)
+        breaker.record(False, now=0)
+        breaker.acquire(now=11)
+        breaker.record(False, now=11)
+        assert breaker.state == resilience.OPEN
+        with pytest.raises(CircuitOpen):
+            breaker.acquire(now=15)
+
+    def test_cancelled_probe_frees_the_slot(self):
+        breaker = CircuitBreaker("/api/analytics", failures=1, cooldown=10)
+        breaker.record(False, now=0)
+        breaker.acquire(now=11)
+        breaker.record(None, now=11)
+        breaker.acquire(now=11)
+
+
+class TestBreakersInProxy:
+    """Per-prefix breakers on proxied routes"""
+
+    @pytest.fixture
+    def failing_proxy(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(
+            resilience, "create_breakers",
+            lambda: resilience.CircuitBreakers(["/api/analytics"], failures=2, cooldown=30),
+        )
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.path)
+            return httpx.Response(503, json={"error": "down"})
+
+        return make_proxy(handler), calls
+
+    def test_open_breaker_fails_fast(self, failing_proxy):
+        client, calls = failing_proxy
+        assert client.get("/api/analytics/sales").status_code == 503
+        assert client.get("/api/analytics/sales").status_code == 503
+        response = client.get("/api/analytics/sales")
+        assert response.status_code == 503
+        assert int(response.headers["retry-after"]) > 0
+        assert response.json()["retryAfter"] > 0
+        assert len(calls) == 2
+
+    def test_other_routes_are_unaffected(self, failing_proxy):
+        client, calls = failing_proxy
+        for _ in range(3):
+            client.get("/api/analytics/sales")
+        client.get("/api/pos/sessions")
+        assert calls[-1] == "/api/pos/sessions"
+
+    def test_breaker_stats_endpoint(self, failing_proxy):
+        client, _ = failing_proxy
+        for _ in range(3):
+            client.get("/api/analytics/sales")
+        data = client.get("/__proxy/breakers").json()
+        assert data["enabled"] is True
+        assert data["routes"]["/api/analytics"]["state"] == resilience.OPEN
+        assert data["routes"]["/api/analytics"]["rejected_total"] == 1
@@ -0,0 +1,203 @@
+"""
+PROXY STATIC: /_next/static and public/ fast path tests
+
+This test suite verifies:
+1. Build assets are served from disk with immutable cache headers, HEAD too
+2. Public files revalidate and pick up changes on disk
+3. Precompressed .br/.gz siblings are negotiated, with Vary and per-coding ETags
+4. If-None-Match, Range and If-Range are answered at the proxy
+5. Large files are streamed from disk, small ones held in a bounded memory LRU
+6. Missing files and path traversal fall through to Next.js
+"""
+
+import asyncio
+import gzip
+import os
+
+import httpx
+import pytest
+
+from backend import static
+from backend.static import StaticFiles
+
+
+@pytest.fixture
+def frontend(tmp_path):
+    """A fake build: .next/static chunks and a public/ directory"""
+    chunks = tmp_path / ".next" / "static" / "chunks"
+    chunks.mkdir(parents=True)
+    script = b"console.log('webwaka');\n" * 200
+    (chunks / "main-abc123.js").write_bytes(script)
+    (chunks / "main-abc123.js.gz").write_bytes(gzip.compress(script, mtime=0))
+    (chunks / "main-abc123.js.br").write_bytes(b"fake-brotli")
+    (chunks / "big-def456.js").write_bytes(b"x" * 5000)
+
+    public = tmp_path / "public"
+    (public / "icons").mkdir(parents=True)
+    (public / "icons" / "icon-192.png").write_bytes(b"\x89PNG" + b"\0" * 100)
+    (public / "manifest.json").write_bytes(b'{"name": "WebWaka"}')
+    (tmp_path / "secret.txt").write_bytes(b"nope")
+    return tmp_path
+
+
+def mounts(root):
+    return [
+        ("/_next/static", str(root / ".next" / "static"), True),
+        ("/icons", str(root / "public" / "icons"), False),
+        ("/manifest.json", str(root / "public" / "manifest.json"), False),
+    ]
+
+
+@pytest.fixture
+def proxy(make_proxy, monkeypatch, frontend):
+    monkeypatch.setattr(
+        static, "create_static_files",
+        lambda: StaticFiles(mounts(frontend), memory_max_bytes=64 * 1024, memory_file_max=4096),
+    )
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(404, json={"error": "not found"})
+
+    return make_proxy(handler), calls
+
+
+class TestParseRange:
+    """Single byte ranges"""
+
+    @pytest.mark.parametrize("header,expected", [
+        ("bytes=0-9", (0, 9)),
+        ("bytes=10-", (10, 99)),
+        ("bytes=-10", (90, 99)),
+        ("bytes=50-500", (50, 99)),
+        ("bytes=0-1,5-6", None),
+        ("items=0-1", None),
+        ("bytes=9-2", None),
+    ])
+    def test_ranges(self, header, expected):
+        assert static.parse_range(header, 100) == expected
+
+    def test_start_past_the_end(self):
+        with pytest.raises(static.RangeNotSatisfiable):
+            static.parse_range("bytes=100-", 100)
+
+
+class TestStaticServing:
+    """Responses served without touching Next.js"""
+
+    def test_build_assets_are_immutable(self, proxy):
+        client, calls = proxy
+        response = client.get("/_next/static/chunks/main-abc123.js", headers={"accept-encoding": "identity"})
+        assert response.status_code == 200
+        assert response.content == b"console.log('webwaka');\n" * 200
+        assert response.headers["cache-control"] == static.IMMUTABLE
+        assert response.headers["content-type"].startswith("application/javascript")
+        assert "last-modified" in response.headers
+        assert calls == []
+
+    def test_head_has_the_headers_without_the_body(self, proxy):
+        client, calls = proxy
+        path = "/_next/static/chunks/main-abc123.js"
+        get = client.get(path, headers={"accept-encoding": "identity"})
+        head = client.head(path, headers={"accept-encoding": "identity"})
+        assert head.status_code == 200
+        assert head.content == b""
+        assert head.headers["content-length"] == str(len(get.content))
+        assert head.headers["etag"] == get.headers["etag"]
+        assert calls == []
+
+    def test_precompressed_sibling_is_negotiated(self, proxy):
+        client, _ = proxy
+        gz = client.get("/_next/static/chunks/main-abc123.js", headers={"accept-encoding": "gzip"})
+        assert gz.headers["content-encoding"] == "gzip"
+        assert gz.headers["vary"] == "Accept-Encoding"
+        assert gz.content == b"console.log('webwaka');\n" * 200
+        br = client.get(
+            "/_next/static/chunks/main-abc123.js", headers={"accept-encoding": "br"}
+        )
+        assert br.headers["content-encoding"] == "br"
+        assert br.headers["etag"] != gz.headers["etag"]
+
+    def test_public_files_revalidate_and_follow_disk(self, proxy, frontend):
+        client, calls = proxy
+        first = client.get("/manifest.json")
+        assert first.json() == {"name": "WebWaka"}
+        assert first.headers["cache-control"] == static.REVALIDATE
+
+        manifest = frontend / "public" / "manifest.json"
+        manifest.write_bytes(b'{"name": "WebWaka POS"}')
+        os.utime(manifest, ns=(1, 1))
+        second = client.get("/manifest.json")
+        assert second.json() == {"name": "WebWaka POS"}
+        assert second.headers["etag"] != first.headers["etag"]
+        assert client.get("/icons/icon-192.png").headers["content-type"] == "image/png"
+        assert calls == []
+
+    def test_if_none_match_gets_304(self, proxy):
+        client, _ = proxy
+        tag = client.get("/icons/icon-192.png").headers["etag"]
+        response = client.get("/icons/icon-192.png", headers={"if-none-match": tag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+    def test_range_request(self, proxy):
+        client, _ = proxy
+        response = client.get(
+            "/_next/static/chunks/big-def456.js", headers={"range": "bytes=100-199", "accept-encoding": "gzip"}
+        )
+        assert response.status_code == 206
+        assert response.headers["content-range"] == "bytes 100-199/5000"
+        assert "content-encoding" not in response.headers
+        assert len(response.content) == 100
+
+    def test_if_range_mismatch_sends_everything(self, proxy):
+        client, _ = proxy
+        response = client.get(
+            "/_next/static/chunks/big-def456.js", headers={"range": "bytes=0-9", "if-range": '"stale"'}
+        )
+        assert response.status_code == 200
+        assert len(response.content) == 5000
+
+    def test_unsatisfiable_range(self, proxy):
+        client, _ = proxy
+        response = client.get("/_next/static/chunks/big-def456.js", headers={"range": "bytes=9000-"})
+        assert response.status_code == 416
+        assert response.headers["content-range"] == "bytes */5000"
+
+    def test_large_files_stream_small_files_stay_in_memory(self, proxy):
+        client, _ = proxy
+        assert len(client.get("/_next/static/chunks/big-def456.js").content) == 5000
+        client.get("/icons/icon-192.png")
+        stats = client.get("/__proxy/static").json()
+        assert stats["files_in_memory"] == 1
+        assert stats["memory_bytes"] == 104
+        assert stats["hits"] == 2
+
+    def test_missing_and_escaping_paths_go_to_nextjs(self, proxy):
+        client, calls = proxy
+        assert client.get("/_next/static/chunks/missing.js").status_code == 404
+        assert client.get("/_next/static/../../secret.txt").status_code == 404
+        assert client.get("/api/health").status_code == 404
+        assert calls == ["/_next/static/chunks/missing.js", "/secret.txt", "/api/health"]
+
+    def test_writes_are_not_served(self, proxy):
+        client, calls = proxy
+        client.post("/manifest.json", json={})
+        assert calls == ["/manifest.json"]
+
+
+class TestMemoryLimit:
+    """Byte-bounded LRU of file bodies"""
+
+    def test_least_recently_used_bodies_are_dropped(self, frontend):
+        files = StaticFiles(mounts(frontend), memory_max_bytes=110, memory_file_max=4096)
+
+        async def run():
+            for path in ("/manifest.json", "/icons/icon-192.png"):
+                await files.serve("GET", path, {})
+
+        asyncio.run(run())
+        stats = files.stats()
+        assert stats["files_in_memory"] == 1
+        assert stats["memory_bytes"] == 104
@@ -0,0 +1,143 @@
+"""
+PROXY STREAMING: Pass-through mode tests
+
+This test suite verifies:
+1. Upstream bodies are relayed chunk by chunk in PROXY_STREAMING mode
+2. Request bodies are forwarded as a stream with their content-length
+3. Content-encoding, content-type and every Set-Cookie survive the relay
+4. Upstream responses are closed so the pool does not leak in-flight slots
+"""
+
+import asyncio
+import gzip
+
+import httpx
+import pytest
+
+from backend import server
+
+
+def chunked(data: bytes, size: int = 4096):
+    """Upstream body that is not pre-read, like a real socket"""
+    async def body():
+        for start in range(0, len(data), size):
+            yield data[start:start + size]
+    return body()
+
+
+async def call_app(method, path):
+    """Drive the ASGI app directly to observe each body message it sends"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "headers": [],
+        "client": ("testclient", 50000), "server": ("testserver", 80),
+        "app": server.app,
+    }
+    messages = []
+    requested = asyncio.Event()
+
+    async def receive():
+        if requested.is_set():
+            # No disconnect: wait until the response cancels the listener
+            await asyncio.Event().wait()
+        requested.set()
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await server.app(scope, receive, send)
+    return messages
+
+
+@pytest.fixture
+def streaming(monkeypatch):
+    monkeypatch.setattr(server, "STREAMING", True)
+    monkeypatch.setattr(server, "STREAM_CHUNK_SIZE", 1024)
+
+
+class TestStreamedResponses:
+    """Upstream bodies are relayed without buffering"""
+
+    def test_large_body_is_relayed_in_chunks(self, make_proxy, streaming):
+        payload = b"x" * (256 * 1024)
+
+        def handler(request):
+            return httpx.Response(200, content=chunked(payload), headers={"content-type": "text/csv"})
+
+        make_proxy(handler)
+        messages = asyncio.run(call_app("GET", "/api/accounting/export"))
+        start = messages[0]
+        chunks = [m["body"] for m in messages[1:] if m["body"]]
+        assert start["status"] == 200
+        assert (b"content-type", b"text/csv") in start["headers"]
+        assert b"".join(chunks) == payload
+        assert len(chunks) > 1
+        assert max(len(chunk) for chunk in chunks) <= 4096
+        assert server.app.state.upstream.in_flight == 0
+
+    def test_encoded_body_is_not_decoded(self, make_proxy, streaming):
+        compressed = gzip.compress(b'{"ok": true}')
+
+        def handler(request):
+            return httpx.Response(
+                200,
+                content=chunked(compressed),
+                headers={"content-type": "application/json", "content-encoding": "gzip"},
+            )
+
+        client = make_proxy(handler)
+        response = client.get("/api/health")
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.json() == {"ok": True}
+
+    def test_all_cookies_are_forwarded(self, make_proxy, streaming):
+        def handler(request):
+            return httpx.Response(
+                200,
+                content=chunked(b"ok"),
+                headers=[("set-cookie", "a=1; Path=/"), ("set-cookie", "b=2; Path=/")],
+            )
+
+        client = make_proxy(handler)
+        response = client.get("/dashboard")
+        assert response.headers.get_list("set-cookie") == ["a=1; Path=/", "b=2; Path=/"]
+
+    def test_redirects_are_returned(self, make_proxy, streaming):
+        def handler(request):
+            return httpx.Response(302, headers={"location": "/login"})
+
+        client = make_proxy(handler)
+        response = client.get("/dashboard", follow_redirects=False)
+        assert response.status_code == 302
+        assert response.headers["location"] == "/login"
+        assert server.app.state.upstream.in_flight == 0
+
+
+class TestStreamedRequests:
+    """Request bodies are forwarded as they arrive"""
+
+    def test_request_body_reaches_upstream(self, make_proxy, streaming):
+        seen = {}
+
+        async def handler(request):
+            seen["body"] = await request.aread()
+            seen["length"] = request.headers.get("content-length")
+            return httpx.Response(201, content=chunked(b'{"created": true}'))
+
+        client = make_proxy(handler)
+        body = b'{"items": [' + b'{"sku": "A"},' * 5000 + b'{"sku": "B"}]}'
+        response = client.post("/api/svm/orders", content=body)
+        assert response.status_code == 201
+        assert seen["body"] == body
+        assert seen["length"] == str(len(body))
+
+    def test_upstream_failure_returns_502(self, make_proxy, streaming):
+        def handler(request):
+            raise httpx.ConnectError("refused", request=request)
+
+        client = make_proxy(handler)
+        response = client.get("/api/health")
+        assert response.status_code == 502
+        assert server.app.state.upstream.in_flight == 0
@@ -0,0 +1,248 @@
+"""
+PROXY TENANT RESOLUTION: Edge domain cache tests
+
+This test suite verifies:
+1. Registry domains resolve without any upstream call
+2. Development/preview hosts are never resolved
+3. Database-backed hosts are looked up once, then served from cache
+4. "No tenant" answers are cached with the negative TTL
+5. Lookup failures are not cached
+6. Invalidation wins over lookups already in flight
+7. x-ww-* headers are injected downstream and client-sent ones are dropped;
+   the gateway token only accompanies answered hosts
+8. The invalidation endpoint clears entries, requires the admin token
+   (loopback only when none is set) and rejects malformed bodies
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from starlette.requests import Request
+
+from backend import server, tenancy
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestRegistry:
+    """Static registry mirrored from middleware.ts"""
+
+    def test_registry_matches_middleware(self):
+        registry = tenancy.load_registry()
+        context = registry["demo-retail.webwaka.com"]
+        assert context.partner == "webwaka-demo-partner"
+        assert context.tenant == "demo-retail-store"
+        assert context.suite == "commerce"
+        assert len(registry) == 6
+
+    def test_registry_hosts_resolve_without_lookup(self):
+        async def lookup(host):
+            raise AssertionError("registry hosts must not be looked up")
+
+        resolver = tenancy.TenantResolver(lookup=lookup)
+        context = run(resolver.resolve("Demo-School.webwaka.com:443"))
+        assert context.tenant == "demo-school"
+        assert context.headers() == {
+            "x-ww-tenant": "demo-school",
+            "x-ww-domain-state": "ACTIVE",
+            "x-ww-partner": "webwaka-demo-partner",
+            "x-ww-suite": "education",
+        }
+
+    @pytest.mark.parametrize("host", ["localhost:3000", "127.0.0.1", "app.vercel.app", "x.emergent.host", ""])
+    def test_dev_hosts_are_skipped(self, host):
+        resolver = tenancy.TenantResolver(registry={}, lookup=None)
+        assert run(resolver.resolve(host)) is None
+
+    def test_suspended_domains_only_carry_state(self):
+        context = tenancy.DomainContext(host="x.com", tenant="t", partner="p", state="SUSPENDED")
+        assert context.headers() == {"x-ww-domain-state": "SUSPENDED"}
+
+
+class TestLookupCache:
+    """Cached database lookups"""
+
+    def test_lookups_are_cached_and_shared(self):
+        calls = []
+
+        async def lookup(host):
+            calls.append(host)
+            await asyncio.sleep(0.01)
+            return tenancy.DomainContext(host=host, tenant="mama-put", source="lookup")
+
+        resolver = tenancy.TenantResolver(registry={}, lookup=lookup)
+
+        async def scenario():
+            first = await asyncio.gather(*[resolver.resolve("shop.mamaput.ng") for _ in range(5)])
+            again = await resolver.resolve("SHOP.mamaput.ng")
+            return first, again
+
+        first, again = run(scenario())
+        assert calls == ["shop.mamaput.ng"]
+        assert all(context.tenant == "mama-put" for context in first)
+        assert again.tenant == "mama-put"
+        assert resolver.stats()["hits"] == 1
+
+    def test_negative_results_expire_with_negative_ttl(self):
+        calls = []
+
+        async def lookup(host):
+            calls.append(host)
+            return None
+
+        resolver = tenancy.TenantResolver(registry={}, lookup=lookup, negative_ttl=0.0)
+        assert run(resolver.resolve("unknown.example.com")) is None
+        assert run(resolver.resolve("unknown.example.com")) is None
+        assert len(calls) == 2
+
+        resolver = tenancy.TenantResolver(registry={}, lookup=lookup, negative_ttl=60.0)
+        run(resolver.resolve("unknown.example.com"))
+        run(resolver.resolve("unknown.example.com"))
+        assert resolver.stats()["negative_hits"] == 1
+
+    def test_failures_are_not_cached(self):
+        calls = []
+
+        async def lookup(host):
+            calls.append(host)
+            raise httpx.ConnectError("refused")
+
+        resolver = tenancy.TenantResolver(registry={}, lookup=lookup)
+        assert run(resolver.resolve("shop.example.com")) is None
+        assert run(resolver.resolve("shop.example.com")) is None
+        assert len(calls) == 2
+        assert resolver.stats()["lookup_errors"] == 2
+
+    def test_invalidate_during_lookup_is_not_undone(self):
+        answers = iter(["old-tenant", "new-tenant"])
+        started = []
+
+        async def lookup(host):
+            tenant = next(answers)
+            started.append(tenant)
+            await asyncio.sleep(0.02)
+            return tenancy.DomainContext(host=host, tenant=tenant, source="lookup")
+
+        resolver = tenancy.TenantResolver(registry={}, lookup=lookup)
+
+        async def scenario():
+            stale = asyncio.ensure_future(resolver.resolve("shop.mamaput.ng"))
+            await asyncio.sleep(0.005)
+            resolver.invalidate(["shop.mamaput.ng"])
+            # A caller arriving after invalidation must not join the stale flight
+            fresh = await resolver.resolve("shop.mamaput.ng")
+            await stale
+            return fresh, await resolver.resolve("shop.mamaput.ng")
+
+        fresh, cached = run(scenario())
+        assert started == ["old-tenant", "new-tenant"]
+        assert fresh.tenant == "new-tenant"
+        assert cached.tenant == "new-tenant"
+        assert resolver.stats()["lookups"] == 2
+
+    def test_lru_is_bounded(self):
+        async def lookup(host):
+            return tenancy.DomainContext(host=host, tenant=host)
+
+        resolver = tenancy.TenantResolver(registry={}, lookup=lookup, max_entries=3)
+        for i in range(5):
+            run(resolver.resolve(f"shop{i}.example.com"))
+        assert resolver.stats()["entries"] == 3
+
+
+@pytest.fixture
+def resolving_proxy(make_proxy, monkeypatch):
+    monkeypatch.setattr(tenancy, "RESOLUTION_ENABLED", True)
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+    seen = []
+
+    def handler(request):
+        if request.url.path == "/api/tenants/resolve":
+            host = request.url.params["host"]
+            tenant = None
+            if host == "shop.mamaput.ng":
+                tenant = {
+                    "slug": "mama-put", "status": "ACTIVE",
+                    "platformInstance": {"id": "inst_1", "slug": "main", "suiteKeys": ["commerce"]},
+                }
+            return httpx.Response(200, json={"success": True, "tenant": tenant})
+        seen.append(request)
+        return httpx.Response(200, json={"ok": True})
+
+    return make_proxy(handler), seen
+
+
+class TestProxyResolution:
+    """Header injection through proxy_to_nextjs"""
+
+    def test_headers_are_injected_and_spoofing_is_dropped(self, resolving_proxy):
+        client, seen = resolving_proxy
+        client.get("/api/svm/products", headers={"host": "shop.mamaput.ng", "x-ww-tenant": "evil"})
+        client.get("/api/svm/products", headers={"host": "shop.mamaput.ng"})
+        assert seen[0].headers["x-ww-tenant"] == "mama-put"
+        assert seen[0].headers["x-ww-suite"] == "commerce"
+        assert seen[0].headers["x-ww-instance"] == "inst_1"
+        stats = client.get("/__proxy/tenants").json()
+        assert stats["lookups"] == 1 and stats["hits"] == 1
+
+    def test_unknown_hosts_get_no_governance_headers(self, resolving_proxy):
+        client, seen = resolving_proxy
+        client.get("/api/svm/products", headers={"host": "nobody.example.com", "x-ww-tenant": "evil"})
+        assert "x-ww-tenant" not in seen[0].headers
+
+    def test_gateway_token_marks_answered_hosts(self, resolving_proxy, monkeypatch):
+        monkeypatch.setattr(tenancy, "GATEWAY_TOKEN", "shared")
+        client, seen = resolving_proxy
+        client.get("/api/svm/products", headers={"host": "shop.mamaput.ng"})
+        client.get("/api/svm/products", headers={"host": "nobody.example.com", "x-ww-gateway": "forged"})
+        assert seen[0].headers["x-ww-gateway"] == "shared"
+        # "No tenant" is an answer too, so Next.js can skip its own lookup
+        assert seen[1].headers["x-ww-gateway"] == "shared"
+        assert "x-ww-tenant" not in seen[1].headers
+
+    def test_failed_lookups_leave_resolution_to_nextjs(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(tenancy, "RESOLUTION_ENABLED", True)
+        monkeypatch.setattr(tenancy, "GATEWAY_TOKEN", "shared")
+        seen = []
+
+        def handler(request):
+            if request.url.path == "/api/tenants/resolve":
+                return httpx.Response(503)
+            seen.append(request)
+            return httpx.Response(200, json={"ok": True})
+
+        client = make_proxy(handler)
+        client.get("/api/svm/products", headers={"host": "shop.mamaput.ng", "x-ww-gateway": "shared"})
+        assert "x-ww-gateway" not in seen[0].headers
+
+    def test_invalidate_requires_token(self, resolving_proxy):
+        client, _ = resolving_proxy
+        client.get("/", headers={"host": "shop.mamaput.ng"})
+        denied = client.post("/__proxy/tenants/invalidate", content=b"{}")
+        assert denied.status_code == 403
+        allowed = client.post(
+            "/__proxy/tenants/invalidate",
+            content=json.dumps({"hosts": ["shop.mamaput.ng"]}),
+            headers={"x-proxy-admin-token": "secret"},
+        )
+        assert allowed.json() == {"enabled": True, "invalidated": 1}
+        assert client.get("/__proxy/tenants").json()["entries"] == 0
+
+    @pytest.mark.parametrize("body", [b"not json", b"[]", b'{"hosts": "shop.mamaput.ng"}', b'{"hosts": [1]}'])
+    def test_invalidate_rejects_malformed_bodies(self, resolving_proxy, body):
+        client, _ = resolving_proxy
+        response = client.post(
+            "/__proxy/tenants/invalidate", content=body, headers={"x-proxy-admin-token": "secret"}
+        )
+        assert response.status_code == 400
+
+    def test_loopback_is_admin_only_without_a_token(self, monkeypatch):
+        loopback = Request({"type": "http", "headers": [], "client": ("127.0.0.1", 5000)})
+        monkeypatch.setattr(server, "ADMIN_TOKEN", "")
+        assert server.is_admin(loopback)
+        monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+        assert not server.is_admin(loopback)
@@ -0,0 +1,92 @@
+"""
+PROXY TRACING: Request id and Server-Timing propagation tests
+
+This test suite verifies:
+1. A request id is created when the client sends none (or an invalid one)
+2. A valid incoming request id is kept and forwarded to Next.js
+3. The request id is returned on proxied and proxy-generated responses
+4. Proxy Server-Timing entries are appended to the ones from Next.js
+5. Cache hits report the cache outcome instead of an upstream breakdown
+"""
+
+import httpx
+
+from backend import cache, tracing
+from backend.upstream import UpstreamTiming
+
+
+def echo_handler(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(
+        200,
+        json={"request_id": request.headers.get("x-request-id")},
+        headers={"server-timing": 'db;dur=12.5;desc="prisma"'},
+    )
+
+
+def names(server_timing: str):
+    return [item.strip().split(";")[0] for item in server_timing.split(",")]
+
+
+class TestRequestIds:
+    """Creating and propagating x-request-id"""
+
+    def test_id_is_created_and_forwarded(self, make_proxy):
+        client = make_proxy(echo_handler)
+        response = client.get("/api/health")
+        request_id = response.headers["x-request-id"]
+        assert len(request_id) == 32
+        assert response.json()["request_id"] == request_id
+
+    def test_incoming_id_is_kept(self, make_proxy):
+        client = make_proxy(echo_handler)
+        response = client.get("/api/health", headers={"x-request-id": "lb-1234"})
+        assert response.headers["x-request-id"] == "lb-1234"
+        assert response.json()["request_id"] == "lb-1234"
+
+    def test_invalid_id_is_replaced(self):
+        assert tracing.request_id("ok-id.1") == "ok-id.1"
+        assert tracing.request_id("bad id\r\nx: y") != "bad id\r\nx: y"
+        assert tracing.request_id("x" * 200) != "x" * 200
+
+    def test_proxy_errors_carry_the_id(self, make_proxy):
+        def failing(request):
+            raise httpx.ConnectError("refused", request=request)
+
+        client = make_proxy(failing)
+        response = client.get("/api/health", headers={"x-request-id": "abc"})
+        assert response.status_code == 502
+        assert response.headers["x-request-id"] == "abc"
+
+
+class TestServerTiming:
+    """Merging proxy and upstream Server-Timing"""
+
+    def test_entries_are_merged(self, make_proxy):
+        client = make_proxy(echo_handler)
+        header = client.get("/api/health").headers["server-timing"]
+        assert header.startswith('db;dur=12.5;desc="prisma"')
+        assert names(header) == [
+            "db", "proxy", "queue", "upstream-connect", "upstream-ttfb", "upstream-transfer"
+        ]
+
+    def test_cache_hits_report_the_cache(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(cache, "CACHE_ENABLED", True)
+        client = make_proxy(echo_handler)
+        client.get("/api/capabilities")
+        header = client.get("/api/capabilities").headers["server-timing"]
+        assert names(header) == ["proxy", "cache"]
+        assert 'cache;desc="HIT"' in header
+
+    def test_can_be_disabled(self, make_proxy, monkeypatch):
+        monkeypatch.setattr(tracing, "SERVER_TIMING_ENABLED", False)
+        client = make_proxy(echo_handler)
+        response = client.get("/api/health")
+        assert "server-timing" not in response.headers
+        assert "x-request-id" in response.headers
+
+    def test_entry_format(self):
+        timing = UpstreamTiming(sent_at=1.0, connect=0.002, headers_at=1.05, done_at=1.06)
+        entries = tracing.proxy_entries(0.99, 1.07, timing, "MISS")
+        assert entries[0] == "proxy;dur=80.0"
+        assert entries[1] == "queue;dur=10.0"
+        assert entries[-1] == 'cache;desc="MISS"'
@@ -0,0 +1,69 @@
+"""
+PROXY UPSTREAM POOL: Shared app-lifetime client tests
+
+This test suite verifies:
+1. The proxy reuses one upstream client across requests
+2. Pool limits are taken from configuration
+3. Pool usage metrics are exposed on /__proxy/pool
+4. HTTP/2 falls back to HTTP/1.1 when 'h2' is not installed
+"""
+
+import httpx
+
+from backend import server, upstream
+
+
+def echo_handler(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, json={"path": request.url.path})
+
+
+class TestSharedUpstreamClient:
+    """The upstream client is created once by the lifespan hook"""
+
+    def test_client_is_reused_across_requests(self, make_proxy):
+        client = make_proxy(echo_handler)
+        first = server.app.state.upstream
+        assert client.get("/api/health").status_code == 200
+        assert client.get("/api/capabilities").status_code == 200
+        assert server.app.state.upstream is first
+        assert first.requests_total == 2
+        assert first.in_flight == 0
+
+    def test_upstream_errors_are_counted(self, make_proxy):
+        def failing(request):
+            raise httpx.ConnectError("refused", request=request)
+
+        client = make_proxy(failing)
+        response = client.get("/api/health")
+        assert response.status_code == 502
+        assert server.app.state.upstream.errors_total == 1
+
+
+class TestPoolConfiguration:
+    """Pool limits and protocol selection"""
+
+    def test_limits_are_applied(self):
+        pool = upstream.UpstreamClient(max_connections=7, max_keepalive=3, keepalive_expiry=4.0)
+        assert pool.limits.max_connections == 7
+        assert pool.limits.max_keepalive_connections == 3
+        assert pool.limits.keepalive_expiry == 4.0
+
+    def test_http2_falls_back_without_h2(self, monkeypatch):
+        monkeypatch.setattr(upstream, "http2_available", lambda: False)
+        pool = upstream.UpstreamClient(http2=True)
+        assert pool.http2 is False
+
+
+class TestPoolMetrics:
+    """GET /__proxy/pool reports pool usage"""
+
+    def test_pool_endpoint_is_not_proxied(self, make_proxy):
+        client = make_proxy(echo_handler)
+        client.get("/api/health")
+        response = client.get("/__proxy/pool")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["requests_total"] == 1
+        assert data["requests_in_flight"] == 0
+        assert data["max_connections"] == upstream.UPSTREAM_MAX_CONNECTIONS
+        assert "connections_idle" in data
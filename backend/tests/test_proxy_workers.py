@@ -0,0 +1,185 @@
+"""
+PROXY WORKERS: Shared state for multi-worker deployments tests
+
+This test suite verifies:
+1. Circuit breaker state in shared memory is seen by every worker
+2. Only one worker sends the half-open probe, and a lost probe expires
+   A slot locked by another worker does not block the event loop
+3. Cache entries stored by one worker are served by another with their age
+4. The shared cache tier drops expired entries and stays under its size
+5. Several workers switch to shared stores unless configured otherwise
+"""
+
+import asyncio
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+from backend import cache, run
+from backend.cache import ResponseCache, SharedCacheStore
+from backend.resilience import CircuitBreakers, CircuitOpen, SharedBreakerTable
+from backend.upstream import UpstreamResponse
+
+
+def breakers(path):
+    return CircuitBreakers(["/api/analytics", "/api/accounting"], table=SharedBreakerTable(2, path), failures=2, cooldown=10)
+
+
+def wait(coro):
+    return asyncio.run(coro)
+
+
+def ok_response(body=b'{"items": []}'):
+    return UpstreamResponse(200, httpx.Headers({"content-type": "application/json"}), body)
+
+
+class TestSharedBreakers:
+    """PROXY_BREAKER_STORE=shm"""
+
+    def test_open_circuit_is_seen_by_other_workers(self, tmp_path):
+        path = str(tmp_path / "breakers")
+        first, second = breakers(path), breakers(path)
+        for _ in range(2):
+            wait(first.for_path("api/analytics/sales").admit(now=0))
+            wait(first.for_path("api/analytics/sales").report(False, now=0))
+
+        with pytest.raises(CircuitOpen):
+            wait(second.for_path("api/analytics/sales").admit(now=1))
+        wait(second.for_path("api/accounting/reports").admit(now=1))
+        assert first.stats()["/api/analytics"]["rejected_total"] == 1
+        assert second.stats()["/api/analytics"]["state"] == "open"
+
+    def test_single_probe_across_workers(self, tmp_path):
+        path = str(tmp_path / "breakers")
+        first, second = breakers(path), breakers(path)
+        for _ in range(2):
+            wait(first.for_path("api/analytics").report(False, now=0))
+
+        wait(first.for_path("api/analytics").admit(now=11))
+        with pytest.raises(CircuitOpen):
+            wait(second.for_path("api/analytics").admit(now=12))
+        wait(first.for_path("api/analytics").report(True, now=12))
+        wait(second.for_path("api/analytics").admit(now=13))
+        assert second.stats()["/api/analytics"]["state"] == "closed"
+
+    def test_probe_of_a_dead_worker_expires(self, tmp_path):
+        path = str(tmp_path / "breakers")
+        first, second = breakers(path), breakers(path)
+        for _ in range(2):
+            wait(first.for_path("api/analytics").report(False, now=0))
+        wait(first.for_path("api/analytics").admit(now=11))
+        # The probing worker never reports back; after a cooldown another may probe
+        wait(second.for_path("api/analytics").admit(now=22))
+
+    def test_slots_of_other_routes_are_reset(self, tmp_path):
+        path = str(tmp_path / "breakers")
+        old = CircuitBreakers(["/api/old"], table=SharedBreakerTable(1, path), failures=1)
+        wait(old.for_path("api/old").report(False, now=0))
+        new = CircuitBreakers(["/api/new"], table=SharedBreakerTable(1, path), failures=1)
+        wait(new.for_path("api/new").admit(now=1))
+        assert new.stats()["/api/new"]["opened_total"] == 0
+
+    def test_locked_slot_does_not_block_the_event_loop(self, tmp_path):
+        path = str(tmp_path / "breakers")
+        shared = breakers(path)
+        holder = subprocess.Popen(
+            [sys.executable, "-c", (
+                "import fcntl, os, sys, time\n"
+                f"fd = os.open({path!r}, os.O_RDWR)\n"
+                "fcntl.lockf(fd, fcntl.LOCK_EX)\n"
+                "print('locked', flush=True)\n"
+                "time.sleep(0.3)\n"
+            )],
+            stdout=subprocess.PIPE,
+        )
+        assert holder.stdout.readline() == b"locked\n"
+
+        async def scenario():
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+
+            ticker = asyncio.ensure_future(tick())
+            started = time.monotonic()
+            await shared.for_path("api/analytics").admit()
+            waited = time.monotonic() - started
+            ticker.cancel()
+            return waited, ticks
+
+        waited, ticks = wait(scenario())
+        holder.wait()
+        assert waited > 0.1
+        assert ticks > 5
+
+
+class TestSharedCache:
+    """PROXY_CACHE_SHARED"""
+
+    def test_entry_is_served_by_another_worker(self, tmp_path):
+        first = ResponseCache(routes={"/api/svm/catalog": 30}, shared=SharedCacheStore(str(tmp_path)))
+        second = ResponseCache(routes={"/api/svm/catalog": 30}, shared=SharedCacheStore(str(tmp_path)))
+        key = first.key_for("GET", "api/svm/catalog", "page=1", {"x-tenant-id": "t1"})
+        assert first.store(key, ok_response(), 30)
+
+        entry, state = second.lookup(key)
+        assert state == cache.FRESH
+        assert entry.response.content == b'{"items": []}'
+        assert entry.response.headers["content-type"] == "application/json"
+        assert entry.age(cache.time.monotonic()) < 5
+        assert second.stats()["shared_hits"] == 1
+        # Now in the second worker's own LRU
+        second.lookup(key)
+        assert second.stats()["shared"]["reads"] == 1
+
+    def test_age_carries_over(self, tmp_path):
+        shared = SharedCacheStore(str(tmp_path))
+        first = ResponseCache(routes={"/api": 30}, stale_seconds=10, shared=shared)
+        key = first.key_for("GET", "api/x", "", {})
+        shared.put(key, ok_response(), 30, 10, now=cache.time.time() - 35)
+        _, state = first.lookup(key)
+        assert state == cache.STALE
+
+    def test_sweep_drops_expired_and_oldest(self, tmp_path):
+        shared = SharedCacheStore(str(tmp_path), max_bytes=400)
+        for i in range(4):
+            shared.put(f"key{i}", ok_response(b"x" * 100), ttl=10 + i, stale_seconds=0, now=1000)
+        shared.put("expired", ok_response(), ttl=1, stale_seconds=0, now=0)
+        shared.sweep(now=1000)
+        assert shared.get("expired") is None
+        assert shared.get("key0") is None
+        assert shared.get("key3") is not None
+        assert sum(f.stat().st_size for f in tmp_path.iterdir()) <= 400
+
+    def test_uncacheable_responses_are_not_shared(self, tmp_path):
+        shared = SharedCacheStore(str(tmp_path))
+        store = ResponseCache(routes={"/api": 30}, shared=shared)
+        response = UpstreamResponse(200, httpx.Headers({"set-cookie": "s=1"}), b"{}")
+        assert not store.store("k", response, 30)
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestRunConfiguration:
+    """backend.run"""
+
+    def test_single_worker_keeps_local_state(self):
+        environ = {}
+        assert run.configure_shared_state(1, environ) == {}
+        assert environ == {}
+
+    def test_several_workers_share_state(self):
+        environ = {"PROXY_RATELIMIT_STORE": "redis"}
+        applied = run.configure_shared_state(4, environ)
+        assert environ["PROXY_RATELIMIT_STORE"] == "redis"
+        assert applied == {"PROXY_BREAKER_STORE": "shm", "PROXY_CACHE_SHARED": "1", "PROXY_IDEMPOTENCY_SHARED": "1"}
+
+    def test_arguments_default_to_environment(self):
+        args = run.parse_args(["--workers", "3"])
+        assert args.workers == 3
+        assert args.port == run.PORT
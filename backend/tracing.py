@@ -0,0 +1,73 @@
+"""Request ids and Server-Timing across the proxy and Next.js.
+
+Every proxied request carries an ``x-request-id`` (PROXY_REQUEST_ID_HEADER).
+A well-formed id sent by the client or an outer load balancer is kept,
+otherwise the proxy creates one. The id is forwarded to Next.js and
+returned to the client, so one request can be followed through gateway,
+Next.js and Prisma logs.
+
+With PROXY_SERVER_TIMING enabled (the default) the proxy adds its own
+``Server-Timing`` entries (all durations in milliseconds):
+
+- ``proxy``: time spent until the response headers were ready
+- ``queue``: time in the proxy before the upstream call started
+- ``upstream-connect``, ``upstream-ttfb``, ``upstream-transfer``: the
+  upstream round trip, when there was one for this request
+- ``cache``: the response cache outcome (HIT, STALE or MISS)
+
+Entries sent by Next.js are kept in front of them, so browser devtools and
+the log pipeline see a single breakdown.
+"""
+
+import re
+import uuid
+from typing import List, Optional
+
+from .config import env_bool, env_str
+from .upstream import UpstreamTiming
+
+REQUEST_ID_HEADER = env_str("PROXY_REQUEST_ID_HEADER", "x-request-id")
+SERVER_TIMING_ENABLED = env_bool("PROXY_SERVER_TIMING", True)
+
+# Accept ids from outer proxies, but not anything that could smuggle data into logs
+VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:/+=-]{1,128}$")
+
+
+def request_id(incoming: Optional[str]) -> str:
+    if incoming and VALID_REQUEST_ID.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def entry(name: str, duration: Optional[float] = None, desc: str = "") -> str:
+    """One Server-Timing metric; ``duration`` in seconds"""
+    parts = [name]
+    if duration is not None:
+        parts.append(f"dur={duration * 1000:.1f}")
+    if desc:
+        parts.append(f'desc="{desc}"')
+    return ";".join(parts)
+
+
+def proxy_entries(
+    started_at: float,
+    finished_at: float,
+    timing: Optional[UpstreamTiming] = None,
+    cache_status: str = "",
+) -> List[str]:
+    entries = [entry("proxy", finished_at - started_at)]
+    if timing is not None and timing.headers_at is not None:
+        entries.append(entry("queue", max(0.0, timing.sent_at - started_at)))
+        entries.append(entry("upstream-connect", timing.connect))
+        entries.append(entry("upstream-ttfb", timing.ttfb))
+        if timing.done_at is not None:
+            entries.append(entry("upstream-transfer", timing.transfer))
+    if cache_status:
+        entries.append(entry("cache", desc=cache_status))
+    return entries
+
+
+def merge_server_timing(upstream: List[str], entries: List[str]) -> str:
+    """Upstream Server-Timing values followed by the proxy's own entries"""
+    values = [value.strip() for value in upstream if value.strip()]
+    return ", ".join(values + entries)
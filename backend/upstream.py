@@ -0,0 +1,227 @@
+"""Pooled HTTP client for the Next.js upstream.
+
+One ``httpx.AsyncClient`` lives for the whole lifetime of the app so that
+keep-alive connections to Next.js are reused across requests instead of
+paying for a new TCP connection (and pool) on every proxied call.
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+import httpx
+
+from .config import env_bool, env_float, env_int, env_str
+
+logger = logging.getLogger("backend.upstream")
+
+NEXTJS_URL = env_str("NEXTJS_URL", "http://localhost:3000")
+
+# Pool sizing. The defaults comfortably cover the 50/200 connection
+# scenarios in frontend/load-tests without queueing inside the pool.
+UPSTREAM_MAX_CONNECTIONS = env_int("PROXY_MAX_CONNECTIONS", 200)
+UPSTREAM_MAX_KEEPALIVE = env_int("PROXY_MAX_KEEPALIVE", 50)
+UPSTREAM_KEEPALIVE_EXPIRY = env_float("PROXY_KEEPALIVE_EXPIRY", 30.0)
+UPSTREAM_HTTP2 = env_bool("PROXY_HTTP2", False)
+UPSTREAM_TIMEOUT = env_float("PROXY_TIMEOUT", 30.0)
+
+
+@dataclass
+class UpstreamTiming:
+    """perf_counter timestamps of one upstream round trip"""
+
+    sent_at: float
+    # Seconds spent opening the connection (TCP + TLS); 0 when reused
+    connect: float = 0.0
+    headers_at: Optional[float] = None
+    done_at: Optional[float] = None
+    _connect_started: float = 0.0
+
+    async def trace(self, event: str, info: Dict[str, Any]) -> None:
+        """httpcore trace hook; only connection setup is of interest"""
+        if not event.startswith(("connection.connect_tcp.", "connection.start_tls.")):
+            return
+        if event.endswith(".started"):
+            self._connect_started = time.perf_counter()
+        elif self._connect_started:
+            self.connect += time.perf_counter() - self._connect_started
+            self._connect_started = 0.0
+
+    @property
+    def ttfb(self) -> float:
+        """Request sent to response headers, connection setup excluded"""
+        if self.headers_at is None:
+            return 0.0
+        return max(0.0, self.headers_at - self.sent_at - self.connect)
+
+    @property
+    def transfer(self) -> float:
+        if self.headers_at is None or self.done_at is None:
+            return 0.0
+        return self.done_at - self.headers_at
+
+
+@dataclass
+class UpstreamResponse:
+    """A fully read upstream response, body still as the upstream encoded it"""
+
+    status_code: int
+    headers: httpx.Headers
+    content: bytes
+    # Compressed copies of ``content`` keyed by content-coding
+    variants: Dict[str, bytes] = field(default_factory=dict)
+    timing: Optional[UpstreamTiming] = None
+
+
+TIMING_EXTENSION = "proxy_timing"
+
+
+def timing_of(response: httpx.Response) -> Optional[UpstreamTiming]:
+    return response.extensions.get(TIMING_EXTENSION)
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class UpstreamClient:
+    """App-lifetime connection pool to one upstream plus usage counters."""
+
+    def __init__(
+        self,
+        base_url: str = NEXTJS_URL,
+        max_connections: int = UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive: int = UPSTREAM_MAX_KEEPALIVE,
+        keepalive_expiry: float = UPSTREAM_KEEPALIVE_EXPIRY,
+        http2: bool = UPSTREAM_HTTP2,
+        timeout: float = UPSTREAM_TIMEOUT,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        if http2 and not http2_available():
+            logger.warning("PROXY_HTTP2 is set but the 'h2' package is missing; using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(limits=self.limits, http2=http2)
+        self.transport = transport
+        self.client = httpx.AsyncClient(
+            transport=transport,
+            base_url=self.base_url,
+            follow_redirects=False,
+            timeout=timeout,
+        )
+        self.in_flight = 0
+        self.requests_total = 0
+        self.errors_total = 0
+
+    async def start(self) -> None:
+        """Nothing to start for a single upstream; see LoadBalancer.start"""
+
+    @staticmethod
+    def url_for(path: str, query: str = "") -> str:
+        """Target relative to the upstream base URL"""
+        url = "/" + path.lstrip("/")
+        if query:
+            url += f"?{query}"
+        return url
+
+    def websocket_url(self, path: str, query: str = "") -> str:
+        """Absolute ws:// or wss:// URL of ``path`` on this upstream"""
+        scheme, _, rest = self.base_url.partition("://")
+        return ("wss" if scheme == "https" else "ws") + "://" + rest + self.url_for(path, query)
+
+    async def fetch(self, method: str, url: str, **kwargs: Any) -> UpstreamResponse:
+        """Buffered request returning the body exactly as the upstream sent it.
+
+        Unlike ``response.content`` the bytes are not decoded, so they can be
+        forwarded together with the upstream content-encoding.
+        """
+        response = await self.stream(method, url, **kwargs)
+        try:
+            body = b"".join([chunk async for chunk in response.aiter_raw()])
+        except httpx.HTTPError:
+            self.errors_total += 1
+            raise
+        finally:
+            await response.aclose()
+        return UpstreamResponse(
+            response.status_code, response.headers, body, timing=timing_of(response)
+        )
+
+    async def stream(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Send a request and return as soon as the upstream headers arrive.
+
+        The body is left unread; the caller must ``aclose()`` the response,
+        which is also when the request stops counting as in flight.
+        """
+        self.in_flight += 1
+        self.requests_total += 1
+        timing = UpstreamTiming(sent_at=time.perf_counter())
+        extensions = {**kwargs.pop("extensions", {}), "trace": timing.trace}
+        try:
+            response = await self.client.send(
+                self.client.build_request(method, url, extensions=extensions, **kwargs),
+                stream=True,
+            )
+        except BaseException as exc:
+            self.in_flight -= 1
+            if isinstance(exc, httpx.HTTPError):
+                self.errors_total += 1
+            raise
+
+        timing.headers_at = time.perf_counter()
+        response.extensions[TIMING_EXTENSION] = timing
+        close = response.aclose
+        released = False
+
+        async def aclose() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.in_flight -= 1
+                timing.done_at = time.perf_counter()
+            await close()
+
+        response.aclose = aclose
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool usage for the metrics endpoint."""
+        connections = []
+        pool = getattr(self.transport, "_pool", None)
+        if pool is not None:
+            connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for conn in connections if conn.is_idle())
+        http2 = sum(1 for conn in connections if "HTTP/2" in conn.info())
+        return {
+            "upstream": self.base_url,
+            "http2_enabled": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "connections": len(connections),
+            "connections_idle": idle,
+            "connections_active": len(connections) - idle,
+            "connections_http2": http2,
+            "requests_in_flight": self.in_flight,
+            "requests_total": self.requests_total,
+            "errors_total": self.errors_total,
+        }
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+def create_upstream() -> UpstreamClient:
+    return UpstreamClient()
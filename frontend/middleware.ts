@@ -24,6 +24,9 @@ import { NextRequest, NextResponse } from 'next/server'
 const PARTNER_HEADER = 'x-ww-partner'
 const TENANT_HEADER = 'x-ww-tenant'
 const SUITE_HEADER = 'x-ww-suite'
+const DOMAIN_STATE_HEADER = 'x-ww-domain-state'
+const REGULATOR_MODE_HEADER = 'x-ww-regulator-mode'
+const GATEWAY_HEADER = 'x-ww-gateway'
 
 // =============================================================================
 // DOMAIN CONTEXT TYPE
@@ -155,6 +158,35 @@ export function resolveDomainContext(host: string): DomainContext | null {
   }
 }
 
+/**
+ * Whether the request came through the gateway, which has already resolved
+ * the host. Next.js is also reachable directly, so only the shared
+ * PROXY_GATEWAY_TOKEN makes the x-ww-* request headers trustworthy.
+ */
+function fromGateway(request: NextRequest): boolean {
+  const token = process.env.PROXY_GATEWAY_TOKEN
+  return !!token && request.headers.get(GATEWAY_HEADER) === token
+}
+
+/**
+ * Domain context as resolved by the gateway.
+ * No state header means the gateway found no tenant for the host.
+ */
+function gatewayDomainContext(request: NextRequest): DomainContext | null {
+  const state = request.headers.get(DOMAIN_STATE_HEADER)
+  if (state !== 'PENDING' && state !== 'ACTIVE' && state !== 'SUSPENDED') {
+    return null
+  }
+  
+  return {
+    partnerSlug: request.headers.get(PARTNER_HEADER) || '',
+    tenantSlug: request.headers.get(TENANT_HEADER) || '',
+    primarySuite: request.headers.get(SUITE_HEADER) || '',
+    state,
+    regulatorMode: request.headers.get(REGULATOR_MODE_HEADER) === 'true',
+  }
+}
+
 // =============================================================================
 // MIDDLEWARE
 // =============================================================================
@@ -162,8 +194,10 @@ export function resolveDomainContext(host: string): DomainContext | null {
 export function middleware(request: NextRequest) {
   const host = request.headers.get('host') || ''
   
-  // Resolve domain context
-  const domainContext = resolveDomainContext(host)
+  // Resolve domain context, unless the gateway already did
+  const domainContext = fromGateway(request)
+    ? gatewayDomainContext(request)
+    : resolveDomainContext(host)
   
   // If domain not in registry, allow normal routing
   if (!domainContext) {
@@ -192,7 +226,7 @@ export function middleware(request: NextRequest) {
   response.headers.set(SUITE_HEADER, domainContext.primarySuite)
   
   if (domainContext.regulatorMode) {
-    response.headers.set('x-ww-regulator-mode', 'true')
+    response.headers.set(REGULATOR_MODE_HEADER, 'true')
   }
   
   return response
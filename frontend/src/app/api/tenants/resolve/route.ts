@@ -41,6 +41,14 @@ export async function GET(request: NextRequest) {
         status: tenant.status,
         domains: tenant.domains,
         resolvedVia: context.resolvedVia,
+        // Phase 2: resolved platform instance (used by the gateway proxy)
+        platformInstance: context.platformInstance
+          ? {
+              id: context.platformInstance.id,
+              slug: context.platformInstance.slug,
+              suiteKeys: context.platformInstance.suiteKeys
+            }
+          : null,
         // Legacy branding object
         branding: {
           id: tenant.id,
@@ -18,6 +18,10 @@ export const TENANT_ID_HEADER = 'x-tenant-id'
 export const TENANT_SLUG_HEADER = 'x-tenant-slug'
 export const TENANT_RESOLVED_VIA_HEADER = 'x-tenant-resolved-via'
 
+// Set by the gateway once it has resolved the host (see backend/tenancy.py)
+const GATEWAY_HEADER = 'x-ww-gateway'
+const GATEWAY_TENANT_HEADER = 'x-ww-tenant'
+
 const PUBLIC_PATHS = [
   '/login',
   '/register',
@@ -83,6 +87,12 @@ function isProtectedPath(pathname: string): boolean {
   return isSuperAdminPath(pathname) || isPartnerPath(pathname) || pathname.startsWith('/dashboard')
 }
 
+function fromGateway(request: NextRequest): boolean {
+  // Next.js is reachable directly; only the shared token proves the origin
+  const token = process.env.PROXY_GATEWAY_TOKEN
+  return !!token && request.headers.get(GATEWAY_HEADER) === token
+}
+
 function hasSessionCookie(request: NextRequest): boolean {
   const sessionToken = request.cookies.get('session_token')?.value
   return !!sessionToken && sessionToken.length > 0
@@ -141,6 +151,16 @@ export async function middleware(request: NextRequest) {
     return response
   }
   
+  // The gateway has already resolved the host; no tenant header means none
+  if (fromGateway(request)) {
+    const gatewayTenant = request.headers.get(GATEWAY_TENANT_HEADER)
+    if (gatewayTenant) {
+      response.headers.set(TENANT_SLUG_HEADER, gatewayTenant)
+      response.headers.set(TENANT_RESOLVED_VIA_HEADER, 'gateway')
+    }
+    return response
+  }
+  
   const host = hostname.split(':')[0].toLowerCase()
   const parts = host.split('.')
   
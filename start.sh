@@ -6,6 +6,9 @@ npm --prefix frontend install
 # Build frontend
 npm --prefix frontend run build || exit 1
 
+# Shared secret that lets Next.js trust the gateway's x-ww-* headers
+export PROXY_GATEWAY_TOKEN="${PROXY_GATEWAY_TOKEN:-$(head -c 16 /dev/urandom | od -An -tx1 | tr -d ' \n')}"
+
 # Start Next.js frontend (Replit uses $PORT)
 npm --prefix frontend run start -- -p $PORT -H 0.0.0.0 &
 
@@ -13,4 +16,4 @@ npm --prefix frontend run start -- -p $PORT -H 0.0.0.0 &
 sleep 4
 
 # Start FastAPI backend on port 8000
-uvicorn backend.server:app --host 0.0.0.0 --port 8000
+python -m backend.run --host 0.0.0.0 --port 8000 --profile performance